@@ -1,3 +1,9 @@
+import math
+from collections import defaultdict
+
+from instrumentation import increment, span
+from rules import DEFAULT_RULE_TABLE
+
 # ----------------------- Utility Functions -----------------------#
 
 # Function to calculate net land area based on plot type
@@ -19,25 +25,49 @@ def calculate_net_land_area(plot_size, is_parceled, road_deduction_percent, gree
     return round(net_area), round(road_deduction), round(green_deduction)
 
 # Green area deduction based on total combined plot size
-def green_area_formula(total_area):
-    match total_area:
-        case _ if total_area < 800:
-            return 0
-        case _ if 800 <= total_area < 1500:
-            return 5
-        case _ if 1500 <= total_area < 2500:
-            return 10
-        case _ if 2500 <= total_area < 10000:
-            return 15
-        case _ if 10000 <= total_area < 50000:
-            return 17
-        case _:
-            return 18
+def green_area_formula(total_area, rule_table=None):
+    return (rule_table or DEFAULT_RULE_TABLE).green_percentage(total_area)
+
+# Function to label each plot's tier cluster (see geometry.adjacency_clusters)
+def plot_clusters(plots):
+    """Return one cluster label per plot, or None when no plot has a ``cluster`` label.
+
+    Plots without a label form clusters of their own.
+    """
+    labels = [plot.get("cluster") for plot in plots]
+    if all(label is None for label in labels):
+        return None
+    next_label = max(label for label in labels if label is not None) + 1
+    clusters = []
+    for label in labels:
+        if label is None:
+            label, next_label = next_label, next_label + 1
+        clusters.append(int(label))
+    return clusters
+
+# Function to pool the tier areas of unparceled plots over their clusters
+def cluster_tier_areas(plots, clusters, rule_table=None):
+    """Return the per-plot (plot size, area after road) sums of each plot's cluster.
+
+    A plot without a road deduction percentage takes it from its cluster's plot size tier.
+    """
+    sizes = defaultdict(float)
+    for plot, cluster in zip(plots, clusters):
+        if not plot["is_parceled"]:
+            sizes[cluster] += plot["plot_size"]
+    areas = defaultdict(float)
+    for plot, cluster in zip(plots, clusters):
+        if not plot["is_parceled"]:
+            road_deduction_percent = plot["road_deduction_percent"]
+            if road_deduction_percent is None:
+                road_deduction_percent = (rule_table or DEFAULT_RULE_TABLE).road_percentage(sizes[cluster])
+            areas[cluster] += plot["plot_size"] - plot["plot_size"] * (road_deduction_percent / 100)
+    return [sizes[cluster] for cluster in clusters], [areas[cluster] for cluster in clusters]
 
 # ----------------------- Calculation Functions -----------------------#
 
 # Function to calculate totals and handle green area allocation
-def calculate_totals(plots, apply_efficiency_incentive, green_allocation_method, custom_green_allocations):
+def calculate_totals(plots, apply_efficiency_incentive, green_allocation_method, custom_green_allocations, rule_table=None):
     total_net_area = 0
     total_road_deduction = 0
     total_green_deduction = 0
@@ -53,7 +83,14 @@ def calculate_totals(plots, apply_efficiency_incentive, green_allocation_method,
     total_max_floors = 0
     total_extra_floors_cost = 0
 
-    for plot in plots:
+    # Plots with a "cluster" label look up road and green tiers on their cluster's pooled area
+    clusters = plot_clusters(plots)
+    if clusters is not None:
+        tier_sizes, tier_areas = cluster_tier_areas(plots, clusters, rule_table)
+
+    # One span for the whole loop (a span per plot would flood the event buffer)
+    loop_span = span("calculate_totals.plot_loop").start()
+    for i, plot in enumerate(plots):
         # ─────────────────────────────────────────────────────
         # Existing logic: handle road/green deductions or parcels
         # ─────────────────────────────────────────────────────
@@ -62,10 +99,15 @@ def calculate_totals(plots, apply_efficiency_incentive, green_allocation_method,
             plot["road_deduction"] = 0
             plot["green_deduction"] = 0
         else:
-            road_deduction = plot["plot_size"] * (plot["road_deduction_percent"] / 100)
+            # Plots without a road deduction take it from the rule table's tiers
+            road_deduction_percent = plot["road_deduction_percent"]
+            if road_deduction_percent is None:
+                tier_size = plot["plot_size"] if clusters is None else tier_sizes[i]
+                road_deduction_percent = (rule_table or DEFAULT_RULE_TABLE).road_percentage(tier_size)
+            road_deduction = plot["plot_size"] * (road_deduction_percent / 100)
             area_after_road = plot["plot_size"] - road_deduction
 
-            green_percentage = green_area_formula(area_after_road)
+            green_percentage = green_area_formula(area_after_road if clusters is None else tier_areas[i], rule_table)
             green_deduction = area_after_road * (green_percentage / 100)
 
             net_plot_size = area_after_road - green_deduction
@@ -83,6 +125,10 @@ def calculate_totals(plots, apply_efficiency_incentive, green_allocation_method,
         # ─────────────────────────────────────────────────────
         coverage_percent = plot.get("coverage_percent", 0)
         coverage_area = plot["net_plot_size"] * (coverage_percent / 100)
+        # A building footprint (see geometry.py) is the coverage; a coverage_percent above 0 caps it
+        footprint_area = plot.get("footprint_area")
+        if footprint_area is not None and not math.isnan(footprint_area):
+            coverage_area = min(float(footprint_area), coverage_area) if coverage_percent > 0 else float(footprint_area)
         plot["coverage_area"] = coverage_area
         total_coverage_area += coverage_area  # Summation if needed
 
@@ -144,12 +190,51 @@ def calculate_totals(plots, apply_efficiency_incentive, green_allocation_method,
 
             buildable_area = (zone_area * density_factor) / 100
             plot["zone_buildable_areas"].append(round(buildable_area))
+    loop_span.stop()
+
+    increment("calculate_totals.plots", len(plots))
+    return summarize_totals({
+        "total_net_area": total_net_area,
+        "total_road_deduction": total_road_deduction,
+        "total_green_deduction": total_green_deduction,
+        "commercial_area": commercial_area,
+        "commercial_density_sum": commercial_density_sum,
+        "residential_area": residential_area,
+        "residential_density_sum": residential_density_sum,
+        "total_coverage_area": total_coverage_area,
+        "total_max_floors": total_max_floors,
+        "total_extra_floors_cost": total_extra_floors_cost,
+    }, apply_efficiency_incentive, plots)
+
+# Running sums every calculation engine accumulates before summarizing
+TOTAL_SUM_KEYS = (
+    "total_net_area",
+    "total_road_deduction",
+    "total_green_deduction",
+    "commercial_area",
+    "commercial_density_sum",
+    "residential_area",
+    "residential_density_sum",
+    "total_coverage_area",
+    "total_max_floors",
+    "total_extra_floors_cost",
+)
+
+# Function to turn accumulated project sums into the totals dictionary
+def summarize_totals(sums, apply_efficiency_incentive, plots):
+    with span("calculate_totals.aggregation"):
+        return _summarize_totals(sums, apply_efficiency_incentive, plots)
+
+
+def _summarize_totals(sums, apply_efficiency_incentive, plots):
+    commercial_area = sums["commercial_area"]
+    residential_area = sums["residential_area"]
 
     # ─────────────────────────────────────────────────────────
     # Calculate averages & buildable areas for commercials/residential
     # ─────────────────────────────────────────────────────────
-    commercial_density_avg = (commercial_density_sum / commercial_area) if commercial_area else 0
-    residential_density_avg = (residential_density_sum / residential_area) if residential_area else 0
+    commercial_density_avg = (sums["commercial_density_sum"] / commercial_area) if commercial_area else 0
+    residential_density_avg = (sums["residential_density_sum"] / residential_area) if residential_area else 0
 
     commercial_buildable_area = (commercial_area * commercial_density_avg) / 100
     residential_buildable_area = (residential_area * residential_density_avg) / 100
@@ -164,9 +249,9 @@ def calculate_totals(plots, apply_efficiency_incentive, green_allocation_method,
     # Return dictionary including coverage & floors if needed
     # ─────────────────────────────────────────────────────────
     return {
-        "total_net_area": round(total_net_area),
-        "total_road_deduction": round(total_road_deduction),
-        "total_green_deduction": round(total_green_deduction),
+        "total_net_area": round(sums["total_net_area"]),
+        "total_road_deduction": round(sums["total_road_deduction"]),
+        "total_green_deduction": round(sums["total_green_deduction"]),
         "commercial_avg_density": round(commercial_density_avg),
         "residential_avg_density": round(residential_density_avg),
         "commercial_buildable_area": round(commercial_buildable_area),
@@ -174,9 +259,9 @@ def calculate_totals(plots, apply_efficiency_incentive, green_allocation_method,
         "incentive_area": round(incentive_area),
         "total_buildable_area": round(total_buildable_area),
         # Coverage & floor-related totals
-        "total_coverage_area": round(total_coverage_area),
-        "total_max_floors": total_max_floors,
-        "total_extra_floors_cost": round(total_extra_floors_cost),
+        "total_coverage_area": round(sums["total_coverage_area"]),
+        "total_max_floors": sums["total_max_floors"],
+        "total_extra_floors_cost": round(sums["total_extra_floors_cost"]),
         "plots": plots
     }
 
@@ -0,0 +1,293 @@
+import numpy as np
+
+from Calculations import TOTAL_SUM_KEYS, plot_clusters, summarize_totals
+from instrumentation import increment, span
+from rules import DEFAULT_RULE_TABLE
+
+# ----------------------- Column Layout -----------------------#
+
+# Zone type codes used in the "zone_type" column
+RESIDENTIAL = 0
+COMMERCIAL = 1
+UNKNOWN_TYPE = -1
+ZONE_TYPE_CODES = {"residential": RESIDENTIAL, "commercial": COMMERCIAL}
+
+# Per-plot columns and their dtypes (zone columns are flattened, one row per zone)
+PLOT_COLUMNS = {
+    "plot_size": np.float64,
+    "is_parceled": np.bool_,
+    "road_deduction_percent": np.float64,
+    "coverage_percent": np.float64,
+    "max_height": np.float64,
+    "floor_height": np.float64,
+    "allow_extra_floors": np.bool_,
+    "extra_floors": np.int64,
+    "cost_per_extra_floor": np.float64,
+}
+ZONE_COLUMNS = {
+    "zone_plot": np.int64,
+    "zone_percentage": np.float64,
+    "zone_density_factor": np.float64,
+    "zone_type": np.int8,
+}
+
+
+# Function to convert a list of plot dicts into column arrays
+def plots_to_columns(plots):
+    n = len(plots)
+    columns = {name: np.zeros(n, dtype=dtype) for name, dtype in PLOT_COLUMNS.items()}
+    zone_plot = []
+    zone_percentage = []
+    zone_density_factor = []
+    zone_type = []
+
+    for i, plot in enumerate(plots):
+        columns["plot_size"][i] = plot["plot_size"]
+        columns["is_parceled"][i] = plot["is_parceled"]
+        road_deduction_percent = plot["road_deduction_percent"]
+        columns["road_deduction_percent"][i] = np.nan if road_deduction_percent is None else road_deduction_percent
+        columns["coverage_percent"][i] = plot.get("coverage_percent", 0)
+        columns["max_height"][i] = plot.get("max_height", 0)
+        columns["floor_height"][i] = plot.get("floor_height", 0)
+        columns["allow_extra_floors"][i] = plot.get("allow_extra_floors", False)
+        columns["extra_floors"][i] = plot.get("extra_floors", 0)
+        columns["cost_per_extra_floor"][i] = plot.get("cost_per_extra_floor", 0.0)
+
+        for zone in plot["zones"]:
+            zone_plot.append(i)
+            zone_percentage.append(zone["percentage"])
+            zone_density_factor.append(zone["density_factor"])
+            zone_type.append(ZONE_TYPE_CODES.get(zone["density_type"].lower(), UNKNOWN_TYPE))
+
+    columns["zone_plot"] = np.array(zone_plot, dtype=np.int64)
+    columns["zone_percentage"] = np.array(zone_percentage, dtype=np.float64)
+    columns["zone_density_factor"] = np.array(zone_density_factor, dtype=np.float64)
+    columns["zone_type"] = np.array(zone_type, dtype=np.int8)
+
+    # Optional geometry inputs (see geometry.py): adjacency cluster labels and building footprints
+    clusters = plot_clusters(plots)
+    if clusters is not None:
+        columns["plot_cluster"] = np.array(clusters, dtype=np.int64)
+    if any("footprint_area" in plot for plot in plots):
+        columns["footprint_area"] = np.array([plot.get("footprint_area", np.nan) for plot in plots], dtype=np.float64)
+    return columns
+
+
+# ----------------------- Vectorized Calculation -----------------------#
+
+# Function to compute every per-plot and per-zone output in one pass
+def compute_plot_columns(columns, rule_table=None):
+    rule_table = rule_table or DEFAULT_RULE_TABLE
+    plot_size = np.asarray(columns["plot_size"], dtype=np.float64)
+    is_parceled = np.asarray(columns["is_parceled"], dtype=np.bool_)
+
+    # Optional "plot_cluster" labels (see geometry.adjacency_clusters) pool the tier areas of
+    # adjacent unparceled plots; without them every plot is looked up on its own area
+    plot_cluster = columns.get("plot_cluster")
+    if plot_cluster is None:
+        tier_area = lambda areas: areas
+    else:
+        plot_cluster = np.asarray(plot_cluster, dtype=np.int64)
+        tier_area = lambda areas: np.bincount(plot_cluster, weights=np.where(is_parceled, 0.0, areas))[plot_cluster]
+
+    # Road & green deductions (parceled plots keep their full size; NaN road % comes from the rule table)
+    road_deduction_percent = np.asarray(columns["road_deduction_percent"], dtype=np.float64)
+    missing_road = np.isnan(road_deduction_percent) & ~is_parceled
+    if missing_road.any():
+        road_deduction_percent = np.where(missing_road, rule_table.road_percentages(tier_area(plot_size)),
+                                          road_deduction_percent)
+    road_deduction = plot_size * (road_deduction_percent / 100)
+    area_after_road = plot_size - road_deduction
+    green_percentage = rule_table.green_percentages(tier_area(area_after_road))
+    green_deduction = area_after_road * (green_percentage / 100)
+    net_plot_size = np.where(is_parceled, plot_size, area_after_road - green_deduction)
+    road_deduction = np.where(is_parceled, 0.0, road_deduction)
+    green_deduction = np.where(is_parceled, 0.0, green_deduction)
+
+    # Coverage, floors and extra floors
+    coverage_percent = np.asarray(columns["coverage_percent"], dtype=np.float64)
+    coverage_area = net_plot_size * (coverage_percent / 100)
+    footprint_area = columns.get("footprint_area")
+    if footprint_area is not None:
+        # A building footprint (NaN where unknown) is the coverage; a coverage_percent above 0 caps it
+        footprint_area = np.asarray(footprint_area, dtype=np.float64)
+        footprint_coverage = np.where(coverage_percent > 0, np.minimum(footprint_area, coverage_area), footprint_area)
+        coverage_area = np.where(np.isnan(footprint_area), coverage_area, footprint_coverage)
+    max_height = np.asarray(columns["max_height"], dtype=np.float64)
+    floor_height = np.asarray(columns["floor_height"], dtype=np.float64)
+    base_floors = np.floor_divide(max_height, floor_height, out=np.zeros_like(max_height), where=floor_height > 0)
+    extra_floors = np.asarray(columns["extra_floors"], dtype=np.int64)
+    has_extra = np.asarray(columns["allow_extra_floors"], dtype=np.bool_) & (extra_floors > 0)
+    max_floors = base_floors.astype(np.int64) + np.where(has_extra, extra_floors, 0)
+    extra_floors_cost = np.where(has_extra, extra_floors * np.asarray(columns["cost_per_extra_floor"], dtype=np.float64), 0.0)
+    max_buildable_area = coverage_area * max_floors
+
+    # Zone-based buildable area
+    zone_plot = np.asarray(columns["zone_plot"], dtype=np.int64)
+    zone_area = net_plot_size[zone_plot] * (np.asarray(columns["zone_percentage"], dtype=np.float64) / 100)
+    zone_density_sum = zone_area * np.asarray(columns["zone_density_factor"], dtype=np.float64)
+    zone_buildable_area = zone_density_sum / 100
+
+    return {
+        "net_plot_size": net_plot_size,
+        "road_deduction": road_deduction,
+        "green_deduction": green_deduction,
+        "coverage_area": coverage_area,
+        "max_floors": max_floors,
+        "extra_floors_cost": extra_floors_cost,
+        "max_buildable_area": max_buildable_area,
+        "zone_area": zone_area,
+        "zone_density_sum": zone_density_sum,
+        "zone_buildable_area": zone_buildable_area,
+    }
+
+
+# Function to sum per-plot outputs into the running sums of calculate_totals
+def aggregate_plot_columns(columns, outputs, plot_segments=None, num_segments=1):
+    """Return TOTAL_SUM_KEYS sums as arrays with one entry per segment (project or scenario)."""
+    num_plots = len(outputs["net_plot_size"])
+    if plot_segments is None:
+        plot_segments = np.zeros(num_plots, dtype=np.int64)
+    zone_segments = plot_segments[np.asarray(columns["zone_plot"], dtype=np.int64)]
+    zone_type = np.asarray(columns["zone_type"])
+    unparceled = ~np.asarray(columns["is_parceled"], dtype=np.bool_)
+
+    # bincount accumulates in input order, matching the sequential sums of calculate_totals
+    # (and returns integers when there are no rows, so sums are cast back to floats)
+    def plot_sum(values):
+        return np.bincount(plot_segments, weights=values, minlength=num_segments).astype(np.float64, copy=False)
+
+    def zone_sum(values, zone_mask):
+        return np.bincount(zone_segments, weights=np.where(zone_mask, values, 0.0),
+                           minlength=num_segments).astype(np.float64, copy=False)
+
+    is_commercial = zone_type == COMMERCIAL
+    is_residential = zone_type == RESIDENTIAL
+    return {
+        "total_net_area": plot_sum(np.where(unparceled, outputs["net_plot_size"], 0.0)),
+        "total_road_deduction": plot_sum(outputs["road_deduction"]),
+        "total_green_deduction": plot_sum(outputs["green_deduction"]),
+        "commercial_area": zone_sum(outputs["zone_area"], is_commercial),
+        "commercial_density_sum": zone_sum(outputs["zone_density_sum"], is_commercial),
+        "residential_area": zone_sum(outputs["zone_area"], is_residential),
+        "residential_density_sum": zone_sum(outputs["zone_density_sum"], is_residential),
+        "total_coverage_area": plot_sum(outputs["coverage_area"]),
+        "total_max_floors": np.bincount(plot_segments, weights=outputs["max_floors"], minlength=num_segments).astype(np.int64),
+        "total_extra_floors_cost": plot_sum(outputs["extra_floors_cost"]),
+    }
+
+
+# Function to summarize per-segment sums into arrays of totals
+def summarize_totals_arrays(sums, apply_efficiency_incentive):
+    """Vectorized summarize_totals: every value is an array with one entry per segment."""
+    commercial_area = sums["commercial_area"]
+    residential_area = sums["residential_area"]
+    commercial_density_avg = np.divide(sums["commercial_density_sum"], commercial_area,
+                                       out=np.zeros_like(commercial_area), where=commercial_area != 0)
+    residential_density_avg = np.divide(sums["residential_density_sum"], residential_area,
+                                        out=np.zeros_like(residential_area), where=residential_area != 0)
+
+    commercial_buildable_area = (commercial_area * commercial_density_avg) / 100
+    residential_buildable_area = (residential_area * residential_density_avg) / 100
+    incentive_area = 0.05 * (commercial_buildable_area + residential_buildable_area)
+    incentive_area = np.where(apply_efficiency_incentive, incentive_area, 0.0)
+    total_buildable_area = commercial_buildable_area + residential_buildable_area + incentive_area
+
+    return {
+        "total_net_area": np.round(sums["total_net_area"]),
+        "total_road_deduction": np.round(sums["total_road_deduction"]),
+        "total_green_deduction": np.round(sums["total_green_deduction"]),
+        "commercial_avg_density": np.round(commercial_density_avg),
+        "residential_avg_density": np.round(residential_density_avg),
+        "commercial_buildable_area": np.round(commercial_buildable_area),
+        "residential_buildable_area": np.round(residential_buildable_area),
+        "incentive_area": np.round(incentive_area),
+        "total_buildable_area": np.round(total_buildable_area),
+        "total_coverage_area": np.round(sums["total_coverage_area"]),
+        "total_max_floors": sums["total_max_floors"],
+        "total_extra_floors_cost": np.round(sums["total_extra_floors_cost"]),
+    }
+
+
+# ----------------------- Totals Entry Points -----------------------#
+
+# Function to write vectorized per-plot outputs back into plot dicts
+def write_plot_outputs(plots, columns, outputs):
+    net_plot_size = outputs["net_plot_size"].tolist()
+    road_deduction = outputs["road_deduction"].tolist()
+    green_deduction = outputs["green_deduction"].tolist()
+    coverage_area = outputs["coverage_area"].tolist()
+    max_floors = outputs["max_floors"].tolist()
+    extra_floors_cost = outputs["extra_floors_cost"].tolist()
+    max_buildable_area = outputs["max_buildable_area"].tolist()
+    zone_buildable_area = np.round(outputs["zone_buildable_area"]).astype(np.int64).tolist()
+    zone_offsets = np.searchsorted(np.asarray(columns["zone_plot"], dtype=np.int64), np.arange(len(plots) + 1)).tolist()
+
+    for i, plot in enumerate(plots):
+        if plot["is_parceled"]:
+            plot["net_plot_size"] = plot["plot_size"]
+            plot["road_deduction"] = 0
+            plot["green_deduction"] = 0
+        else:
+            plot["net_plot_size"] = net_plot_size[i]
+            plot["road_deduction"] = road_deduction[i]
+            plot["green_deduction"] = green_deduction[i]
+        plot["coverage_area"] = coverage_area[i]
+        plot["max_floors"] = max_floors[i]
+        plot["extra_floors_cost"] = extra_floors_cost[i]
+        plot["max_buildable_area"] = max_buildable_area[i]
+        plot["zone_buildable_areas"] = zone_buildable_area[zone_offsets[i]:zone_offsets[i + 1]]
+    return plots
+
+
+# Function to calculate project totals from column arrays
+def calculate_totals_columnar(columns, apply_efficiency_incentive, plots=None, rule_table=None):
+    """Vectorized equivalent of calculate_totals over a columnar plot table.
+
+    Zone rows must be grouped by plot (``zone_plot`` non-decreasing). When ``plots`` is given,
+    per-plot outputs are written into those dicts exactly like calculate_totals does; otherwise
+    the "plots" entry is left empty so large registers never materialize per-plot dicts.
+    """
+    with span("batch.compute"):
+        outputs = compute_plot_columns(columns, rule_table)
+    with span("batch.aggregation"):
+        sums = aggregate_plot_columns(columns, outputs)
+        sums = {key: sums[key][0].item() for key in TOTAL_SUM_KEYS}
+    increment("batch.plots", len(outputs["net_plot_size"]))
+    if plots is None:
+        plots = []
+    else:
+        with span("batch.write_plot_outputs"):
+            write_plot_outputs(plots, columns, outputs)
+    return summarize_totals(sums, apply_efficiency_incentive, plots)
+
+
+# Function to calculate totals with the same signature as calculate_totals
+def calculate_totals_batch(plots, apply_efficiency_incentive, green_allocation_method, custom_green_allocations, rule_table=None):
+    return calculate_totals_columnar(plots_to_columns(plots), apply_efficiency_incentive, plots, rule_table)
+
+
+# Function to calculate totals for many projects in one vectorized pass
+def calculate_totals_many(projects, rule_table=None):
+    """Return one calculate_totals result per ``(plots, apply_efficiency_incentive)`` project.
+
+    All projects' plots are concatenated into a single column table, computed together and
+    summed per project segment; per-plot outputs are written into each project's plot dicts.
+    """
+    projects = list(projects)
+    all_plots = [plot for plots, _ in projects for plot in plots]
+    columns = plots_to_columns(all_plots)
+    segments = np.repeat(np.arange(len(projects), dtype=np.int64), [len(plots) for plots, _ in projects])
+    if "plot_cluster" in columns:
+        # Cluster labels are per project; keep clusters of different projects apart
+        columns["plot_cluster"] = columns["plot_cluster"] + segments * (columns["plot_cluster"].max() + 1)
+    with span("batch.compute"):
+        outputs = compute_plot_columns(columns, rule_table)
+    with span("batch.aggregation"):
+        sums = aggregate_plot_columns(columns, outputs, segments, len(projects))
+        sums = {key: sums[key].tolist() for key in TOTAL_SUM_KEYS}
+    increment("batch.plots", len(all_plots))
+    with span("batch.write_plot_outputs"):
+        write_plot_outputs(all_plots, columns, outputs)
+    return [summarize_totals({key: sums[key][k] for key in TOTAL_SUM_KEYS}, apply_efficiency_incentive, plots)
+            for k, (plots, apply_efficiency_incentive) in enumerate(projects)]
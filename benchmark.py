@@ -0,0 +1,325 @@
+"""Benchmark suite for the calculation and report paths.
+
+Generates seeded synthetic projects, measures latency percentiles, throughput and peak
+memory for each path across plot counts and zones per plot, and compares the run against a
+saved baseline. Example:
+
+    python benchmark.py --sizes 1 100 10000 --zones 1 3 --save-baseline benchmark_baseline.json
+    python benchmark.py --sizes 1 100 10000 --zones 1 3 --baseline benchmark_baseline.json --threshold 0.25
+
+The run exits with status 1 when any measurement regresses beyond the threshold.
+Portfolio ranking scaling across worker processes is measured separately:
+
+    python benchmark.py --portfolio-scaling --projects 2000 --plots-per-project 50 --workers 1 2 4 8
+"""
+import argparse
+import copy
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from Calculations import calculate_totals, green_area_formula
+
+DEFAULT_SIZES = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+DEFAULT_ZONES = (1, 3)
+DEFAULT_THRESHOLD = 0.20
+
+# Largest plot count each path is run at by default (report paths render every plot)
+PATH_MAX_PLOTS = {
+    "calculate_totals": 1_000_000,
+    "calculate_totals_columnar": 1_000_000,
+    "calculate_project": 1_000_000,
+    "green_area_formula": 1_000_000,
+    "generate_excel_report": 100_000,
+    "generate_pdf_report": 10_000,
+}
+
+# Target wall time per measurement; small inputs are repeated until they fill it
+TARGET_SECONDS = 0.5
+MAX_REPEATS = 200
+
+
+# ----------------------- Synthetic Projects -----------------------#
+
+# Function to generate a seeded synthetic project in the sidebar's plot dict shape
+def generate_plots(num_plots, zones_per_plot, seed=0):
+    rng = random.Random(seed)
+    plots = []
+    for i in range(num_plots):
+        # Split 100% across the zones the way the sidebar sliders do
+        cuts = sorted(rng.randint(0, 100) for _ in range(zones_per_plot - 1))
+        percentages = [b - a for a, b in zip([0] + cuts, cuts + [100])]
+        allow_extra_floors = rng.random() < 0.3
+        plots.append({
+            "serial_number": f"Plot-{i + 1}",
+            "plot_size": rng.randint(200, 60_000),
+            "is_parceled": rng.random() < 0.4,
+            "road_deduction_percent": rng.randint(0, 50),
+            "coverage_percent": rng.randint(0, 100),
+            "max_height": float(rng.choice([9, 12, 15, 18, 24])),
+            "floor_height": rng.choice([3.0, 3.5]),
+            "allow_extra_floors": allow_extra_floors,
+            "extra_floors": rng.randint(1, 3) if allow_extra_floors else 0,
+            "cost_per_extra_floor": 25000.0 if allow_extra_floors else 0.0,
+            "zones": [{
+                "percentage": percentage,
+                "density_factor": rng.randint(10, 200),
+                "density_type": rng.choice(["Residential", "Commercial"]),
+            } for percentage in percentages],
+        })
+    return plots
+
+
+# ----------------------- Benchmark Paths -----------------------#
+
+# Each path takes the generated plots and returns a zero-argument callable to time
+def _prepare_calculate_totals(plots):
+    return lambda: calculate_totals(plots, True, "Proportional", [])
+
+
+def _prepare_calculate_totals_columnar(plots):
+    from batch_calculations import calculate_totals_columnar, plots_to_columns
+    columns = plots_to_columns(plots)
+    return lambda: calculate_totals_columnar(columns, True)
+
+
+def _prepare_calculate_project(plots):
+    from models import Plot, calculate_project
+    records = [Plot.from_dict(plot) for plot in plots]
+    return lambda: calculate_project(records, True)
+
+
+def _prepare_green_area_formula(plots):
+    areas = [plot["plot_size"] for plot in plots]
+    return lambda: [green_area_formula(area) for area in areas]
+
+
+def _prepare_excel_report(plots):
+    from reports import generate_excel_report
+    results = calculate_totals(copy.deepcopy(plots), True, "Proportional", [])
+    return lambda: generate_excel_report(results, 1_000_000, 1234.5)
+
+
+def _prepare_pdf_report(plots):
+    from reports import generate_pdf_report
+    results = calculate_totals(copy.deepcopy(plots), True, "Proportional", [])
+    return lambda: generate_pdf_report(results, 1_000_000, 1234.5, "Benchmark Project")
+
+
+PATHS = {
+    "calculate_totals": _prepare_calculate_totals,
+    "calculate_totals_columnar": _prepare_calculate_totals_columnar,
+    "calculate_project": _prepare_calculate_project,
+    "green_area_formula": _prepare_green_area_formula,
+    "generate_excel_report": _prepare_excel_report,
+    "generate_pdf_report": _prepare_pdf_report,
+}
+
+
+# ----------------------- Measurement -----------------------#
+
+# Function to compute a percentile of sorted samples (nearest rank)
+def _percentile(sorted_samples, percent):
+    rank = max(0, min(len(sorted_samples) - 1, round(percent / 100 * len(sorted_samples) + 0.5) - 1))
+    return sorted_samples[rank]
+
+
+# Function to time a callable and measure its peak traced memory
+def measure(run, num_plots, repeats=None, measure_memory=True):
+    gc.collect()
+    start = time.perf_counter()
+    run()  # Warm-up run, also used to size the repeat count
+    first = time.perf_counter() - start
+    if repeats is None:
+        repeats = max(1, min(MAX_REPEATS, int(TARGET_SECONDS / max(first, 1e-9))))
+
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+
+    peak_mb = None
+    if measure_memory:
+        gc.collect()
+        tracemalloc.start()
+        run()
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        tracemalloc.stop()
+
+    median = statistics.median(samples)
+    return {
+        "plots": num_plots,
+        "repeats": repeats,
+        "p50_ms": median * 1000,
+        "p95_ms": _percentile(samples, 95) * 1000,
+        "p99_ms": _percentile(samples, 99) * 1000,
+        "plots_per_second": num_plots / median if median else float("inf"),
+        "peak_mb": peak_mb,
+    }
+
+
+# Function to measure the memory a calculated project retains per plot, dicts vs models
+def memory_per_plot(num_plots, zones_per_plot, seed=0):
+    """Bytes per plot held after calculation: calculate_totals' plot dicts (inputs plus the
+    outputs written into them) against models' Plot records plus ProjectResults arrays."""
+    from models import calculate_project
+
+    plots = generate_plots(num_plots, zones_per_plot, seed)
+    retained = {}
+    for name, build in (("dicts", lambda: calculate_totals(copy.deepcopy(plots), True, "Proportional", [])),
+                        ("models", lambda: calculate_project(plots, True))):
+        gc.collect()
+        tracemalloc.start()
+        results = build()
+        retained[name] = tracemalloc.get_traced_memory()[0] / num_plots
+        tracemalloc.stop()
+        del results
+    retained["reduction"] = 1 - retained["models"] / retained["dicts"]
+    return retained
+
+
+# Function to time portfolio evaluation with an increasing number of worker processes
+def portfolio_scaling(num_projects, plots_per_project, zones_per_plot, workers, seed=0, repeats=3):
+    """Best-of-``repeats`` seconds per worker count, with speedup and parallel efficiency
+    against the first count. Projects are saved as configuration files first, so every run
+    includes loading them; one worker runs in-process, more load their own ranges."""
+    from portfolio import evaluate_portfolio
+    from utils import save_configuration
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i in range(num_projects):
+            paths.append(os.path.join(directory, f"project_{i + 1}.json"))
+            save_configuration({"project_name": f"Project {i + 1}", "apply_efficiency_incentive": i % 2 == 0,
+                                "total_price": 1_000_000.0 + 1_000 * i,
+                                "plots": generate_plots(plots_per_project, zones_per_plot, seed + i)}, paths[-1])
+        for count in workers:
+            seconds = min(_timed(lambda: evaluate_portfolio(paths, max_workers=count, parallel_threshold=0))
+                          for _ in range(repeats))
+            results[count] = {"seconds": seconds}
+    base_workers, base = workers[0], results[workers[0]]["seconds"]
+    for count, result in results.items():
+        result["speedup"] = base / result["seconds"]
+        result["efficiency"] = result["speedup"] * base_workers / count
+    return results
+
+
+# Function to time one call in seconds
+def _timed(run):
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
+
+
+# Function to run every selected path over every plot count and zone count
+def run_benchmarks(paths, sizes, zones, seed=0, repeats=None, measure_memory=True, log=print):
+    results = {}
+    for zones_per_plot in zones:
+        for num_plots in sizes:
+            plots = None
+            for path in paths:
+                if num_plots > PATH_MAX_PLOTS[path]:
+                    continue
+                if plots is None:
+                    plots = generate_plots(num_plots, zones_per_plot, seed)
+                result = measure(PATHS[path](plots), num_plots, repeats, measure_memory)
+                key = f"{path}|plots={num_plots}|zones={zones_per_plot}"
+                results[key] = result
+                log(format_result(key, result))
+    return results
+
+
+def format_result(key, result):
+    peak = f"{result['peak_mb']:9.2f} MB" if result["peak_mb"] is not None else "        n/a"
+    return (f"{key:<55} p50 {result['p50_ms']:10.3f} ms  p95 {result['p95_ms']:10.3f} ms  "
+            f"p99 {result['p99_ms']:10.3f} ms  {result['plots_per_second']:14,.0f} plots/s  {peak}")
+
+
+# ----------------------- Baselines -----------------------#
+
+# Function to list measurements that regressed beyond the threshold
+def find_regressions(results, baseline, threshold=DEFAULT_THRESHOLD):
+    regressions = []
+    for key, result in results.items():
+        reference = baseline.get(key)
+        if reference is None:
+            continue
+        for metric in ("p50_ms", "peak_mb"):
+            current, previous = result.get(metric), reference.get(metric)
+            if current is None or not previous:
+                continue
+            if current > previous * (1 + threshold):
+                regressions.append(f"{key} {metric}: {previous:.3f} -> {current:.3f} "
+                                   f"(+{(current / previous - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark calculation and report paths.")
+    parser.add_argument("--paths", nargs="+", choices=list(PATHS), default=list(PATHS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES), help="Plot counts to run.")
+    parser.add_argument("--zones", nargs="+", type=int, default=list(DEFAULT_ZONES), help="Zones per plot to run.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=None, help="Timed runs per measurement (default: adaptive).")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc peak memory run.")
+    parser.add_argument("--memory-per-plot", action="store_true",
+                        help="Only report bytes retained per plot by dict results against models results.")
+    parser.add_argument("--portfolio-scaling", action="store_true",
+                        help="Only time portfolio ranking for each --workers count.")
+    parser.add_argument("--projects", type=int, default=2_000, help="Projects in the portfolio scaling run.")
+    parser.add_argument("--plots-per-project", type=int, default=50)
+    parser.add_argument("--workers", nargs="+", type=int, help="Worker counts (default: 1 up to the CPU count).")
+    parser.add_argument("--output", help="Write results to this JSON file.")
+    parser.add_argument("--baseline", help="Compare against this baseline JSON file.")
+    parser.add_argument("--save-baseline", help="Save results as a baseline JSON file.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown or memory growth over the baseline (0.2 = 20%%).")
+    args = parser.parse_args(argv)
+
+    if args.memory_per_plot:
+        for zones_per_plot in args.zones:
+            for num_plots in sorted(args.sizes):
+                retained = memory_per_plot(num_plots, zones_per_plot, args.seed)
+                print(f"plots={num_plots:<9} zones={zones_per_plot}  dicts {retained['dicts']:8.0f} B/plot  "
+                      f"models {retained['models']:8.0f} B/plot  ({retained['reduction']:.0%} less)")
+        return 0
+
+    if args.portfolio_scaling:
+        cpus = os.cpu_count() or 1
+        workers = sorted(args.workers or {1, *(2 ** k for k in range(1, cpus.bit_length())), cpus})
+        print(f"{args.projects:,} projects x {args.plots_per_project} plots, {cpus} CPU(s)")
+        for count, result in portfolio_scaling(args.projects, args.plots_per_project, args.zones[0], workers,
+                                               args.seed).items():
+            print(f"workers={count:<3} {result['seconds']:8.3f} s  speedup {result['speedup']:5.2f}x  "
+                  f"efficiency {result['efficiency']:.0%}")
+        return 0
+
+    results = run_benchmarks(args.paths, sorted(args.sizes), args.zones, args.seed, args.repeats, not args.no_memory)
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w") as file:
+            json.dump(results, file, indent=4)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = find_regressions(results, json.load(file), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\nNo regressions beyond {args.threshold:.0%}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+import math
+
+import numpy as np
+
+from batch_calculations import aggregate_plot_columns, compute_plot_columns, plots_to_columns, summarize_totals_arrays
+from rules import DEFAULT_RULE_TABLE
+from sweep import tile_columns
+
+# Plot inputs the solver can search, with their default search ranges
+SOLVE_RANGES = {
+    "plot_size": (0.0, 1_000_000.0),
+    "max_height": (0.0, 200.0),
+    "coverage_percent": (0.0, 100.0),
+}
+
+# Most ulps a piece end is stepped back to land in its piece (breakpoints are off by a few at most)
+MAX_END_STEPS = 64
+
+# Per-candidate metrics a target can be set on (totals are rounded like calculate_totals)
+SOLVE_METRICS = ("total_buildable_area", "total_net_area", "total_coverage_area", "max_buildable_area")
+
+
+# ----------------------- Evaluation -----------------------#
+
+# Function to build the column table of candidate plots, each screened as a standalone project
+def _candidate_columns(plots):
+    columns = plots_to_columns(plots)
+    columns.pop("plot_cluster", None)  # no tier pooling with neighbouring plots (see geometry.py)
+    return columns
+
+
+# Function to calculate every candidate plot as its own one-plot project
+def _candidate_totals(columns, apply_efficiency_incentive, rule_table=None):
+    outputs = compute_plot_columns(columns, rule_table)
+    num_plots = len(columns["plot_size"])
+    segments = np.arange(num_plots, dtype=np.int64)
+    totals = summarize_totals_arrays(aggregate_plot_columns(columns, outputs, segments, num_plots),
+                                     apply_efficiency_incentive)
+    totals["max_buildable_area"] = outputs["max_buildable_area"]
+    return totals
+
+
+# Function to evaluate a metric for every candidate at several parameter values at once
+def _evaluate(columns, parameter, values, metric, apply_efficiency_incentive, rule_table):
+    """``values`` is (candidates, points); returns the metric in the same shape."""
+    num_plots, num_points = values.shape
+    tiled = tile_columns(columns, num_points)
+    tiled[parameter] = values.T.ravel()
+    totals = _candidate_totals(tiled, apply_efficiency_incentive, rule_table)
+    return totals[metric].reshape(num_points, num_plots).T
+
+
+# Function to list the parameter values where a candidate's metric can jump
+def _breakpoints(columns, parameter, low, high, rule_table):
+    """Return (candidates, breakpoints), padded with ``high``.
+
+    Between two breakpoints every metric is continuous and nondecreasing in the parameter;
+    at a breakpoint it may jump either way (a higher green tier takes area away).
+    """
+    num_plots = len(columns["plot_size"])
+    if parameter == "plot_size":
+        # Green tiers apply to the area after road; road tiers (if taken from the table) to the plot size
+        thresholds = np.asarray(rule_table.thresholds, dtype=np.float64)
+        road = np.asarray(columns["road_deduction_percent"], dtype=np.float64)
+        missing_road = np.isnan(road)
+        table_roads = np.asarray(rule_table.road_percents if rule_table.road_percents is not None else [0.0])
+        roads = np.where(missing_road[:, None], table_roads[None, :], road[:, None])
+        with np.errstate(divide="ignore"):
+            green = thresholds[None, None, :] / (1 - roads[:, :, None] / 100)
+        points = np.concatenate([green.reshape(num_plots, -1),
+                                 np.where(missing_road[:, None], thresholds[None, :], np.nan)], axis=1)
+        points[np.asarray(columns["is_parceled"], dtype=np.bool_)] = np.nan
+    elif parameter == "max_height":
+        # Base floors step up at every multiple of the floor height
+        floor_height = np.asarray(columns["floor_height"], dtype=np.float64)
+        valid = floor_height > 0
+        step = np.where(valid, floor_height, 1.0)
+        first = np.where(valid, np.ceil(low / step), 0)
+        count = np.where(valid, np.floor(high / step) - first + 1, 0)
+        points = (first[:, None] + np.arange(max(1, int(count.max(initial=0))))) * step[:, None]
+        points[np.arange(points.shape[1])[None, :] >= count[:, None]] = np.nan
+    else:
+        points = np.full((num_plots, 0), np.nan)
+    points = np.where(np.isfinite(points) & (points > low) & (points < high), points, high)
+    return np.sort(points, axis=1)
+
+
+# Function to label the piece (green/road tier or base floor count) each parameter value falls in
+def _piece_labels(columns, parameter, values, rule_table):
+    """``values`` is (candidates, points). Labels are computed forward, like compute_plot_columns,
+    so they change exactly where the metric can jump."""
+    if parameter == "plot_size":
+        thresholds = np.asarray(rule_table.thresholds, dtype=np.float64)
+        road = np.asarray(columns["road_deduction_percent"], dtype=np.float64)[:, None]
+        missing_road = np.broadcast_to(np.isnan(road), values.shape)
+        road_tier = np.where(missing_road, np.searchsorted(thresholds, values, side="right"), 0)
+        if missing_road.any():
+            road = np.where(missing_road, rule_table.road_percentages(values), road)
+        area_after_road = values - values * (road / 100)
+        return np.searchsorted(thresholds, area_after_road, side="right") * (len(thresholds) + 1) + road_tier
+    if parameter == "max_height":
+        floor_height = np.asarray(columns["floor_height"], dtype=np.float64)[:, None]
+        return np.floor_divide(values, floor_height, out=np.zeros_like(values), where=floor_height > 0)
+    return np.zeros(values.shape, dtype=np.int64)
+
+
+# ----------------------- Solvers -----------------------#
+
+# Function to find the smallest parameter value that lets every candidate plot reach a target
+def min_parameter_values(plots, parameter, target, metric="total_buildable_area", apply_efficiency_incentive=False,
+                         low=None, high=None, tol=0.01, rule_table=None):
+    """Smallest value of ``parameter`` in [low, high] with ``metric >= target``, per candidate plot.
+
+    Each plot is screened as its own one-plot project with its other inputs unchanged;
+    ``target`` is a scalar or one value per plot. The search range is split at the green/road
+    tier boundaries and floor steps, where the metric can jump; inside each piece it only
+    grows, so the first piece that reaches the target is bisected, for all candidates at
+    once, to within ``tol``. Candidates that cannot reach the target give NaN.
+    """
+    if parameter not in SOLVE_RANGES:
+        raise ValueError(f"Cannot solve for {parameter!r}; choose from {', '.join(SOLVE_RANGES)}.")
+    if metric not in SOLVE_METRICS:
+        raise ValueError(f"Unknown metric {metric!r}; choose from {', '.join(SOLVE_METRICS)}.")
+    rule_table = rule_table or DEFAULT_RULE_TABLE
+    low = SOLVE_RANGES[parameter][0] if low is None else float(low)
+    high = SOLVE_RANGES[parameter][1] if high is None else float(high)
+    if high < low:
+        raise ValueError("The search range is empty (high < low).")
+    columns = _candidate_columns(plots)
+    num_plots = len(columns["plot_size"])
+    target = np.broadcast_to(np.asarray(target, dtype=np.float64), (num_plots,))
+    evaluate = lambda values: _evaluate(columns, parameter, values, metric, apply_efficiency_incentive, rule_table)
+
+    # Pieces [start, end) between breakpoints; the last piece also holds ``high``
+    edges = np.concatenate([np.full((num_plots, 1), low), _breakpoints(columns, parameter, low, high, rule_table),
+                            np.full((num_plots, 1), high)], axis=1)
+    starts = edges[:, :-1]
+    ends = np.nextafter(edges[:, 1:], -np.inf)
+    ends[:, -1] = high
+
+    # A breakpoint is computed backwards (threshold / (1 - road)), so one ulp below it can still
+    # compute forward into the next tier; step each end back until it is in its piece's tier
+    inside = _piece_labels(columns, parameter, (starts + edges[:, 1:]) / 2, rule_table)
+    for _ in range(MAX_END_STEPS):
+        outside = (_piece_labels(columns, parameter, ends, rule_table) != inside) & (ends > starts)
+        outside[:, -1] = False
+        if not outside.any():
+            break
+        ends = np.where(outside, np.nextafter(ends, -np.inf), ends)
+    reaches = (evaluate(ends) >= target[:, None]) & (ends >= starts)
+    found = reaches.any(axis=1)
+
+    rows = np.arange(num_plots)
+    piece = reaches.argmax(axis=1)
+    lo = starts[rows, piece]
+    hi = ends[rows, piece]
+    at_start = evaluate(lo[:, None])[:, 0] >= target
+    active = found & ~at_start
+
+    # Bisection keeps f(lo) < target <= f(hi) for every active candidate
+    width = (hi - lo)[active].max(initial=0.0)
+    for _ in range(math.ceil(math.log2(width / tol)) + 1 if width > tol else 0):
+        mid = (lo + hi) / 2
+        reached = evaluate(mid[:, None])[:, 0] >= target
+        hi = np.where(active & reached, mid, hi)
+        lo = np.where(active & ~reached, mid, lo)
+    return np.where(found, np.where(at_start, lo, hi), np.nan)
+
+
+# Function to find the smallest plot size that still gives each candidate a target buildable area
+def min_plot_sizes(plots, target_buildable_area, apply_efficiency_incentive=False, tol=0.01, rule_table=None):
+    return min_parameter_values(plots, "plot_size", target_buildable_area, "total_buildable_area",
+                                apply_efficiency_incentive, tol=tol, rule_table=rule_table)
+
+
+# Function to find the highest land price each candidate plot can take at a target price per m²
+def max_land_prices(plots, target_price_per_m2, apply_efficiency_incentive=False, include_extra_floors_cost=False,
+                    rule_table=None):
+    """Highest total price per candidate plot (each its own project) at ``target_price_per_m2``.
+
+    Price per m² is total price / total buildable area, so the bid is the target times the
+    buildable area; with ``include_extra_floors_cost`` the target is all-in and the extra
+    floors' cost comes off the bid (which can then be negative).
+    """
+    totals = _candidate_totals(_candidate_columns(plots), apply_efficiency_incentive, rule_table)
+    prices = np.asarray(target_price_per_m2, dtype=np.float64) * totals["total_buildable_area"]
+    if include_extra_floors_cost:
+        prices = prices - totals["total_extra_floors_cost"]
+    return prices
+
+
+# Function to find the highest land price for a whole project at a target price per m²
+def max_land_price(plots, target_price_per_m2, apply_efficiency_incentive=False, include_extra_floors_cost=False,
+                   rule_table=None):
+    columns = plots_to_columns(plots)
+    outputs = compute_plot_columns(columns, rule_table)
+    totals = summarize_totals_arrays(aggregate_plot_columns(columns, outputs), apply_efficiency_incentive)
+    price = target_price_per_m2 * totals["total_buildable_area"][0]
+    if include_extra_floors_cost:
+        price -= totals["total_extra_floors_cost"][0]
+    return float(price)
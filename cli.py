@@ -0,0 +1,111 @@
+"""Headless batch runner for saved project configurations.
+
+    python cli.py projects/*.json --output-dir results [--excel] [--pdf]
+
+Each input is a configuration written by utils.save_configuration. Results are written as
+JSON (to ``<output-dir>/<name>.results.json``, or one JSON line per project on stdout).
+pandas, fpdf and NumPy are only imported when a report or the columnar engine is requested,
+so numbers-only runs start quickly. With ``--store projects.db`` every run is saved in the
+SQLite project store, and inputs it has already calculated are not recalculated.
+"""
+import argparse
+import json
+import os
+import sys
+
+from Calculations import calculate_totals
+from utils import load_configuration
+
+
+# Function to calculate one project configuration
+def run_project(config, engine="python", store=None):
+    total_price = config.get("total_price", 0)
+    if store is not None:
+        # The store saves this run and reuses results it already holds for the same inputs
+        project_id = store.save_project(config)
+        results = store.load_project(project_id)["results"]
+        price_per_m2 = total_price / results['total_buildable_area'] if results['total_buildable_area'] else 0
+        return results, total_price, price_per_m2
+
+    if engine == "columnar":
+        from batch_calculations import calculate_totals_batch as calculate
+    else:
+        calculate = calculate_totals
+
+    results = calculate(
+        config["plots"],
+        config.get("apply_efficiency_incentive", False),
+        config.get("green_allocation_method", "Proportional"),
+        config.get("custom_green_allocations", []),
+    )
+    price_per_m2 = total_price / results['total_buildable_area'] if results['total_buildable_area'] else 0
+    return results, total_price, price_per_m2
+
+
+# Function to write the requested outputs for one project
+def write_outputs(name, config, results, total_price, price_per_m2, args):
+    payload = {
+        "project_name": config.get("project_name", name),
+        "total_price": total_price,
+        "price_per_m2": price_per_m2,
+        "results": results if args.include_plots else {k: v for k, v in results.items() if k != "plots"},
+    }
+    if args.output_dir:
+        with open(os.path.join(args.output_dir, f"{name}.results.json"), "w") as file:
+            json.dump(payload, file, indent=4)
+    else:
+        sys.stdout.write(json.dumps(payload) + "\n")
+
+    # Reports pull in pandas/xlsxwriter/fpdf, so they are imported only when asked for
+    report_dir = args.output_dir or "."
+    if args.excel:
+        from reports import generate_excel_report_streaming
+        generate_excel_report_streaming(results, total_price, price_per_m2, os.path.join(report_dir, f"{name}.xlsx"))
+    if args.pdf:
+        from reports import generate_pdf_report
+        pdf_data = generate_pdf_report(results, total_price, price_per_m2, payload["project_name"])
+        with open(os.path.join(report_dir, f"{name}.pdf"), "wb") as file:
+            file.write(pdf_data.getvalue())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calculate saved project configurations without the Streamlit UI.")
+    parser.add_argument("configs", nargs="+", help="Project configuration JSON files.")
+    parser.add_argument("--output-dir", help="Directory for result files (default: JSON lines on stdout).")
+    parser.add_argument("--excel", action="store_true", help="Also write an Excel report per project.")
+    parser.add_argument("--pdf", action="store_true", help="Also write a PDF report per project.")
+    parser.add_argument("--engine", choices=["python", "columnar"], default="python",
+                        help="Calculation engine; 'columnar' is faster for large projects but imports NumPy.")
+    parser.add_argument("--store", help="SQLite project store to save each project in; stored results are reused.")
+    parser.add_argument("--include-plots", action="store_true", help="Include per-plot results in the JSON output.")
+    args = parser.parse_args(argv)
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    store = None
+    if args.store:
+        from project_store import ProjectStore
+        store = ProjectStore(args.store)
+
+    failures = 0
+    for path in args.configs:
+        name = os.path.splitext(os.path.basename(path))[0]
+        config = load_configuration(path)
+        if config is None:
+            print(f"{path}: configuration not found", file=sys.stderr)
+            failures += 1
+            continue
+        try:
+            results, total_price, price_per_m2 = run_project(config, args.engine, store)
+            write_outputs(name, config, results, total_price, price_per_m2, args)
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"{path}: {e!r}", file=sys.stderr)
+            failures += 1
+    if store is not None:
+        store.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+import numpy as np
+
+# DCF assumptions; periods are whole periods (years by default), land is bought in period 0
+DCF_DEFAULTS = {
+    "construction_cost_per_m2": 1200.0,
+    "residential_price_per_m2": 3000.0,
+    "commercial_price_per_m2": 3500.0,
+    "discount_rate": 0.08,
+    "construction_start": 1,
+    "construction_periods": 2,
+    "sales_start": 2,
+    "sales_periods": 3,
+}
+PERIOD_KEYS = ("construction_start", "construction_periods", "sales_start", "sales_periods")
+
+# Cash flow lines, in the order of the cash flow matrices' middle axis
+CASH_FLOW_LINES = ("land", "construction", "extra_floors", "residential_sales", "commercial_sales")
+
+
+# ----------------------- Cash Flows -----------------------#
+
+# Function to spread an amount evenly over consecutive periods of a horizon
+def _phase(amounts, start, periods, horizon):
+    weights = np.zeros(horizon)
+    if periods > 0:
+        weights[start:start + periods] = 1 / periods
+    return np.asarray(amounts, dtype=np.float64)[:, None] * weights
+
+
+# Function to build time-phased cash flow lines for many projects or scenarios
+def build_cash_flows(total_price, residential_area, commercial_area, extra_floors_cost, assumptions=None):
+    """Return cash flow lines shaped (projects, CASH_FLOW_LINES, periods).
+
+    Amount inputs and price/cost assumptions may be scalars or arrays with one value per project
+    (or scenario); period assumptions are shared. Costs are negative, sales positive.
+    """
+    assumptions = {**DCF_DEFAULTS, **(assumptions or {})}
+    periods = {key: int(assumptions[key]) for key in PERIOD_KEYS}
+    if min(periods.values()) < 0:
+        raise ValueError("DCF periods cannot be negative.")
+    horizon = max(1, periods["construction_start"] + periods["construction_periods"],
+                  periods["sales_start"] + periods["sales_periods"])
+
+    residential_area, commercial_area, total_price, extra_floors_cost, cost_per_m2, residential_price, commercial_price = \
+        np.broadcast_arrays(*(np.atleast_1d(np.asarray(value, dtype=np.float64)) for value in (
+            residential_area, commercial_area, total_price, extra_floors_cost,
+            assumptions["construction_cost_per_m2"], assumptions["residential_price_per_m2"],
+            assumptions["commercial_price_per_m2"])))
+
+    construction = (periods["construction_start"], periods["construction_periods"], horizon)
+    sales = (periods["sales_start"], periods["sales_periods"], horizon)
+    return np.stack([
+        _phase(-total_price, 0, 1, horizon),
+        _phase(-cost_per_m2 * (residential_area + commercial_area), *construction),
+        _phase(-extra_floors_cost, *construction),
+        _phase(residential_price * residential_area, *sales),
+        _phase(commercial_price * commercial_area, *sales),
+    ], axis=1) + 0.0  # no negative zeros in periods without a cost
+
+
+# ----------------------- NPV & IRR -----------------------#
+
+# Function to discount net cash flows (projects, periods) at one rate per project
+def npv(cash_flows, rates):
+    cash_flows = np.atleast_2d(cash_flows)
+    rates = np.broadcast_to(np.asarray(rates, dtype=np.float64), cash_flows.shape[:1])
+    discount = (1 + rates[:, None]) ** -np.arange(cash_flows.shape[1])
+    return np.sum(cash_flows * discount, axis=1)
+
+
+# Function to find the IRR of every row of net cash flows at once
+def irr(cash_flows, low=-0.99, high=10.0, tol=1e-10, max_iter=200):
+    """Vectorized safeguarded Newton iteration on NPV(r) = 0 within [low, high].
+
+    Every row is bracketed and updated together: a Newton step is taken where it stays inside
+    the row's bracket, a bisection step otherwise. Rows whose NPV does not change sign over the
+    bracket (no IRR, or several for unconventional flows) give NaN.
+    """
+    cash_flows = np.atleast_2d(np.asarray(cash_flows, dtype=np.float64))
+    n = len(cash_flows)
+    t = np.arange(cash_flows.shape[1])
+    lo = np.full(n, low)
+    hi = np.full(n, high)
+    f_lo = npv(cash_flows, lo)
+    f_hi = npv(cash_flows, hi)
+    valid = np.sign(f_lo) * np.sign(f_hi) <= 0
+
+    rate = np.where(valid, (lo + hi) / 2, np.nan)
+    active = valid.copy()
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        r = rate[active]
+        cf = cash_flows[active]
+        discount = (1 + r[:, None]) ** -t
+        f = np.sum(cf * discount, axis=1)
+        df = np.sum(-t * cf * discount / (1 + r[:, None]), axis=1)
+
+        # Shrink the bracket around the root, then try Newton inside it
+        below = np.sign(f) == np.sign(f_lo[active])
+        lo_a = np.where(below, r, lo[active])
+        hi_a = np.where(below, hi[active], r)
+        f_lo[active] = np.where(below, f, f_lo[active])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            newton = r - f / df
+        inside = np.isfinite(newton) & (newton > lo_a) & (newton < hi_a)
+        step = np.where(inside, newton, (lo_a + hi_a) / 2)
+
+        done = (np.abs(step - r) < tol * (1 + np.abs(r))) | (f == 0)
+        lo[active], hi[active] = lo_a, hi_a
+        rate[active] = np.where(f == 0, r, step)
+        active[np.flatnonzero(active)[done]] = False
+    return rate
+
+
+# ----------------------- Project Evaluation -----------------------#
+
+# Function to split each project's buildable area into residential and commercial sales areas
+def _sales_areas(results):
+    residential = np.array([result["residential_buildable_area"] for result in results], dtype=np.float64)
+    commercial = np.array([result["commercial_buildable_area"] for result in results], dtype=np.float64)
+    total = np.array([result["total_buildable_area"] for result in results], dtype=np.float64)
+    # The efficiency incentive adds area on top of both types, so it is sold pro rata
+    base = residential + commercial
+    scale = np.divide(total, base, out=np.ones_like(total), where=base != 0)
+    return residential * scale, commercial * scale
+
+
+# Function to evaluate NPV and IRR for many calculate_totals results at once
+def evaluate_projects(results, total_prices, assumptions=None):
+    """Return arrays with one entry per project: npv, irr, revenue, cost and profit, plus the
+    (projects, CASH_FLOW_LINES, periods) cash flow lines."""
+    assumptions = {**DCF_DEFAULTS, **(assumptions or {})}
+    residential_area, commercial_area = _sales_areas(results)
+    extra_floors_cost = np.array([result["total_extra_floors_cost"] for result in results], dtype=np.float64)
+    lines = build_cash_flows(total_prices, residential_area, commercial_area, extra_floors_cost, assumptions)
+    net = lines.sum(axis=1)
+    revenue = lines[:, 3:].sum(axis=(1, 2))
+    cost = -lines[:, :3].sum(axis=(1, 2))
+    return {
+        "npv": npv(net, assumptions["discount_rate"]),
+        "irr": irr(net),
+        "revenue": revenue,
+        "cost": cost,
+        "profit": revenue - cost,
+        "cash_flows": lines,
+    }
+
+
+# Function to evaluate one project and lay out its cash flows by period
+def project_dcf(results, total_price, assumptions=None):
+    """Return {"summary": [(label, value)], "cash_flows": [(period, *lines, net, discounted)]}."""
+    assumptions = {**DCF_DEFAULTS, **(assumptions or {})}
+    evaluation = evaluate_projects([results], [total_price], assumptions)
+    lines = evaluation["cash_flows"][0]
+    net = lines.sum(axis=0)
+    discounted = net * (1 + assumptions["discount_rate"]) ** -np.arange(len(net))
+    irr_value = evaluation["irr"][0]
+    return {
+        "npv": float(evaluation["npv"][0]),
+        "irr": None if np.isnan(irr_value) else float(irr_value),
+        "summary": [
+            ("Net Present Value (EUR)", float(evaluation["npv"][0])),
+            ("Internal Rate of Return", None if np.isnan(irr_value) else float(irr_value)),
+            ("Total Revenue (EUR)", float(evaluation["revenue"][0])),
+            ("Total Cost (EUR)", float(evaluation["cost"][0])),
+            ("Profit (EUR)", float(evaluation["profit"][0])),
+            ("Discount Rate", float(assumptions["discount_rate"])),
+        ],
+        "cash_flows": [(period, *map(float, lines[:, period]), float(net[period]), float(discounted[period]))
+                       for period in range(len(net))],
+    }
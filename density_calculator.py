@@ -1,18 +1,68 @@
+import io
+import os
+
+import altair as alt
+import pandas as pd
 import streamlit as st
 
-from Calculations import green_area_formula, calculate_totals
-from reports import generate_excel_report, generate_pdf_report
+import instrumentation
+from dcf import DCF_DEFAULTS, project_dcf
+from geometry import SAVED_PLOT_KEYS, calculate_totals_by_cluster, load_geojson_plots
+from green_allocation import allocate_green, max_green_allocations, project_green_requirement
+from incremental import IncrementalCalculator
+from optimizer import OBJECTIVES, optimize_project
+from pdf_layout import DETAILED_PDF_MIN_PLOTS, generate_detailed_pdf_report
+from plot_table import PLOT_TABLE_DEFAULTS, default_plot_table, plots_from_table
+from project_store import DEFAULT_DATABASE, ProjectStore
+from plot_register import calculate_totals_streaming, read_plot_register
+from risk import simulate_totals
+from report_cache import DEFAULT_MAX_BYTES, ReportCache, report_cache_key
+from reports import (DCF_CASH_FLOW_COLUMNS, PLOT_SUMMARY_COLUMNS, RISK_TABLE_COLUMNS, generate_excel_report_streaming,
+                     generate_pdf_report, iter_plot_summary_rows)
+from rules import load_rule_tables
+from sweep import SWEEP_METRIC_PARAMETERS, sweep_totals
+from utils import build_configuration
+
+
+# One report cache per server process, shared by all sessions
+@st.cache_resource
+def get_report_cache():
+    return ReportCache(max_bytes=int(os.environ.get("REPORT_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)))
+
+
+# One project store connection per server process (SQLite file, shared by all sessions)
+@st.cache_resource
+def get_project_store():
+    return ProjectStore(os.environ.get("PROJECTS_DB", DEFAULT_DATABASE))
+
 
 # Streamlit UI
 st.sidebar.image("logo.png", width=75)
+
+# Optional timing spans for this rerun (near-zero overhead when off), recorded per session
+show_debug_timings = st.sidebar.checkbox("Show Debug Timings", value=False)
+if show_debug_timings:
+    instrumentation.enable(st.session_state.setdefault("timings_recorder", instrumentation.Recorder()))
+else:
+    instrumentation.disable()
+rerun_span = instrumentation.span("streamlit.rerun").start()
+
 st.markdown("<h1 style='text-align: center;'>Project Density Analysis</h1>", unsafe_allow_html=True)
 
 st.sidebar.header("Plot Configuration")
-num_plots = st.sidebar.number_input("Number of Plots", min_value=1, max_value=10, value=1, step=1)
+# The table has no plot limit; the sidebar forms stay capped at 10 plots
+plot_entry = st.sidebar.radio("Plot Entry", ["Sidebar Forms", "Table"], horizontal=True)
+num_plots = st.sidebar.number_input("Number of Plots", min_value=1, max_value=10, value=1, step=1) if plot_entry == "Sidebar Forms" else 0
+plot_register_file = st.sidebar.file_uploader("Import Plot Register (CSV)", type="csv")
+plot_geometry_file = st.sidebar.file_uploader("Import Plot Geometry (GeoJSON)", type=["geojson", "json"])
 
 project_name = st.sidebar.text_input("Project Name", value="My Real Estate Project")
 
 apply_efficiency_incentive = st.sidebar.checkbox("Apply 5% Efficiency Incentive")
+
+# Municipality green/road tiers (rules.json, if present, adds tables to the built-in default)
+rule_tables = load_rule_tables(os.environ.get("RULES_FILE", "rules.json"))
+rule_table = rule_tables[st.sidebar.selectbox("Municipality Rules", list(rule_tables))]
 price_toggle = st.sidebar.radio("Specify Price For", ["Each Plot", "Total Project"])
 
 green_allocation_method = st.sidebar.radio("Public Green Allocation Method", ["Proportional", "Custom"])
@@ -20,6 +70,7 @@ custom_green_allocations = []
 
 total_price = 0
 plots = []
+changed_plots = None  # Indices of table plots edited since the last calculation, when known
 
 if price_toggle == "Total Project":
     total_price_input = st.text_input("Total Project Price (€)", value="100,000")
@@ -119,31 +170,156 @@ for i in range(num_plots):
         plot_price = st.number_input(f"Price for Plot {i + 1}", min_value=0, step=1, format="%d", key=f"price_{i}") if price_toggle == "Each Plot" else 0
         total_price += plot_price
 
-        plots.append({"serial_number": serial_number, "plot_size": plot_size, "is_parceled": is_parceled, "road_deduction_percent": road_deduction_percent, "zones": zones, "coverage_percent": coverage_percent
+        plots.append({"serial_number": serial_number, "plot_size": plot_size, "is_parceled": is_parceled, "road_deduction_percent": road_deduction_percent, "zones": zones, "coverage_percent": coverage_percent,
+                      "max_height": max_height, "floor_height": floor_height, "allow_extra_floors": allow_extra_floors, "extra_floors": extra_floors, "cost_per_extra_floor": cost_per_extra_floor
 })
 
+if plot_entry == "Table":
+    st.subheader("Plots")
+    if "plot_table" not in st.session_state:
+        st.session_state["plot_table"] = pd.DataFrame(default_plot_table(), columns=list(PLOT_TABLE_DEFAULTS))
+    column_config = {
+        "Road Deduction (%)": st.column_config.NumberColumn(min_value=0, max_value=50, step=1),
+        "Coverage (%)": st.column_config.NumberColumn(min_value=0, max_value=100, step=1),
+        "Green Allocation (%)": st.column_config.NumberColumn(min_value=0.0, max_value=100.0, format="%.1f"),
+    }
+    for zone in range(1, 4):
+        column_config[f"Zone {zone} %"] = st.column_config.NumberColumn(min_value=0, max_value=100, step=1)
+        column_config[f"Zone {zone} Type"] = st.column_config.SelectboxColumn(options=["Residential", "Commercial"])
+    if price_toggle != "Each Plot":
+        column_config["Price (€)"] = None
+    if green_allocation_method != "Custom":
+        column_config["Green Allocation (%)"] = None
+    plot_table = st.data_editor(st.session_state["plot_table"], num_rows="dynamic", column_config=column_config,
+                                hide_index=True, key="plot_table_editor")
+    plots, plot_prices, table_green_allocations, table_errors = plots_from_table(plot_table.to_dict("records"))
+    for error in table_errors:
+        st.error(error)
+    if price_toggle == "Each Plot":
+        total_price += sum(plot_prices)
+
+    # Rows edited or added since the last calculation, so only those plots are re-hashed;
+    # deleted or skipped rows shift the plot indices, and then every plot is checked
+    editor_state = st.session_state.get("plot_table_editor", {})
+    table_edits = {int(row) for row in editor_state.get("edited_rows", {})}
+    if not editor_state.get("deleted_rows") and not table_errors:
+        changed_plots = (table_edits | st.session_state.get("calculated_table_edits", set())
+                         | set(range(len(st.session_state["plot_table"]), len(plots))))
+
+# Imported plot polygons replace the sidebar plots (and their prices) while the file is loaded
+geometry_plots = None
+if plot_geometry_file is not None and plot_register_file is None:
+    if st.session_state.get("geometry_import", (None,))[0] != plot_geometry_file.file_id:
+        plot_geometry_file.seek(0)
+        try:
+            st.session_state["geometry_import"] = (plot_geometry_file.file_id, load_geojson_plots(plot_geometry_file), None)
+        except (KeyError, TypeError, ValueError) as e:
+            st.session_state["geometry_import"] = (plot_geometry_file.file_id, None, e)
+    _, geometry_plots, geometry_error = st.session_state["geometry_import"]
+    if geometry_error is not None:
+        st.error(f"Could not read the plot geometry: {geometry_error}")
+    if geometry_plots is not None:
+        if price_toggle == "Each Plot":
+            total_price = sum(plot["price"] for plot in geometry_plots)
+        st.sidebar.info(f"Calculating the {len(geometry_plots):,} imported GeoJSON plots"
+                        + (" at their `price` properties." if price_toggle == "Each Plot" else "."))
+
 if green_allocation_method == "Custom":
-    st.sidebar.header("Custom Green Area Allocation")
-    allocated_sum = 0
-
-    for i in range(num_plots):
-        max_allocation = 100 - allocated_sum
-        max_allocation = min(max_allocation, int(plots[i]["plot_size"] / green_area_formula(sum(p["plot_size"] for p in plots)) * 100))
-        allocation = st.sidebar.slider(
-            f"Green Allocation for Plot {i + 1} (%)",
-            min_value=0,
-            max_value=max_allocation,
-            value=min(100 // num_plots, max_allocation),
-            step=1,
-            key=f"custom_green_{i}"
-        )
-        allocated_sum += allocation
-        custom_green_allocations.append(allocation)
+    if plot_entry == "Table":
+        # One pass over the table column: validate, then fit to 100% within each plot's cap
+        allocation = allocate_green(plots, table_green_allocations, rule_table)
+        if allocation["errors"]:
+            st.warning("Custom green allocations were adjusted to sum to 100% within each plot's maximum: "
+                       + " ".join(allocation["errors"]))
+        custom_green_allocations = allocation["allocations"]
+    else:
+        st.sidebar.header("Custom Green Area Allocation")
+        # Project green requirement and per-plot caps are computed once, not once per plot
+        _, _, required_green_area = project_green_requirement(plots, rule_table)
+        max_allocations = max_green_allocations(plots, required_green_area)
+        allocated_sum = 0
+
+        for i in range(num_plots):
+            max_allocation = min(100 - allocated_sum, int(max_allocations[i]))
+            if max_allocation <= 0:
+                # A slider cannot have an empty range; this plot gets no share
+                st.sidebar.caption(f"Plot {i + 1}: no green allocation left to assign.")
+                custom_green_allocations.append(0)
+                continue
+            allocation = st.sidebar.slider(
+                f"Green Allocation for Plot {i + 1} (%)",
+                min_value=0,
+                max_value=max_allocation,
+                value=min(100 // num_plots, max_allocation),
+                step=1,
+                key=f"custom_green_{i}"
+            )
+            allocated_sum += allocation
+            custom_green_allocations.append(allocation)
+
+# Save the sidebar inputs in the project configuration format the batch CLI reads
+if st.sidebar.button("Save Configuration"):
+    # Saved with its results as a new version in the project store (unchanged inputs are not recalculated)
+    project_store = get_project_store()
+    if geometry_plots is not None:
+        # Imported plots are saved without polygons, with the cluster-pooled results the page shows
+        saved_plots = [dict(plot) for plot in geometry_plots]
+        saved_results = calculate_totals_by_cluster(saved_plots, apply_efficiency_incentive, rule_table=rule_table)
+        saved_results["plots"] = [{key: value for key, value in plot.items() if key != "geometry"}
+                                  for plot in saved_results["plots"]]
+        saved_config = build_configuration(project_name, [{key: plot[key] for key in SAVED_PLOT_KEYS if key in plot}
+                                                          for plot in saved_plots],
+                                           apply_efficiency_incentive, "Proportional", [], total_price)
+        project_id = project_store.save_project(saved_config, saved_results, rule_table=rule_table)
+    else:
+        project_id = project_store.save_project(build_configuration(project_name, plots, apply_efficiency_incentive,
+                                                                    green_allocation_method, custom_green_allocations,
+                                                                    total_price), rule_table=rule_table)
+    st.sidebar.success(f"Configuration saved as version #{project_id} of {project_name}")
+
+with st.sidebar.expander("Saved Versions", expanded=False):
+    saved_versions = get_project_store().find_projects(project_name=project_name, limit=20)
+    if saved_versions:
+        st.dataframe(pd.DataFrame(saved_versions).drop(columns=["input_hash"]), hide_index=True)
+    else:
+        st.caption("No saved versions of this project yet.")
 
 # Calculate button with session state handling
 if st.button("Calculate"):
-    # Perform calculations
-    results = calculate_totals(plots, apply_efficiency_incentive, green_allocation_method, custom_green_allocations)
+    if plot_register_file is not None:
+        # Stream the uploaded register chunk by chunk instead of the sidebar plots
+        plot_register_file.seek(0)
+        register_text = io.TextIOWrapper(plot_register_file, encoding="utf-8", newline="")
+        register_results = io.StringIO()
+        try:
+            results = calculate_totals_streaming(read_plot_register(register_text), apply_efficiency_incentive, output=register_results, rule_table=rule_table)
+        except ValueError as e:
+            st.error(f"Could not read the plot register: {e}")
+            st.stop()
+        finally:
+            register_text.detach()  # Keep the uploaded file open for later reruns
+        st.session_state["register_results"] = register_results.getvalue()
+    elif plot_geometry_file is not None:
+        if geometry_plots is None:
+            st.stop()  # The file could not be read (the error is shown above)
+        # Plot polygons: road and green tiers are pooled over each cluster of adjacent plots
+        results = calculate_totals_by_cluster([dict(plot) for plot in geometry_plots], apply_efficiency_incentive,
+                                              rule_table=rule_table)
+        st.session_state.pop("register_results", None)
+    else:
+        # Perform calculations (only plots whose inputs changed since the last run are recomputed)
+        if "calculator" not in st.session_state:
+            st.session_state["calculator"] = IncrementalCalculator()
+        if st.session_state.get("calculated_entry") != plot_entry:
+            changed_plots = None
+        results = st.session_state["calculator"].calculate_totals(plots, apply_efficiency_incentive, green_allocation_method, custom_green_allocations, rule_table, changed_plots)
+        st.session_state["calculated_entry"] = plot_entry
+        if plot_entry == "Table":
+            st.session_state["calculated_table_edits"] = table_edits
+        st.session_state.pop("register_results", None)
+    st.session_state.pop("risk", None)  # A simulation belongs to the results it was run on
+    st.session_state.pop("sweep", None)  # So does a sweep
+    st.session_state.pop("optimization", None)  # And an optimization of the previous plots
     price_per_m2 = total_price / results['total_buildable_area'] if results['total_buildable_area'] else 0
 
     # Store results in session state
@@ -190,8 +366,53 @@ if "calculated" in st.session_state and st.session_state["calculated"]:
         f"</details></div>",
         unsafe_allow_html=True
     )
+    # Discounted cash flow of the calculated project
+    st.subheader("Discounted Cash Flow")
+    with st.expander("DCF Assumptions", expanded=False):
+        dcf_columns = st.columns(2)
+        dcf_assumptions = {
+            "construction_cost_per_m2": dcf_columns[0].number_input(
+                "Construction Cost (€/m²)", min_value=0.0, value=DCF_DEFAULTS["construction_cost_per_m2"], step=50.0, key="dcf_cost"),
+            "residential_price_per_m2": dcf_columns[0].number_input(
+                "Residential Sales Price (€/m²)", min_value=0.0, value=DCF_DEFAULTS["residential_price_per_m2"], step=50.0, key="dcf_residential"),
+            "commercial_price_per_m2": dcf_columns[0].number_input(
+                "Commercial Sales Price (€/m²)", min_value=0.0, value=DCF_DEFAULTS["commercial_price_per_m2"], step=50.0, key="dcf_commercial"),
+            "discount_rate": dcf_columns[0].number_input(
+                "Discount Rate (%)", min_value=0.0, value=DCF_DEFAULTS["discount_rate"] * 100, step=0.5, key="dcf_rate") / 100,
+            "construction_start": dcf_columns[1].number_input(
+                "Construction Start (year)", min_value=0, value=DCF_DEFAULTS["construction_start"], step=1, key="dcf_construction_start"),
+            "construction_periods": dcf_columns[1].number_input(
+                "Construction Duration (years)", min_value=1, value=DCF_DEFAULTS["construction_periods"], step=1, key="dcf_construction_periods"),
+            "sales_start": dcf_columns[1].number_input(
+                "Sales Start (year)", min_value=0, value=DCF_DEFAULTS["sales_start"], step=1, key="dcf_sales_start"),
+            "sales_periods": dcf_columns[1].number_input(
+                "Sales Duration (years)", min_value=1, value=DCF_DEFAULTS["sales_periods"], step=1, key="dcf_sales_periods"),
+        }
+    dcf = project_dcf(results, total_price, dcf_assumptions)
+    dcf_metrics = st.columns(2)
+    dcf_metrics[0].metric("NPV", f"€{dcf['npv']:,.0f}")
+    dcf_metrics[1].metric("IRR", f"{dcf['irr']:.1%}" if dcf["irr"] is not None else "n/a")
+    st.dataframe(pd.DataFrame(dcf["cash_flows"], columns=DCF_CASH_FLOW_COLUMNS), hide_index=True)
+
+    # Per-plot results of an imported register
+    if "register_results" in st.session_state:
+        st.download_button(
+            label="Download Per-Plot Register Results (CSV)",
+            data=st.session_state["register_results"],
+            file_name="plot_register_results.csv",
+            mime="text/csv"
+        )
+
+    # Reports are served from the cache unless the results, prices or project name changed
+    report_cache = get_report_cache()
+    risk_table = st.session_state["risk"].percentile_table() if "risk" in st.session_state else None
+    report_key = report_cache_key(results, total_price, price_per_m2, project_name, risk_table, dcf)
+
     # Excel Export
-    excel_data = generate_excel_report(results, total_price, price_per_m2)
+    excel_data = report_cache.get_or_build(
+        "excel", report_key,
+        lambda: generate_excel_report_streaming(results, total_price, price_per_m2, io.BytesIO(), risk_table=risk_table, dcf=dcf)
+    )
     st.download_button(
         label="Download Excel Report",
         data=excel_data,
@@ -201,7 +422,11 @@ if "calculated" in st.session_state and st.session_state["calculated"]:
 
     # PDF Export
     try:
-        pdf_data = generate_pdf_report(results, total_price, price_per_m2, project_name)
+        pdf_data = report_cache.get_or_build(
+            "pdf", report_key,
+            lambda: (generate_detailed_pdf_report if len(results["plots"]) > DETAILED_PDF_MIN_PLOTS else generate_pdf_report)(
+                results, total_price, price_per_m2, project_name, risk_table)
+        )
         st.download_button(
             label="Download PDF Report",
             data=pdf_data,
@@ -211,27 +436,159 @@ if "calculated" in st.session_state and st.session_state["calculated"]:
     except Exception as e:
         st.error(f"Failed to generate PDF: {e}")
 
-    # Detailed Breakdown for Each Plot
+    # Detailed breakdown: one summary table a page at a time; zone detail only for the selected plot
     st.subheader("Detailed Calculation Breakdown")
-    for i, plot in enumerate(results['plots']):
-        with st.expander(f"Plot {i + 1} ({plot['serial_number']})"):
+    breakdown_plots = results["plots"]
+    if not breakdown_plots:
+        st.info("Per-plot results of an imported register are in the register results CSV download above.")
+    else:
+        page_columns = st.columns(2)
+        page_size = page_columns[0].selectbox("Plots per Page", [25, 50, 100, 250], index=1, key="breakdown_page_size")
+        num_pages = -(-len(breakdown_plots) // page_size)
+        page = page_columns[1].number_input("Page", min_value=1, max_value=num_pages, value=1, step=1, key="breakdown_page")
+        page_columns[1].caption(f"{len(breakdown_plots):,} plots on {num_pages:,} pages")
+        first = (min(page, num_pages) - 1) * page_size
+        page_plots = breakdown_plots[first:first + page_size]
+        breakdown = st.dataframe(
+            pd.DataFrame(iter_plot_summary_rows(page_plots, first + 1), columns=PLOT_SUMMARY_COLUMNS),
+            hide_index=True, on_select="rerun", selection_mode="single-row", key="breakdown_table",
+        )
+
+        selected_rows = breakdown.selection.rows
+        if selected_rows and selected_rows[0] < len(page_plots):
+            i = first + selected_rows[0]
+            plot = page_plots[selected_rows[0]]
+            st.markdown(f"**Plot {i + 1} ({plot['serial_number']})**")
             st.markdown(f"**Plot Area:** {plot['plot_size']:,} m²")
             st.markdown(f"**Road Deduction:** {plot['road_deduction']:,} m²")
             st.markdown(f"**Public Green Allocated:** {plot['green_deduction']:,} m²")
             st.markdown(f"**Net Land Area:** {plot['net_plot_size']:,} m²")
+            st.markdown("\n".join(
+                f"- **Zone {j + 1}:** {zone['percentage']}% | Density Factor: {zone['density_factor']}% | "
+                f"Type: {zone['density_type']} | Buildable Area: {zone_buildable_area:,} m²"
+                for j, (zone, zone_buildable_area) in enumerate(zip(plot["zones"], plot["zone_buildable_areas"]))
+            ))
+        else:
+            st.caption("Select a row to see the plot's zones.")
 
-            for j, zone_buildable_area in enumerate(plot["zone_buildable_areas"]):
-                zone = plot["zones"][j]
-                st.markdown(
-                    f"**Zone {j + 1}:** {zone['percentage']}% | Density Factor: {zone['density_factor']}% | " +
-                    f"Type: {zone['density_type']} | Buildable Area: {zone_buildable_area:,} m²"
-                )
+    # Sensitivity Analysis (heatmap is drawn from the stored sweep, never recalculated on rerun)
+    st.subheader("Sensitivity Analysis")
+    sweep_ranges = {
+        "coverage_percent": (0, 100, 10),
+        "density_factor": (0, 200, 20),
+        "road_deduction_percent": (0, 50, 5),
+    }
+    # Only parameters that move the chosen metric are offered as axes
+    sweep_metric = st.radio("Metric", list(SWEEP_METRIC_PARAMETERS), horizontal=True, key="sweep_metric")
+    sweep_parameters = SWEEP_METRIC_PARAMETERS[sweep_metric]
+    row_parameter = st.selectbox("Rows", sweep_parameters, key="sweep_rows")
+    column_parameter = [p for p in sweep_parameters if p != row_parameter][0]
 
-        for j, zone_buildable_area in enumerate(plot["zone_buildable_areas"]):
-            zone = plot["zones"][j]
+    if st.button("Run Sweep"):
+        st.session_state["sweep"] = sweep_totals(
+            results["plots"], apply_efficiency_incentive, total_price,
+            {name: range(start, stop + step, step) for name, (start, stop, step) in sweep_ranges.items()
+             if name in sweep_parameters},
+            metrics=tuple(SWEEP_METRIC_PARAMETERS),
+            rule_table=rule_table,
+        )
+
+    if "sweep" in st.session_state and set(sweep_parameters) == set(st.session_state["sweep"].axes):
+        sweep = st.session_state["sweep"]
+        table = sweep.slice2d(sweep_metric, row_parameter, column_parameter)
+        heatmap_df = pd.DataFrame(
+            [(row, column, table[i, j])
+             for i, row in enumerate(sweep.axes[row_parameter])
+             for j, column in enumerate(sweep.axes[column_parameter])],
+            columns=[row_parameter, column_parameter, sweep_metric],
+        )
+        st.altair_chart(
+            alt.Chart(heatmap_df).mark_rect().encode(
+                x=alt.X(f"{column_parameter}:O"),
+                y=alt.Y(f"{row_parameter}:O"),
+                color=alt.Color(f"{sweep_metric}:Q"),
+                tooltip=[row_parameter, column_parameter, sweep_metric],
+            ),
+        )
+
+    # Monte Carlo risk analysis (run from a callback so the report downloads above include it)
+    st.subheader("Risk Analysis")
+    risk_columns = st.columns(2)
+    risk_columns[0].number_input("Land Price Range (± %)", min_value=0, max_value=100, value=10, step=1, key="risk_price_range")
+    risk_columns[0].number_input("Road Deduction Std. Dev. (pp)", min_value=0.0, value=2.0, step=0.5, key="risk_road_std")
+    risk_columns[0].number_input("Density Factor Range (± %)", min_value=0, max_value=100, value=10, step=1, key="risk_density_range")
+    risk_columns[1].number_input("Extra Floor Cost Range (± %)", min_value=0, max_value=100, value=20, step=1, key="risk_floor_cost_range")
+    risk_columns[1].number_input("Draws", min_value=1_000, max_value=1_000_000, value=100_000, step=10_000, key="risk_draws")
+    risk_columns[1].number_input("Seed", min_value=0, value=0, step=1, key="risk_seed")
+
+    def run_risk_simulation(plots, total_price):
+        state = st.session_state
+        price_range = state["risk_price_range"] / 100
+        density_range = state["risk_density_range"] / 100
+        floor_cost_range = state["risk_floor_cost_range"] / 100
+        state["risk"] = simulate_totals(
+            plots, apply_efficiency_incentive, total_price,
+            {
+                "total_price": {"kind": "triangular", "low": total_price * (1 - price_range), "mode": total_price,
+                                "high": total_price * (1 + price_range)},
+                "road_deduction_shift": {"kind": "normal", "mean": 0, "std": state["risk_road_std"]},
+                "density_factor_multiplier": {"kind": "uniform", "low": 1 - density_range, "high": 1 + density_range},
+                "extra_floor_cost_multiplier": {"kind": "triangular", "low": 1 - floor_cost_range, "mode": 1,
+                                                "high": 1 + floor_cost_range},
+            },
+            num_draws=int(state["risk_draws"]), seed=int(state["risk_seed"]), rule_table=rule_table,
+        )
+
+    st.button("Run Simulation", on_click=run_risk_simulation, args=(results["plots"], total_price))
+    if "risk" in st.session_state:
+        st.markdown(f"**{st.session_state['risk'].num_draws:,} draws** (seed {st.session_state['risk'].seed})")
+        st.dataframe(pd.DataFrame(risk_table, columns=RISK_TABLE_COLUMNS), hide_index=True)
+
+    # Optimizer for zone split, zone types and extra floors
+    if results["plots"]:
+        st.subheader("Optimize Zones & Extra Floors")
+        objective = st.selectbox("Objective", list(OBJECTIVES), format_func=OBJECTIVES.get, key="optimizer_objective")
+        max_extra_floors = st.number_input("Max Extra Floors per Plot", min_value=0, value=3, step=1, key="optimizer_max_floors")
+        if st.button("Optimize"):
+            st.session_state["optimization"] = optimize_project(
+                results["plots"], objective, total_price, apply_efficiency_incentive,
+                max_extra_floors=int(max_extra_floors), rule_table=rule_table,
+            )
+
+        if "optimization" in st.session_state:
+            optimization = st.session_state["optimization"]
             st.markdown(
-                f"**Zone {j + 1}:** {zone['percentage']}% | "
-                f"Density Factor: {zone['density_factor']}% | "
-                f"Type: {zone['density_type']} | "
-                f"Buildable Area: {zone_buildable_area:,} m²"
+                f"**{OBJECTIVES[optimization['objective']].capitalize()}:** {optimization['objective_value']:,.2f} "
+                f"({optimization['candidates_evaluated']:,} candidates evaluated)"
             )
+            st.dataframe(pd.DataFrame([
+                {
+                    "Plot": plot["serial_number"],
+                    "Zone": f"Zone {j + 1}",
+                    "Zone Percentage (%)": zone["percentage"],
+                    "Zone Type": zone["density_type"],
+                    "Extra Floors": plot.get("extra_floors", 0),
+                    "Buildable Area (m²)": buildable_area,
+                }
+                for plot in optimization["results"]["plots"]
+                for j, (zone, buildable_area) in enumerate(zip(plot["zones"], plot["zone_buildable_areas"]))
+            ]))
+
+# Debug panel with the spans & counters recorded so far
+rerun_span.stop()
+if show_debug_timings:
+    with st.expander("Debug Timings", expanded=True):
+        timings = instrumentation.snapshot()
+        if timings["spans"]:
+            st.dataframe(pd.DataFrame.from_dict(timings["spans"], orient="index").sort_values("total_ms", ascending=False))
+        st.json(timings["counters"])
+        spans_log = io.StringIO()
+        instrumentation.export_jsonl(spans_log)
+        st.download_button(
+            label="Download Timing Spans (JSON Lines)",
+            data=spans_log.getvalue(),
+            file_name="timing_spans.jsonl",
+            mime="application/x-ndjson"
+        )
+        if st.button("Reset Timings"):
+            instrumentation.reset()
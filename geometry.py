@@ -0,0 +1,265 @@
+import json
+from collections import defaultdict
+
+import numpy as np
+
+from batch_calculations import calculate_totals_columnar, plots_to_columns
+
+# Defaults for plot properties a GeoJSON feature may leave out
+GEOJSON_PLOT_DEFAULTS = {
+    "serial_number": "",
+    "is_parceled": False,
+    "road_deduction_percent": 0,
+    "coverage_percent": 0,
+    "max_height": 0,
+    "floor_height": 0,
+    "allow_extra_floors": False,
+    "extra_floors": 0,
+    "cost_per_extra_floor": 0.0,
+    "price": 0,
+    "zones": [],
+}
+
+# Plot keys kept when imported plots are saved as a project configuration (no polygons or outputs)
+SAVED_PLOT_KEYS = (*GEOJSON_PLOT_DEFAULTS, "plot_size", "footprint_area", "cluster")
+
+# Features with this property are building footprints on the plot with that serial number
+FOOTPRINT_PROPERTY = "footprint_of"
+
+# Plots whose boundaries come within this distance (in coordinate units, m) are adjacent
+DEFAULT_TOLERANCE = 0.01
+
+
+# ----------------------- Polygons -----------------------#
+
+# Function to read a GeoJSON Polygon or MultiPolygon as a list of polygons, each a list of rings
+def _polygons(geometry):
+    if geometry is None:
+        return []
+    if geometry["type"] == "Polygon":
+        polygons = [geometry["coordinates"]]
+    elif geometry["type"] == "MultiPolygon":
+        polygons = geometry["coordinates"]
+    else:
+        raise ValueError(f"Unsupported geometry type {geometry['type']!r}; plots must be polygons.")
+    # Rings are stored open (GeoJSON repeats the first vertex at the end)
+    return [[np.asarray(ring[:-1] if ring[0] == ring[-1] else ring, dtype=np.float64)[:, :2] for ring in polygon]
+            for polygon in polygons]
+
+
+# Function to calculate the area of a ring with the shoelace formula
+def _ring_area(ring):
+    x, y = ring[:, 0], ring[:, 1]
+    return abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))) / 2
+
+
+# Function to calculate the area of polygons (outer rings minus their holes)
+def polygon_area(polygons):
+    return float(sum(_ring_area(rings[0]) - sum(_ring_area(hole) for hole in rings[1:]) for rings in polygons))
+
+
+# Function to collect every boundary segment of a plot's polygons as (start, end) arrays
+def _segments(polygons):
+    rings = [ring for rings in polygons for ring in rings]
+    if not rings:
+        return np.zeros((0, 2)), np.zeros((0, 2))
+    return np.concatenate(rings), np.concatenate([np.roll(ring, -1, axis=0) for ring in rings])
+
+
+# ----------------------- GeoJSON Loading -----------------------#
+
+# Function to load plots (and building footprints) from a GeoJSON FeatureCollection
+def load_geojson_plots(source, defaults=None):
+    """Return plot dicts from a GeoJSON file path, file object or parsed dict.
+
+    Coordinates must be projected in metres. Each polygon feature is a plot whose properties
+    use the plot dict keys (missing ones come from ``defaults``, then GEOJSON_PLOT_DEFAULTS);
+    ``plot_size`` defaults to the polygon area and ``price`` is the plot's land price (used when
+    prices are given per plot). Features with a ``footprint_of`` property are
+    building footprints, summed per plot into ``footprint_area``. Plots keep their polygons
+    under ``geometry``.
+    """
+    if isinstance(source, dict):
+        collection = source
+    elif hasattr(source, "read"):
+        collection = json.load(source)
+    else:
+        with open(source, "r") as file:
+            collection = json.load(file)
+    defaults = {**GEOJSON_PLOT_DEFAULTS, **(defaults or {})}
+
+    plots = []
+    footprints = defaultdict(float)
+    for feature in collection.get("features", []):
+        properties = feature.get("properties") or {}
+        polygons = _polygons(feature.get("geometry"))
+        if FOOTPRINT_PROPERTY in properties:
+            footprints[str(properties[FOOTPRINT_PROPERTY])] += polygon_area(polygons)
+            continue
+        plot = {key: properties.get(key, value) for key, value in defaults.items()}
+        plot["serial_number"] = str(plot["serial_number"] or f"Plot-{len(plots) + 1}")
+        plot["zones"] = [dict(zone) for zone in plot["zones"]]
+        plot["plot_size"] = properties.get("plot_size", round(polygon_area(polygons), 2))
+        plot["geometry"] = polygons
+        plots.append(plot)
+
+    unknown = set(footprints) - {plot["serial_number"] for plot in plots}
+    if unknown:
+        raise ValueError(f"Footprints reference unknown plots: {', '.join(sorted(unknown))}.")
+    for plot in plots:
+        if plot["serial_number"] in footprints:
+            plot["footprint_area"] = footprints[plot["serial_number"]]
+    return plots
+
+
+# ----------------------- Spatial Index -----------------------#
+
+class GridIndex:
+    """Uniform grid over bounding boxes; each box is listed in every cell it overlaps.
+
+    With cells about the size of a typical plot, each plot lands in a few cells and is only
+    compared with the plots sharing them, so finding all candidate pairs is near-linear.
+    """
+
+    def __init__(self, cell_size):
+        if cell_size <= 0:
+            raise ValueError("Grid cell size must be positive.")
+        self.cell_size = cell_size
+        self.cells = defaultdict(list)
+        self.boxes = {}
+
+    def _cell_range(self, box):
+        x0, y0, x1, y1 = (int(np.floor(value / self.cell_size)) for value in box)
+        return x0, y0, x1, y1
+
+    def insert(self, key, box):
+        """Add a (min x, min y, max x, max y) box."""
+        self.boxes[key] = box
+        x0, y0, x1, y1 = self._cell_range(box)
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                self.cells[cx, cy].append(key)
+
+    def query(self, box):
+        """Keys whose boxes overlap ``box``."""
+        x0, y0, x1, y1 = self._cell_range(box)
+        found = set()
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                found.update(key for key in self.cells.get((cx, cy), ()) if _boxes_overlap(self.boxes[key], box))
+        return found
+
+    def candidate_pairs(self):
+        """Yield every pair of keys with overlapping boxes exactly once."""
+        for (cx, cy), keys in self.cells.items():
+            for n, a in enumerate(keys):
+                box_a = self.boxes[a]
+                for b in keys[n + 1:]:
+                    box_b = self.boxes[b]
+                    # Report a pair only in the cell holding the corner of the boxes' overlap
+                    if _boxes_overlap(box_a, box_b) and self._cell_range(
+                            (max(box_a[0], box_b[0]), max(box_a[1], box_b[1]), 0, 0))[:2] == (cx, cy):
+                        yield a, b
+
+
+# Function to test whether two (min x, min y, max x, max y) boxes overlap or touch
+def _boxes_overlap(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+# ----------------------- Adjacency -----------------------#
+
+# Function to find the distance from every point to the nearest of a set of segments
+def _point_segment_distances(points, starts, ends):
+    direction = ends - starts
+    length_squared = np.einsum("ij,ij->i", direction, direction)
+    offsets = points[:, None, :] - starts[None, :, :]
+    t = np.clip(np.divide(np.einsum("pij,ij->pi", offsets, direction), length_squared,
+                          out=np.zeros((len(points), len(starts))), where=length_squared > 0), 0, 1)
+    closest = starts[None, :, :] + t[:, :, None] * direction[None, :, :]
+    return np.sqrt(((points[:, None, :] - closest) ** 2).sum(axis=2)).min(axis=1)
+
+
+# Function to test whether any segment of one set properly crosses any segment of another
+def _segments_cross(a_starts, a_ends, b_starts, b_ends):
+    def orientation(p, q, r):
+        return np.sign((q[..., 0] - p[..., 0]) * (r[..., 1] - p[..., 1]) - (q[..., 1] - p[..., 1]) * (r[..., 0] - p[..., 0]))
+
+    p, q = a_starts[:, None, :], a_ends[:, None, :]
+    r, s = b_starts[None, :, :], b_ends[None, :, :]
+    return bool(((orientation(p, q, r) * orientation(p, q, s) < 0) & (orientation(r, s, p) * orientation(r, s, q) < 0)).any())
+
+
+# Function to test whether a point lies inside polygons (even-odd rule over all rings)
+def _contains(starts, ends, point):
+    x, y = point
+    straddles = (starts[:, 1] > y) != (ends[:, 1] > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        crossing_x = starts[:, 0] + (y - starts[:, 1]) * (ends[:, 0] - starts[:, 0]) / (ends[:, 1] - starts[:, 1])
+    return bool(np.count_nonzero(straddles & (x < crossing_x)) % 2)
+
+
+# Function to test whether two plots touch or overlap
+def plots_adjacent(segments_a, segments_b, tolerance=DEFAULT_TOLERANCE):
+    """``segments_*`` are (starts, ends) boundary segments; plots are adjacent when their
+    boundaries come within ``tolerance`` (a shared edge or corner) or their areas overlap."""
+    (a_starts, a_ends), (b_starts, b_ends) = segments_a, segments_b
+    if not len(a_starts) or not len(b_starts):
+        return False
+    return bool(
+        _point_segment_distances(a_starts, b_starts, b_ends).min() <= tolerance
+        or _point_segment_distances(b_starts, a_starts, a_ends).min() <= tolerance
+        or _segments_cross(a_starts, a_ends, b_starts, b_ends)
+        or _contains(b_starts, b_ends, a_starts[0])
+        or _contains(a_starts, a_ends, b_starts[0])
+    )
+
+
+# Function to label contiguous clusters of adjacent plots
+def adjacency_clusters(plots, tolerance=DEFAULT_TOLERANCE, cell_size=None):
+    """Return one cluster label per plot (0, 1, ... in order of first plot).
+
+    Candidate pairs come from a GridIndex over the plots' bounding boxes (grown by
+    ``tolerance``), are confirmed with plots_adjacent and merged with union-find. Plots
+    without geometry form clusters of their own.
+    """
+    segments = [_segments(plot.get("geometry") or []) for plot in plots]
+    boxes = {i: (*(starts.min(axis=0) - tolerance), *(starts.max(axis=0) + tolerance))
+             for i, (starts, _) in enumerate(segments) if len(starts)}
+    if cell_size is None:
+        extents = [max(box[2] - box[0], box[3] - box[1]) for box in boxes.values()]
+        cell_size = float(np.median(extents)) if extents else 1.0
+    index = GridIndex(max(cell_size, tolerance, 1e-9))
+    for i, box in boxes.items():
+        index.insert(i, box)
+
+    parent = list(range(len(plots)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in index.candidate_pairs():
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b and plots_adjacent(segments[a], segments[b], tolerance):
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    roots = [find(i) for i in range(len(plots))]
+    labels = {root: label for label, root in enumerate(dict.fromkeys(roots))}
+    return np.array([labels[root] for root in roots], dtype=np.int64)
+
+
+# ----------------------- Cluster Calculation -----------------------#
+
+# Function to calculate totals with road and green tiers pooled per adjacent-plot cluster
+def calculate_totals_by_cluster(plots, apply_efficiency_incentive, tolerance=DEFAULT_TOLERANCE, rule_table=None):
+    """calculate_totals where each contiguous cluster of unparceled plots shares one green
+    (and rule-table road) tier, looked up on the cluster's combined area, and coverage comes
+    from a plot's building footprint where it has one (capped by coverage_percent when above 0).
+    Writes each plot's ``cluster`` label, which every calculation engine picks up, so saved
+    projects, sweeps and simulations of these plots pool the same way."""
+    for plot, cluster in zip(plots, adjacency_clusters(plots, tolerance).tolist()):
+        plot["cluster"] = cluster
+    return calculate_totals_columnar(plots_to_columns(plots), apply_efficiency_incentive, plots, rule_table)
@@ -0,0 +1,91 @@
+from Calculations import green_area_formula
+
+
+# ----------------------- Project Green Requirement -----------------------#
+
+# Function to calculate the project's public green requirement once
+def project_green_requirement(plots, rule_table=None):
+    total_area = sum(plot["plot_size"] for plot in plots)
+    green_percent = green_area_formula(total_area, rule_table)
+    return total_area, green_percent, total_area * green_percent / 100
+
+
+# Function to cap each plot's share of the project green requirement
+def max_green_allocations(plots, required_green_area):
+    """Largest share (%) of the project green area each plot can host: its own size, at most 100%."""
+    if required_green_area <= 0:
+        return [100.0] * len(plots)
+    return [min(100.0, plot["plot_size"] / required_green_area * 100) for plot in plots]
+
+
+# ----------------------- Allocation Engine -----------------------#
+
+# Function to scale allocations to 100% without exceeding any plot's cap
+def normalize_allocations(allocations, caps):
+    """Water-fill: find t so that Σ min(cap, t × allocation) = 100, in O(n log n).
+
+    Plots with a zero allocation stay at zero unless every allocation is zero, in which case
+    the caps themselves are used as weights. If the caps of the weighted plots cannot reach
+    100%, each of them is filled to its cap.
+    """
+    weights = list(allocations) if any(allocations) else list(caps)
+    # Plots saturate in order of cap / weight; past the last saturated plot, the rest scale by t
+    order = sorted((i for i, weight in enumerate(weights) if weight > 0), key=lambda i: caps[i] / weights[i])
+    remaining_target = 100.0
+    remaining_weight = sum(weights[i] for i in order)
+    result = [0.0] * len(caps)
+    for position, i in enumerate(order):
+        t = remaining_target / remaining_weight
+        if caps[i] >= t * weights[i]:
+            for j in order[position:]:
+                result[j] = t * weights[j]
+            break
+        result[i] = float(caps[i])
+        remaining_target -= caps[i]
+        remaining_weight -= weights[i]
+    return result
+
+
+# Function to check custom allocations against the caps and the 100% total
+def validate_allocations(allocations, caps, tolerance=1e-6):
+    errors = []
+    for i, (allocation, cap) in enumerate(zip(allocations, caps)):
+        if allocation < 0:
+            errors.append(f"Plot {i + 1}: green allocation cannot be negative.")
+        elif allocation > cap + tolerance:
+            errors.append(f"Plot {i + 1}: green allocation {allocation:g}% exceeds its maximum of {cap:.2f}%.")
+    total = sum(allocations)
+    if abs(total - 100) > tolerance:
+        errors.append(f"Green allocations sum to {total:g}%, not 100%.")
+    return errors
+
+
+# Function to allocate the project green requirement across plots in one pass
+def allocate_green(plots, custom_allocations=None, rule_table=None, normalize=True):
+    """Compute the project green requirement once and split it across plots.
+
+    Without custom allocations the requirement is split in proportion to plot size. Custom
+    allocations (% per plot) are validated against each plot's cap and, when ``normalize`` is
+    set, water-filled to sum to 100% within the caps.
+    """
+    total_area, green_percent, required_green_area = project_green_requirement(plots, rule_table)
+    caps = max_green_allocations(plots, required_green_area)
+
+    if custom_allocations is None:
+        allocations = [plot["plot_size"] / total_area * 100 if total_area else 0.0 for plot in plots]
+        errors = []
+    else:
+        allocations = [float(allocation) for allocation in custom_allocations]
+        errors = validate_allocations(allocations, caps)
+        if normalize and errors:
+            allocations = normalize_allocations(allocations, caps)
+
+    return {
+        "total_area": total_area,
+        "green_percent": green_percent,
+        "required_green_area": required_green_area,
+        "max_allocations": caps,
+        "allocations": allocations,
+        "green_areas": [required_green_area * allocation / 100 for allocation in allocations],
+        "errors": errors,
+    }
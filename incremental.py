@@ -0,0 +1,175 @@
+import hashlib
+import json
+from collections import OrderedDict
+
+import numpy as np
+
+from Calculations import TOTAL_SUM_KEYS, summarize_totals
+from batch_calculations import (aggregate_plot_columns, calculate_totals_batch, compute_plot_columns, plots_to_columns,
+                                write_plot_outputs)
+from instrumentation import increment, span
+from rules import DEFAULT_RULE_TABLE
+
+# Plot fields that affect the calculation (anything else, e.g. serial_number, is passed through)
+PLOT_INPUT_DEFAULTS = {
+    "plot_size": 0,
+    "is_parceled": False,
+    "road_deduction_percent": 0,
+    "coverage_percent": 0,
+    "max_height": 0,
+    "floor_height": 0,
+    "allow_extra_floors": False,
+    "extra_floors": 0,
+    "cost_per_extra_floor": 0.0,
+    "footprint_area": None,
+}
+ZONE_INPUT_KEYS = ("percentage", "density_factor", "density_type")
+
+# Fields calculate_totals derives for every plot
+PLOT_OUTPUT_KEYS = (
+    "net_plot_size",
+    "road_deduction",
+    "green_deduction",
+    "coverage_area",
+    "max_floors",
+    "extra_floors_cost",
+    "max_buildable_area",
+    "zone_buildable_areas",
+)
+
+
+# Function to hash the calculation inputs of a single plot
+def plot_input_hash(plot, rule_table=None):
+    inputs = {key: plot.get(key, default) for key, default in PLOT_INPUT_DEFAULTS.items()}
+    inputs["zones"] = [[zone[key] for key in ZONE_INPUT_KEYS] for zone in plot["zones"]]
+    inputs["rules"] = (rule_table or DEFAULT_RULE_TABLE).fingerprint
+    encoded = json.dumps(inputs, sort_keys=True, separators=(",", ":"), default=str).encode()
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+# Function to calculate outputs and per-plot sum contributions for a batch of plots
+def _calculate_plot_entries(plots, rule_table=None):
+    copies = [dict(plot) for plot in plots]
+    columns = plots_to_columns(copies)
+    outputs = compute_plot_columns(columns, rule_table)
+    sums = aggregate_plot_columns(columns, outputs, np.arange(len(copies), dtype=np.int64), len(copies))
+    write_plot_outputs(copies, columns, outputs)
+
+    sum_rows = zip(*(sums[key].tolist() for key in TOTAL_SUM_KEYS))
+    return [({key: plot[key] for key in PLOT_OUTPUT_KEYS}, contribution)
+            for plot, contribution in zip(copies, sum_rows)]
+
+
+# ----------------------- Incremental Calculator -----------------------#
+
+class IncrementalCalculator:
+    """Caches per-plot results by input hash and keeps project sums up to date incrementally.
+
+    Only plots whose inputs changed since the previous call are recomputed; every plot's
+    contribution to the project sums is kept in one array, which is summed in plot order like
+    calculate_totals does (running +/- updates would leave float residue). Plots with a
+    ``cluster`` label share tiers with the rest of their cluster, so projects that have any
+    are calculated in full instead (and the next call starts over). The caller's
+    plot dicts are never mutated: returned plots are copies with the derived fields added,
+    shared between calls until their plot changes.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._slots = []
+        self._contributions = np.zeros((0, len(TOTAL_SUM_KEYS)))
+        self._result_plots = []
+        self._fingerprint = None
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, plots, hashes, rule_table=None):
+        # Compute every distinct missing hash in one vectorized batch
+        entries = {}
+        missing = {}
+        for plot, plot_hash in zip(plots, hashes):
+            if plot_hash in self._cache:
+                self._cache.move_to_end(plot_hash)
+                entries[plot_hash] = self._cache[plot_hash]
+                self.hits += 1
+            elif plot_hash not in missing:
+                missing[plot_hash] = plot
+                self.misses += 1
+
+        increment("incremental.hits", len(entries))
+        increment("incremental.misses", len(missing))
+        if missing:
+            with span("incremental.compute"):
+                computed = _calculate_plot_entries(list(missing.values()), rule_table)
+            for plot_hash, entry in zip(missing, computed):
+                entries[plot_hash] = entry
+                self._cache[plot_hash] = entry
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return entries
+
+    def _project_sums(self):
+        # cumsum adds row by row (np.sum would add pairwise), so sums match calculate_totals
+        sums = np.cumsum(self._contributions, axis=0)[-1] if len(self._contributions) else self._contributions.sum(axis=0)
+        sums = dict(zip(TOTAL_SUM_KEYS, sums.tolist()))
+        sums["total_max_floors"] = int(sums["total_max_floors"])
+        return sums
+
+    def _calculate_clustered(self, plots, apply_efficiency_incentive, rule_table=None):
+        self._slots = []
+        self._contributions = self._contributions[:0]
+        self._result_plots = []
+        with span("incremental.compute"):
+            return calculate_totals_batch([dict(plot) for plot in plots], apply_efficiency_incentive, None, None,
+                                          rule_table)
+
+    def calculate_totals(self, plots, apply_efficiency_incentive, green_allocation_method, custom_green_allocations,
+                         rule_table=None, changed=None):
+        """``changed`` optionally holds the indices of plots edited since the previous call; only
+        those and any plots appended since are then re-hashed, so an edit costs O(edited plots)
+        apart from copying the result list and summing the contribution array. Without it, or
+        when the rule table changes, every plot is re-hashed."""
+        fingerprint = (rule_table or DEFAULT_RULE_TABLE).fingerprint
+        if changed is None or fingerprint != self._fingerprint:
+            candidates = range(len(plots))
+        else:
+            candidates = sorted({i for i in changed if 0 <= i < len(plots)} | set(range(len(self._slots), len(plots))))
+        self._fingerprint = fingerprint
+        if any(plots[i].get("cluster") is not None for i in candidates):
+            # Plots outside ``candidates`` were hashed without clusters, so none have one
+            return self._calculate_clustered(plots, apply_efficiency_incentive, rule_table)
+        with span("incremental.hash"):
+            hashes = {i: plot_input_hash(plots[i], rule_table) for i in candidates}
+        changed = [i for i, plot_hash in hashes.items() if i >= len(self._slots) or self._slots[i][0] != plot_hash]
+        entries = self._lookup([plots[i] for i in changed], [hashes[i] for i in changed], rule_table)
+
+        # Drop plots that were removed, then store the outputs and contributions of changed plots
+        del self._slots[len(plots):]
+        self._contributions = self._contributions[:len(plots)]
+        if len(plots) > len(self._contributions):
+            added = np.zeros((len(plots) - len(self._contributions), len(TOTAL_SUM_KEYS)))
+            self._contributions = np.concatenate([self._contributions, added])
+
+        for i in changed:
+            plot_hash = hashes[i]
+            outputs, contribution = entries[plot_hash]
+            if i < len(self._slots):
+                self._slots[i] = (plot_hash, outputs)
+            else:
+                self._slots.append((plot_hash, outputs))
+            self._contributions[i] = contribution
+
+        # Rebuild the result copies of the re-hashed plots (their pass-through fields may have changed)
+        del self._result_plots[len(plots):]
+        for i in candidates:
+            result_plot = dict(plots[i])
+            outputs = self._slots[i][1]
+            result_plot.update(outputs)
+            result_plot["zone_buildable_areas"] = list(outputs["zone_buildable_areas"])
+            if i < len(self._result_plots):
+                self._result_plots[i] = result_plot
+            else:
+                self._result_plots.append(result_plot)
+
+        return summarize_totals(self._project_sums(), apply_efficiency_incentive, list(self._result_plots))
@@ -0,0 +1,156 @@
+import contextvars
+import json
+import threading
+import time
+from collections import deque
+
+# Most recent span events kept for export, per recorder
+MAX_EVENTS = 10_000
+
+
+class Recorder:
+    """Span statistics, counters and recent span events of one session.
+
+    The active recorder lives in a context variable, so concurrent sessions (each rerun in
+    its own thread) record into, report on and reset only their own recorder.
+    """
+
+    def __init__(self, max_events=MAX_EVENTS):
+        self.lock = threading.Lock()
+        self.span_stats = {}
+        self.counters = {}
+        self.events = deque(maxlen=max_events)
+
+
+# The recorder of the current context; None while instrumentation is disabled
+_recorder = contextvars.ContextVar("instrumentation_recorder", default=None)
+
+
+# ----------------------- Switches -----------------------#
+
+# Function to record spans and counters of the current context into a recorder
+def enable(recorder=None):
+    """Activate ``recorder`` (a new Recorder if omitted) for the current context and return it."""
+    if recorder is None:
+        recorder = Recorder()
+    _recorder.set(recorder)
+    return recorder
+
+
+def disable():
+    _recorder.set(None)
+
+
+def is_enabled():
+    return _recorder.get() is not None
+
+
+def reset():
+    recorder = _recorder.get()
+    if recorder is not None:
+        with recorder.lock:
+            recorder.span_stats.clear()
+            recorder.counters.clear()
+            recorder.events.clear()
+
+
+# ----------------------- Spans & Counters -----------------------#
+
+class _NullSpan:
+    """Shared do-nothing span handed out while instrumentation is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def start(self):
+        return self
+
+    def stop(self):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "_recorder", "_wall", "_start")
+
+    def __init__(self, name, recorder):
+        self.name = name
+        self._recorder = recorder
+
+    def start(self):
+        self._wall = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def stop(self):
+        duration = time.perf_counter() - self._start
+        recorder = self._recorder
+        with recorder.lock:
+            stats = recorder.span_stats.get(self.name)
+            if stats is None:
+                recorder.span_stats[self.name] = [1, duration, duration]
+            else:
+                stats[0] += 1
+                stats[1] += duration
+                stats[2] = max(stats[2], duration)
+            recorder.events.append((self.name, self._wall, duration))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+# Function to time a named stage: `with span("excel.build"): ...`
+def span(name):
+    recorder = _recorder.get()
+    return _NULL_SPAN if recorder is None else _Span(name, recorder)
+
+
+# Function to add to a named counter
+def increment(name, value=1):
+    recorder = _recorder.get()
+    if recorder is not None:
+        with recorder.lock:
+            recorder.counters[name] = recorder.counters.get(name, 0) + value
+
+
+# ----------------------- Reporting -----------------------#
+
+# Function to summarize the spans and counters recorded in the current context
+def snapshot():
+    recorder = _recorder.get()
+    if recorder is None:
+        return {"spans": {}, "counters": {}}
+    with recorder.lock:
+        spans = {
+            name: {"count": count, "total_ms": total * 1000, "mean_ms": total / count * 1000, "max_ms": longest * 1000}
+            for name, (count, total, longest) in recorder.span_stats.items()
+        }
+        return {"spans": spans, "counters": dict(recorder.counters)}
+
+
+# Function to write recorded span events as JSON lines
+def export_jsonl(output):
+    """Write one JSON object per span event to ``output`` (a path or text file); returns the event count."""
+    if isinstance(output, str):
+        with open(output, "a") as file:
+            return export_jsonl(file)
+
+    recorder = _recorder.get()
+    if recorder is None:
+        return 0
+    with recorder.lock:
+        events = list(recorder.events)
+    for name, wall, duration in events:
+        output.write(json.dumps({"span": name, "start": wall, "duration_ms": duration * 1000}) + "\n")
+    return len(events)
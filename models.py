@@ -0,0 +1,248 @@
+from collections.abc import Mapping, Sequence
+from types import MappingProxyType
+
+import numpy as np
+
+from Calculations import plot_clusters, summarize_totals
+from batch_calculations import (PLOT_COLUMNS, UNKNOWN_TYPE, ZONE_TYPE_CODES, aggregate_plot_columns,
+                                compute_plot_columns)
+from instrumentation import increment, span
+
+
+# ----------------------- Records -----------------------#
+
+class Record(Mapping):
+    """Immutable ``__slots__`` record that also reads like the dict it replaces.
+
+    ``record["plot_size"]`` and ``record.plot_size`` are the same value, so records can be
+    passed wherever the calculation and report code index plot and zone dicts.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            object.__setattr__(self, name, values.get(name, self._defaults.get(name)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable; use replace().")
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)})"
+
+    def __reduce__(self):
+        return _rebuild_record, (type(self), tuple(getattr(self, name) for name in self.__slots__))
+
+    def replace(self, **changes):
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return type(self)(**values)
+
+
+# Function to rebuild a pickled record (immutable records cannot be filled by __setstate__)
+def _rebuild_record(cls, values):
+    return cls(**dict(zip(cls.__slots__, values)))
+
+
+class Zone(Record):
+    __slots__ = ("percentage", "density_factor", "density_type")
+    _defaults = {"percentage": 0, "density_factor": 0, "density_type": "Residential"}
+
+    @classmethod
+    def from_dict(cls, zone):
+        return zone if isinstance(zone, Zone) else cls(**zone)
+
+    def to_dict(self):
+        return dict(self)
+
+
+class Plot(Record):
+    __slots__ = ("serial_number", "plot_size", "is_parceled", "road_deduction_percent", "coverage_percent",
+                 "max_height", "floor_height", "allow_extra_floors", "extra_floors", "cost_per_extra_floor", "zones",
+                 "footprint_area", "cluster")
+    _defaults = {"serial_number": "", "plot_size": 0, "is_parceled": False, "road_deduction_percent": 0,
+                 "coverage_percent": 0, "max_height": 0, "floor_height": 0, "allow_extra_floors": False,
+                 "extra_floors": 0, "cost_per_extra_floor": 0.0, "zones": (), "footprint_area": None,
+                 "cluster": None}
+
+    @classmethod
+    def from_dict(cls, plot):
+        """Build a Plot from a sidebar plot dict; derived output fields are ignored."""
+        if isinstance(plot, Plot):
+            return plot
+        values = {name: plot[name] for name in cls.__slots__ if name in plot}
+        values["zones"] = tuple(Zone.from_dict(zone) for zone in plot.get("zones", ()))
+        return cls(**values)
+
+    def to_dict(self):
+        plot = dict(self)
+        plot["zones"] = [zone.to_dict() for zone in self.zones]
+        return plot
+
+
+# ----------------------- Results -----------------------#
+
+# Per-plot outputs kept as read-only arrays by ProjectResults
+RESULT_COLUMNS = ("net_plot_size", "road_deduction", "green_deduction", "coverage_area", "max_floors",
+                  "extra_floors_cost", "max_buildable_area")
+
+
+class PlotView(Mapping):
+    """Read-only dict view of one plot's inputs and outputs, in calculate_totals' plot shape.
+
+    Outputs are read from the ProjectResults arrays on access; nothing is copied.
+    """
+
+    __slots__ = ("_results", "_index")
+
+    def __init__(self, results, index):
+        self._results = results
+        self._index = index
+
+    @property
+    def plot(self):
+        return self._results.inputs[self._index]
+
+    def __getitem__(self, key):
+        results, i = self._results, self._index
+        if key in results.outputs:
+            plot = results.inputs[i]
+            if plot.is_parceled and key in ("net_plot_size", "road_deduction", "green_deduction"):
+                return plot.plot_size if key == "net_plot_size" else 0
+            return results.outputs[key][i].item()
+        if key == "zone_buildable_areas":
+            return results.zone_buildable_areas[results.zone_offsets[i]:results.zone_offsets[i + 1]].tolist()
+        return results.inputs[i][key]
+
+    def __iter__(self):
+        yield from Plot.__slots__
+        yield from RESULT_COLUMNS
+        yield "zone_buildable_areas"
+
+    def __len__(self):
+        return len(Plot.__slots__) + len(RESULT_COLUMNS) + 1
+
+    def to_dict(self):
+        plot = self.plot.to_dict()
+        plot.update((key, self[key]) for key in RESULT_COLUMNS + ("zone_buildable_areas",))
+        return plot
+
+
+class PlotViews(Sequence):
+    """Lazy sequence of PlotView objects (one is created per access)."""
+
+    __slots__ = ("_results",)
+
+    def __init__(self, results):
+        self._results = results
+
+    def __len__(self):
+        return len(self._results.inputs)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [PlotView(self._results, i) for i in range(len(self))[index]]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return PlotView(self._results, index)
+
+
+class ProjectResults(Mapping):
+    """Immutable project results that keep the input plots separate from the outputs.
+
+    Indexes like the calculate_totals dict (``results["total_buildable_area"]``,
+    ``results["plots"]``), so it can be passed to generate_excel_report and
+    generate_pdf_report as is. ``to_dict()`` materializes the exact calculate_totals dict.
+    """
+
+    __slots__ = ("inputs", "totals", "outputs", "zone_buildable_areas", "zone_offsets")
+
+    def __init__(self, inputs, totals, outputs, zone_buildable_areas, zone_offsets):
+        for array in list(outputs.values()) + [zone_buildable_areas, zone_offsets]:
+            array.flags.writeable = False
+        object.__setattr__(self, "inputs", inputs)
+        object.__setattr__(self, "totals", MappingProxyType(totals))
+        object.__setattr__(self, "outputs", outputs)
+        object.__setattr__(self, "zone_buildable_areas", zone_buildable_areas)
+        object.__setattr__(self, "zone_offsets", zone_offsets)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ProjectResults is immutable.")
+
+    def __getitem__(self, key):
+        if key == "plots":
+            return PlotViews(self)
+        return self.totals[key]
+
+    def __iter__(self):
+        yield from self.totals
+        yield "plots"
+
+    def __len__(self):
+        return len(self.totals) + 1
+
+    def to_dict(self):
+        results = dict(self.totals)
+        results["plots"] = [view.to_dict() for view in self["plots"]]
+        return results
+
+
+# ----------------------- Calculation -----------------------#
+
+# Function to build the columnar plot table from Plot records by attribute access
+def records_to_columns(records):
+    columns = {}
+    for name, dtype in PLOT_COLUMNS.items():
+        values = [getattr(plot, name) for plot in records]
+        if name == "road_deduction_percent":
+            values = [np.nan if value is None else value for value in values]
+        columns[name] = np.array(values, dtype=dtype).reshape(len(records))
+    zones = [(i, zone) for i, plot in enumerate(records) for zone in plot.zones]
+    columns["zone_plot"] = np.array([i for i, _ in zones], dtype=np.int64)
+    columns["zone_percentage"] = np.array([zone.percentage for _, zone in zones], dtype=np.float64)
+    columns["zone_density_factor"] = np.array([zone.density_factor for _, zone in zones], dtype=np.float64)
+    columns["zone_type"] = np.array([ZONE_TYPE_CODES.get(zone.density_type.lower(), UNKNOWN_TYPE) for _, zone in zones],
+                                    dtype=np.int8)
+
+    # Optional geometry inputs (see geometry.py), None where a plot has none
+    clusters = plot_clusters(records)
+    if clusters is not None:
+        columns["plot_cluster"] = np.array(clusters, dtype=np.int64)
+    if any(plot.footprint_area is not None for plot in records):
+        columns["footprint_area"] = np.array([plot.footprint_area for plot in records], dtype=np.float64)
+    return columns
+
+
+# Function to calculate a project into immutable results without touching the inputs
+def calculate_project(plots, apply_efficiency_incentive, rule_table=None):
+    """Equivalent of calculate_totals for Plot records (or plot dicts, which are converted).
+
+    Per-plot outputs are kept in read-only arrays instead of being written into the plots.
+    """
+    inputs = tuple(Plot.from_dict(plot) for plot in plots)
+    columns = records_to_columns(inputs)
+    with span("models.compute"):
+        outputs = compute_plot_columns(columns, rule_table)
+    with span("models.aggregation"):
+        sums = {key: values[0].item() for key, values in aggregate_plot_columns(columns, outputs).items()}
+        totals = summarize_totals(sums, apply_efficiency_incentive, None)
+    del totals["plots"]
+    increment("models.plots", len(inputs))
+
+    zone_offsets = np.searchsorted(columns["zone_plot"], np.arange(len(inputs) + 1))
+    zone_buildable_areas = np.round(outputs["zone_buildable_area"]).astype(np.int64)
+    return ProjectResults(inputs, totals, {key: outputs[key] for key in RESULT_COLUMNS},
+                          zone_buildable_areas, zone_offsets)
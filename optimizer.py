@@ -0,0 +1,192 @@
+import copy
+import itertools
+
+import numpy as np
+
+from Calculations import calculate_totals
+from batch_calculations import COMMERCIAL, RESIDENTIAL, ZONE_TYPE_CODES, UNKNOWN_TYPE, compute_plot_columns, plots_to_columns
+
+# Objectives and whether they maximize a value or minimize cost per unit of value
+OBJECTIVES = {
+    "buildable_area": "maximize total_buildable_area",
+    "residential_area": "maximize residential_buildable_area",
+    "cost_per_m2": "minimize (total_price + extra floor cost) per buildable m²",
+    "cost_per_floor_area": "minimize (total_price + extra floor cost) per m² of coverage × floors",
+}
+RATIO_OBJECTIVES = ("cost_per_m2", "cost_per_floor_area")
+
+DENSITY_TYPE_NAMES = {RESIDENTIAL: "Residential", COMMERCIAL: "Commercial"}
+
+# Extra floors tried when a plot has no explicit upper bound (the sidebar input is unbounded)
+DEFAULT_MAX_EXTRA_FLOORS = 5
+
+
+# ----------------------- Candidate Generation -----------------------#
+
+# Function to list every way of splitting `units` into `parts` non-negative integers
+def _compositions(units, parts):
+    if parts == 1:
+        return np.array([[units]], dtype=np.int64)
+    blocks = []
+    for first in range(units + 1):
+        rest = _compositions(units - first, parts - 1)
+        blocks.append(np.column_stack([np.full(len(rest), first, dtype=np.int64), rest]))
+    return np.vstack(blocks)
+
+
+# Function to enumerate zone splits that respect per-zone percentage bounds and sum to 100
+def zone_splits(num_zones, step=1, bounds=None):
+    if 100 % step:
+        raise ValueError("Percentage step must divide 100.")
+    splits = _compositions(100 // step, num_zones) * step
+    if bounds is not None:
+        lower = np.array([low for low, _ in bounds])
+        upper = np.array([high for _, high in bounds])
+        splits = splits[np.all((splits >= lower) & (splits <= upper), axis=1)]
+    return splits
+
+
+# Function to keep the candidates no other candidate beats on both value and cost
+def pareto_frontier(value, cost, tiebreak):
+    """Indices of non-dominated candidates (higher value, lower cost), sorted by rising cost.
+
+    Among candidates with equal value and cost, the one with the highest ``tiebreak`` is kept.
+    """
+    order = np.lexsort((-tiebreak, -value, cost))
+    running_best = np.maximum.accumulate(value[order])
+    keep = np.empty(len(order), dtype=np.bool_)
+    keep[0] = True
+    keep[1:] = value[order][1:] > running_best[:-1]
+    return order[keep]
+
+
+# ----------------------- Optimizer -----------------------#
+
+# Function to evaluate and prune every candidate configuration of one plot
+def _plot_frontier(plot, outputs, i, objective, step, bounds, optimize_types, max_extra_floors):
+    zones = plot["zones"]
+    density_factor = np.array([zone["density_factor"] for zone in zones], dtype=np.float64)
+    splits = zone_splits(len(zones), step, bounds)
+    if not len(splits):
+        raise ValueError(f"Zone percentage bounds of plot {plot.get('serial_number', i + 1)} cannot sum to 100.")
+
+    if optimize_types:
+        types = np.array(list(itertools.product((RESIDENTIAL, COMMERCIAL), repeat=len(zones))), dtype=np.int8)
+    else:
+        types = np.array([[ZONE_TYPE_CODES.get(zone["density_type"].lower(), UNKNOWN_TYPE) for zone in zones]],
+                         dtype=np.int8)
+    if max_extra_floors is None:
+        # Extra floors are not optimized: keep the plot's own setting
+        current = plot.get("extra_floors", 0) if plot.get("allow_extra_floors", False) else 0
+        extra_floors = np.array([current], dtype=np.int64)
+    else:
+        extra_floors = np.arange(max_extra_floors + 1, dtype=np.int64)
+
+    # Buildable area is linear in the split: net area × Σ(percentage × density) / 10,000
+    net = outputs["net_plot_size"][i]
+    weighted = splits * density_factor / 100                                 # (splits, zones)
+    buildable = net * np.einsum("sz,tz->st", weighted, (types != UNKNOWN_TYPE).astype(np.float64)) / 100
+    residential = net * np.einsum("sz,tz->st", weighted, (types == RESIDENTIAL).astype(np.float64)) / 100
+
+    floor_height = plot.get("floor_height", 0)
+    base_floors = int(plot.get("max_height", 0) // floor_height) if floor_height > 0 else 0
+    floor_area = outputs["coverage_area"][i] * (base_floors + extra_floors)   # (floors,)
+    floor_cost = extra_floors * plot.get("cost_per_extra_floor", 0.0)
+
+    shape = (len(splits), len(types), len(extra_floors))
+    buildable = np.broadcast_to(buildable[:, :, None], shape).ravel()
+    residential = np.broadcast_to(residential[:, :, None], shape).ravel()
+    floor_area = np.broadcast_to(floor_area[None, None, :], shape).ravel()
+    cost = np.broadcast_to(floor_cost[None, None, :], shape).ravel()
+
+    value = {"buildable_area": buildable, "residential_area": residential,
+             "cost_per_m2": buildable, "cost_per_floor_area": floor_area}[objective]
+    frontier = pareto_frontier(value, cost, buildable)
+    split_index, type_index, floor_index = np.unravel_index(frontier, shape)
+    return {
+        "value": value[frontier],
+        "cost": cost[frontier],
+        "splits": splits[split_index],
+        "types": types[type_index],
+        "extra_floors": extra_floors[floor_index],
+        "evaluated": len(value),
+    }
+
+
+# Function to pick one frontier candidate per plot for the project objective
+def _select(frontiers, objective, total_price):
+    if objective not in RATIO_OBJECTIVES:
+        # Separable maximization: best value per plot (frontier is cost-ascending, so the last is best)
+        return [len(frontier["value"]) - 1 for frontier in frontiers]
+
+    # Dinkelbach iteration: minimize Σ(cost - λ·value) per plot until λ, the ratio, stops improving
+    choice = [len(frontier["value"]) - 1 for frontier in frontiers]
+    ratio = np.inf
+    for _ in range(100):
+        total_value = sum(f["value"][k] for f, k in zip(frontiers, choice))
+        total_cost = total_price + sum(f["cost"][k] for f, k in zip(frontiers, choice))
+        if total_value <= 0:
+            return choice
+        new_ratio = total_cost / total_value
+        if new_ratio >= ratio - 1e-12:
+            break
+        ratio = new_ratio
+        choice = [int(np.argmin(f["cost"] - ratio * f["value"])) for f in frontiers]
+    return choice
+
+
+# Function to optimize zone splits, zone types and extra floors of a project
+def optimize_project(plots, objective="buildable_area", total_price=0, apply_efficiency_incentive=False,
+                     percentage_step=1, percentage_bounds=None, optimize_types=True,
+                     optimize_extra_floors=True, max_extra_floors=DEFAULT_MAX_EXTRA_FLOORS, rule_table=None):
+    """Search each plot's zone percentages, zone types and extra floors for the best project objective.
+
+    Zone percentages move in ``percentage_step`` increments, sum to 100 and stay within
+    ``percentage_bounds`` (per plot, a list of (min, max) per zone; defaults to 0-100 like the
+    sliders). Extra floors range over 0..``max_extra_floors`` at each plot's cost per extra floor.
+    Candidates are evaluated in vectorized batches per plot and pruned to the Pareto frontier of
+    objective value against extra floor cost before plots are combined.
+
+    Returns a dict with the optimized plot dicts, their calculate_totals results and the
+    objective value.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective {objective!r}; choose from {', '.join(OBJECTIVES)}.")
+
+    outputs = compute_plot_columns(plots_to_columns(plots), rule_table)
+    frontiers = []
+    for i, plot in enumerate(plots):
+        bounds = percentage_bounds[i] if percentage_bounds is not None else None
+        floors = max_extra_floors if optimize_extra_floors else None
+        frontiers.append(_plot_frontier(plot, outputs, i, objective, percentage_step, bounds, optimize_types, floors))
+
+    choice = _select(frontiers, objective, total_price)
+
+    optimized = copy.deepcopy(plots)
+    for plot, frontier, k in zip(optimized, frontiers, choice):
+        for j, zone in enumerate(plot["zones"]):
+            zone["percentage"] = int(frontier["splits"][k][j])
+            if optimize_types:
+                zone["density_type"] = DENSITY_TYPE_NAMES[int(frontier["types"][k][j])]
+        if optimize_extra_floors:
+            plot["extra_floors"] = int(frontier["extra_floors"][k])
+            plot["allow_extra_floors"] = plot["extra_floors"] > 0
+
+    results = calculate_totals(copy.deepcopy(optimized), apply_efficiency_incentive, "Proportional", [], rule_table)
+    cost = total_price + results["total_extra_floors_cost"]
+    objective_value = {
+        "buildable_area": results["total_buildable_area"],
+        "residential_area": results["residential_buildable_area"],
+        "cost_per_m2": cost / results["total_buildable_area"] if results["total_buildable_area"] else float("inf"),
+        "cost_per_floor_area": cost / sum(p["max_buildable_area"] for p in results["plots"])
+        if any(p["max_buildable_area"] for p in results["plots"]) else float("inf"),
+    }[objective]
+
+    return {
+        "plots": optimized,
+        "results": results,
+        "objective": objective,
+        "objective_value": objective_value,
+        "candidates_evaluated": sum(frontier["evaluated"] for frontier in frontiers),
+        "frontier_sizes": [len(frontier["value"]) for frontier in frontiers],
+    }
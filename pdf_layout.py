@@ -0,0 +1,217 @@
+from io import BytesIO
+
+from fpdf import FPDF
+
+from instrumentation import increment, span
+from reports import LOGO_PATH, RISK_TABLE_COLUMNS
+
+# Plot summary table columns and their widths (mm); the widths fill an A4 portrait page
+PDF_PLOT_COLUMNS = [
+    ("Plot", 12),
+    ("Serial Number", 24),
+    ("Plot Size (m²)", 19),
+    ("Road (m²)", 17),
+    ("Green (m²)", 17),
+    ("Net Land (m²)", 19),
+    ("Coverage (m²)", 19),
+    ("Floors", 12),
+    ("Max Buildable (m²)", 25),
+    ("Buildable (m²)", 26),
+]
+
+# Zone detail table columns, one table per zone type
+PDF_ZONE_COLUMNS = [
+    ("Plot", 14),
+    ("Serial Number", 32),
+    ("Zone", 14),
+    ("Share (%)", 22),
+    ("Density Factor (%)", 30),
+    ("Zone Area (m²)", 38),
+    ("Buildable (m²)", 40),
+]
+
+PDF_RISK_COLUMN_WIDTHS = [30, 50, 50, 60]
+
+# Projects with more plots than this get the detailed report in the Streamlit app
+DETAILED_PDF_MIN_PLOTS = 25
+
+
+# ----------------------- Page Template -----------------------#
+
+class ReportPDF(FPDF):
+    """Page template of the detailed report.
+
+    Every page gets the logo, the project header and a page number footer. While a table is
+    being drawn, ``table_header`` is set and redrawn at the top of each page the table runs
+    onto. The logo is embedded once and referenced from every page.
+    """
+
+    def __init__(self, project_name):
+        super().__init__()
+        self.project_name = project_name
+        self.table_header = None
+        self.set_auto_page_break(auto=True, margin=15)
+
+    def header(self):
+        self.image(LOGO_PATH, x=10, y=8, w=20)
+        self.set_font("Arial", style="B", size=9)
+        self.cell(0, 8, f"Density Analysis Report - {self.project_name}", align="R", ln=True)
+        self.ln(8)
+        if self.table_header:
+            self.table_header()
+
+    def footer(self):
+        self.set_y(-12)
+        self.set_font("Arial", size=8)
+        self.cell(0, 8, f"Page {self.page_no()} of {{nb}}", align="C")
+
+
+# Function to render the table of contents placeholder once all sections are known
+def _render_toc(pdf, outline):
+    pdf.set_font("Arial", style="B", size=14)
+    pdf.cell(0, 10, "Contents", ln=True)
+    pdf.set_font("Arial", size=11)
+    for section in outline:
+        link = pdf.add_link(page=section.page_number)
+        pdf.cell(160, 8, section.name, link=link)
+        pdf.cell(0, 8, str(section.page_number), align="R", ln=True, link=link)
+
+
+# Function to draw plain table rows with text() and rect() instead of cell()
+def _draw_rows(pdf, widths, rows, height=6):
+    """cell() lays out every string as styled text (about 0.25 ms a cell); body rows only need
+    centred text in a box, so they are placed directly and page breaks are handled here."""
+    font_size = pdf.font_size
+    baseline = 0.5 * height + 0.3 * font_size
+    for row in rows:
+        if pdf.y + height > pdf.page_break_trigger:
+            pdf.add_page()
+        x, y = pdf.l_margin, pdf.y
+        text_width = pdf.current_font.get_text_width
+        for text, width in zip(row, widths):
+            pdf.rect(x, y, width, height)
+            pdf.text(x + (width - text_width(text, pdf.font_size_pt, None)[1] / pdf.k) / 2, y + baseline, text)
+            x += width
+        pdf.set_y(y + height)
+
+
+# Function to draw a table that runs over as many pages as it needs
+def _draw_table(pdf, columns, rows, total_row=None):
+    def draw_header():
+        pdf.set_font("Arial", style="B", size=7)
+        for label, width in columns:
+            pdf.cell(width, 7, label, border=1, align="C", fill=True)
+        pdf.ln()
+        pdf.set_font("Arial", size=7)
+
+    widths = [width for _, width in columns]
+    pdf.set_fill_color(230, 230, 230)
+    pdf.table_header = draw_header
+    draw_header()
+    _draw_rows(pdf, widths, rows)
+    if total_row is not None:
+        pdf.set_font("Arial", style="B", size=7)
+        for text, width in zip(total_row(), widths):
+            pdf.cell(width, 6, text, border=1, align="C", fill=True)
+        pdf.ln()
+    pdf.table_header = None
+    pdf.ln(6)
+
+
+# Function to start a new top-level section that the table of contents links to
+def _section(pdf, title):
+    if pdf.will_page_break(40):
+        pdf.add_page()
+    pdf.start_section(title)
+    pdf.set_font("Arial", style="B", size=14)
+    pdf.cell(0, 10, title, ln=True)
+    pdf.ln(2)
+
+
+# ----------------------- Detailed PDF Report -----------------------#
+
+# Function to render the detailed (multi-page) PDF report of a large project
+def generate_detailed_pdf_report(results, total_price, price_per_m2, project_name, risk_table=None):
+    """Summary and contents, a plot table with one total row, a zone table per zone type and
+    the risk percentiles; tables are streamed row by row and repeat their header on every page."""
+    build_span = span("pdf.detailed_build").start()
+    plots = results["plots"]
+    pdf = ReportPDF(project_name)
+    pdf.add_page()
+
+    # Title page: summary and table of contents
+    pdf.set_font("Arial", style="B", size=16)
+    pdf.cell(0, 10, "Density Analysis Report", ln=True, align="C")
+    pdf.set_font("Arial", style="B", size=14)
+    pdf.cell(0, 10, f"Project: {project_name}", ln=True, align="C")
+    pdf.set_font("Arial", style="B", size=12)
+    pdf.cell(0, 10, f"Total Project Price: EUR {total_price:,.2f}", ln=True, align="C")
+    pdf.ln(5)
+    pdf.set_font("Arial", size=11)
+    for line in [
+        f"Plots: {len(plots):,}",
+        f"Total Buildable Area: {round(results['total_buildable_area']):,} m²",
+        f"Residential Buildable Area: {round(results['residential_buildable_area']):,} m²",
+        f"Commercial Buildable Area: {round(results['commercial_buildable_area']):,} m²",
+        f"Road Deduction: {round(results['total_road_deduction']):,} m²",
+        f"Public Green Deduction: {round(results['total_green_deduction']):,} m²",
+        f"Price per Buildable Area: EUR {round(price_per_m2):,}",
+    ]:
+        pdf.cell(0, 8, line, ln=True)
+    pdf.ln(5)
+    pdf.insert_toc_placeholder(_render_toc)
+
+    # Plot table; the totals are summed from the unrounded values while the rows stream out
+    plot_totals = [0.0] * 7
+
+    def plot_rows():
+        for i, plot in enumerate(plots):
+            values = (plot["plot_size"], plot["road_deduction"], plot["green_deduction"], plot["net_plot_size"],
+                      plot["coverage_area"], plot["max_buildable_area"], sum(plot["zone_buildable_areas"]))
+            for k, value in enumerate(values):
+                plot_totals[k] += value
+            yield (str(i + 1), str(plot["serial_number"]), *(f"{round(value):,}" for value in values[:5]),
+                   str(plot["max_floors"]), *(f"{round(value):,}" for value in values[5:]))
+
+    def plot_total_row():
+        values = [f"{round(value):,}" for value in plot_totals]
+        return ["Total", "", *values[:5], "", *values[5:]]
+
+    _section(pdf, "Plot Summary")
+    with span("pdf.detailed_plots"):
+        _draw_table(pdf, PDF_PLOT_COLUMNS, plot_rows(), plot_total_row)
+
+    # One zone detail table per zone type, in order of first appearance
+    zone_types = list(dict.fromkeys(zone["density_type"].title() for plot in plots for zone in plot["zones"]))
+    for zone_type in zone_types:
+        zone_totals = [0.0, 0.0]
+
+        def zone_rows():
+            for i, plot in enumerate(plots):
+                for j, (zone, buildable_area) in enumerate(zip(plot["zones"], plot["zone_buildable_areas"])):
+                    if zone["density_type"].title() != zone_type:
+                        continue
+                    zone_area = plot["net_plot_size"] * zone["percentage"] / 100
+                    zone_totals[0] += zone_area
+                    zone_totals[1] += buildable_area
+                    yield (str(i + 1), str(plot["serial_number"]), str(j + 1), f"{zone['percentage']:g}",
+                           f"{zone['density_factor']:g}", f"{round(zone_area):,}", f"{round(buildable_area):,}")
+
+        _section(pdf, f"{zone_type} Zones")
+        with span("pdf.detailed_zones"):
+            _draw_table(pdf, PDF_ZONE_COLUMNS, zone_rows(),
+                        lambda: ["Total", "", "", "", "", *(f"{round(value):,}" for value in zone_totals)])
+
+    # Monte Carlo percentiles, when a simulation was run
+    if risk_table:
+        _section(pdf, "Risk Analysis (Monte Carlo)")
+        _draw_table(pdf, list(zip(RISK_TABLE_COLUMNS, PDF_RISK_COLUMN_WIDTHS)), (
+            (label, f"{round(buildable_area):,}", f"{risk_price_per_m2:,.2f}", f"{cost_per_m2:,.2f}")
+            for label, buildable_area, risk_price_per_m2, cost_per_m2 in risk_table
+        ))
+
+    build_span.stop()
+    increment("reports.pdf_detailed")
+
+    with span("pdf.output"):
+        return BytesIO(pdf.output())
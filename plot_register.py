@@ -0,0 +1,210 @@
+import csv
+import re
+from itertools import zip_longest
+
+import numpy as np
+
+from Calculations import TOTAL_SUM_KEYS, summarize_totals
+from batch_calculations import PLOT_COLUMNS, ZONE_TYPE_CODES, UNKNOWN_TYPE, aggregate_plot_columns, compute_plot_columns
+
+# Plots read per chunk; peak memory is proportional to this, not to the register size
+DEFAULT_CHUNK_SIZE = 50_000
+
+# Defaults for plot columns a register may leave out
+REGISTER_DEFAULTS = {
+    "is_parceled": False,
+    "road_deduction_percent": 0,
+    "coverage_percent": 0,
+    "max_height": 0,
+    "floor_height": 0,
+    "allow_extra_floors": False,
+    "extra_floors": 0,
+    "cost_per_extra_floor": 0.0,
+}
+
+# Zone columns are numbered per zone: zone1_percentage, zone1_density_factor, zone1_type, ...
+ZONE_COLUMN_PATTERN = re.compile(r"^zone(\d+)_(percentage|density_factor|type)$")
+
+TRUE_VALUES = {"1", "true", "yes", "y", "t"}
+
+# Per-plot result columns written by calculate_totals_streaming
+RESULT_COLUMNS = (
+    "serial_number",
+    "plot_size",
+    "net_plot_size",
+    "road_deduction",
+    "green_deduction",
+    "coverage_area",
+    "max_floors",
+    "extra_floors_cost",
+    "max_buildable_area",
+)
+
+
+# ----------------------- Register Reader -----------------------#
+
+# Function to parse a column of CSV strings into a numeric or boolean array
+def _parse_column(values, dtype, default, name, line_numbers):
+    """Raise ValueError naming the CSV line and column of the first value that is not a number."""
+    if dtype is np.bool_:
+        return np.array([value.strip().lower() in TRUE_VALUES if value.strip() else default for value in values],
+                        dtype=np.bool_)
+    try:
+        return np.array([value if value.strip() else default for value in values], dtype=np.float64).astype(dtype)
+    except ValueError:
+        for value, line in zip(values, line_numbers):
+            try:
+                float(value if value.strip() else default)
+            except ValueError:
+                raise ValueError(f"Plot register line {line}, column {name}: {value.strip()!r} is not a number.") from None
+        raise
+
+
+# Function to turn a chunk of CSV rows into column arrays
+def _rows_to_columns(rows, line_numbers, header_index, zone_numbers):
+    fields = list(zip_longest(*rows, fillvalue=""))
+    columns = {"serial_number": list(fields[header_index["serial_number"]])
+               if "serial_number" in header_index else [""] * len(rows)}
+
+    for name, dtype in PLOT_COLUMNS.items():
+        if name in header_index:
+            columns[name] = _parse_column(fields[header_index[name]], dtype, REGISTER_DEFAULTS.get(name, 0), name,
+                                          line_numbers)
+        else:
+            columns[name] = np.full(len(rows), REGISTER_DEFAULTS[name], dtype=dtype)
+
+    # Build (plots x zones) matrices, then flatten row-major so zones stay grouped by plot
+    percentage = np.zeros((len(rows), len(zone_numbers)))
+    density_factor = np.zeros((len(rows), len(zone_numbers)))
+    zone_type = np.full((len(rows), len(zone_numbers)), UNKNOWN_TYPE, dtype=np.int8)
+    present = np.zeros((len(rows), len(zone_numbers)), dtype=np.bool_)
+    for j, number in enumerate(zone_numbers):
+        raw = fields[header_index[f"zone{number}_percentage"]]
+        present[:, j] = [bool(value.strip()) for value in raw]
+        percentage[:, j] = _parse_column(raw, np.float64, 0, f"zone{number}_percentage", line_numbers)
+        if f"zone{number}_density_factor" in header_index:
+            density_factor[:, j] = _parse_column(fields[header_index[f"zone{number}_density_factor"]], np.float64, 0,
+                                                 f"zone{number}_density_factor", line_numbers)
+        if f"zone{number}_type" in header_index:
+            zone_type[:, j] = [ZONE_TYPE_CODES.get(value.strip().lower(), UNKNOWN_TYPE)
+                               for value in fields[header_index[f"zone{number}_type"]]]
+
+    plot_index, zone_index = np.nonzero(present)
+    columns["zone_plot"] = plot_index.astype(np.int64)
+    columns["zone_number"] = np.asarray(zone_numbers, dtype=np.int64)[zone_index]
+    columns["register_zone_numbers"] = list(zone_numbers)
+    columns["zone_percentage"] = percentage[present]
+    columns["zone_density_factor"] = density_factor[present]
+    columns["zone_type"] = zone_type[present]
+    return columns
+
+
+# Function to read a plot register CSV in chunks of column arrays
+def read_plot_register(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield column tables (see batch_calculations.plots_to_columns) of at most ``chunk_size`` plots.
+
+    ``source`` is a path or an open text file. One row per plot; plot fields use the plot dict
+    keys (only ``plot_size`` is required) and zones use numbered ``zone<N>_percentage``,
+    ``zone<N>_density_factor`` and ``zone<N>_type`` columns. Blank zone percentages mark unused zones.
+    Each zone row keeps its ``N`` in ``zone_number``, and every chunk lists the register's zone
+    numbers under ``register_zone_numbers``.
+    """
+    if isinstance(source, str):
+        with open(source, newline="") as file:
+            yield from read_plot_register(file, chunk_size)
+        return
+
+    reader = csv.reader(source)
+    header = next(reader, None)
+    if header is None:
+        raise ValueError("Plot register is empty.")
+    header = [name.strip() for name in header]
+    header_index = {name: k for k, name in enumerate(header)}
+    if "plot_size" not in header_index:
+        raise ValueError("Plot register must have a plot_size column.")
+    zone_numbers = sorted({int(match.group(1)) for match in map(ZONE_COLUMN_PATTERN.match, header)
+                           if match and match.group(2) == "percentage"})
+
+    rows = []
+    line_numbers = []
+    for row in reader:
+        if not row:
+            continue
+        rows.append(row)
+        line_numbers.append(reader.line_num)
+        if len(rows) >= chunk_size:
+            yield _rows_to_columns(rows, line_numbers, header_index, zone_numbers)
+            rows = []
+            line_numbers = []
+    if rows:
+        yield _rows_to_columns(rows, line_numbers, header_index, zone_numbers)
+
+
+# ----------------------- Streaming Totals -----------------------#
+
+class TotalsAccumulator:
+    """Running project sums that chunks are folded into one at a time."""
+
+    def __init__(self):
+        self.sums = dict.fromkeys(TOTAL_SUM_KEYS, 0)
+        self.plot_count = 0
+
+    def add(self, chunk_sums, plot_count):
+        for key in TOTAL_SUM_KEYS:
+            self.sums[key] += chunk_sums[key]
+        self.plot_count += plot_count
+
+    def totals(self, apply_efficiency_incentive):
+        return summarize_totals(dict(self.sums), apply_efficiency_incentive, [])
+
+
+# Function to write one chunk of per-plot results as CSV rows, one column per zone number
+def _write_result_rows(writer, columns, outputs, zone_numbers):
+    zone_plot = np.asarray(columns["zone_plot"], dtype=np.int64)
+    if "zone_number" in columns:
+        zone_number = np.asarray(columns["zone_number"], dtype=np.int64)
+    else:
+        # Plain column tables number zones by their position in the plot
+        zone_number = np.arange(len(zone_plot)) - np.searchsorted(zone_plot, zone_plot) + 1
+    slot_of = {number: k for k, number in enumerate(zone_numbers)}
+    unknown = set(zone_number.tolist()) - set(slot_of)
+    if unknown:
+        raise ValueError(f"Zone numbers {sorted(unknown)} have no result column; "
+                         f"results have columns for zones {list(zone_numbers)}.")
+
+    zone_cells = np.full((len(columns["plot_size"]), len(zone_numbers)), "", dtype=object)
+    zone_cells[zone_plot, [slot_of[number] for number in zone_number.tolist()]] = \
+        np.round(outputs["zone_buildable_area"]).astype(np.int64).tolist()
+    plot_values = [columns.get("serial_number", [""] * len(columns["plot_size"])), columns["plot_size"].tolist()] + \
+        [outputs[name].tolist() for name in RESULT_COLUMNS[2:]]
+    writer.writerows(list(row) + zones for row, zones in zip(zip(*plot_values), zone_cells.tolist()))
+
+
+# Function to calculate project totals over a stream of column chunks
+def calculate_totals_streaming(chunks, apply_efficiency_incentive, output=None, max_zones=3, rule_table=None):
+    """Chunked calculate_totals: fold each chunk into running sums and drop it.
+
+    When ``output`` (a path or open text file) is given, per-plot results are streamed to it as
+    CSV with one ``zone<N>_buildable_area`` column per register zone number (taken from the
+    first chunk), or ``max_zones`` columns for chunks without them. The returned totals have the
+    same keys as calculate_totals with an empty "plots" list.
+    """
+    if isinstance(output, str):
+        with open(output, "w", newline="") as file:
+            return calculate_totals_streaming(chunks, apply_efficiency_incentive, file, max_zones, rule_table)
+
+    writer = csv.writer(output) if output is not None else None
+    zone_numbers = None
+    accumulator = TotalsAccumulator()
+    for columns in chunks:
+        outputs = compute_plot_columns(columns, rule_table)
+        chunk_sums = aggregate_plot_columns(columns, outputs)
+        accumulator.add({key: chunk_sums[key][0].item() for key in TOTAL_SUM_KEYS}, len(columns["plot_size"]))
+        if writer is not None:
+            if zone_numbers is None:
+                zone_numbers = columns.get("register_zone_numbers", range(1, max_zones + 1))
+                writer.writerow(list(RESULT_COLUMNS) + [f"zone{number}_buildable_area" for number in zone_numbers])
+            _write_result_rows(writer, columns, outputs, zone_numbers)
+    if writer is not None and zone_numbers is None:
+        writer.writerow(list(RESULT_COLUMNS) + [f"zone{k + 1}_buildable_area" for k in range(max_zones)])
+    return accumulator.totals(apply_efficiency_incentive)
@@ -0,0 +1,92 @@
+import math
+
+# Zones per plot in the table (same limit as the sidebar forms)
+MAX_TABLE_ZONES = 3
+
+# Plot table columns and the defaults of a new row (the sidebar form defaults)
+PLOT_TABLE_DEFAULTS = {
+    "Serial Number": "",
+    "Plot Size (m²)": 1000,
+    "Parceled": True,
+    "Road Deduction (%)": 10,
+    "Coverage (%)": 50,
+    "Max Height (m)": 15.0,
+    "Floor Height (m)": 3.0,
+    "Extra Floors": 0,
+    "Cost per Extra Floor (€)": 25000.0,
+    "Price (€)": 0,
+    "Green Allocation (%)": 0.0,
+}
+for _zone in range(1, MAX_TABLE_ZONES + 1):
+    PLOT_TABLE_DEFAULTS[f"Zone {_zone} %"] = 100 if _zone == 1 else 0
+    PLOT_TABLE_DEFAULTS[f"Zone {_zone} Density Factor (%)"] = 50
+    PLOT_TABLE_DEFAULTS[f"Zone {_zone} Type"] = "Residential"
+
+
+# Function to read a table cell, treating blanks (None/NaN from the editor) as the default
+def _cell(row, column):
+    value = row.get(column)
+    if value is None or (isinstance(value, float) and math.isnan(value)) or value == "":
+        return PLOT_TABLE_DEFAULTS[column]
+    return value
+
+
+# Function to build the starting rows of the plot table
+def default_plot_table(num_plots=1):
+    rows = []
+    for i in range(num_plots):
+        row = dict(PLOT_TABLE_DEFAULTS)
+        row["Serial Number"] = f"Plot-{i + 1}"
+        row["Green Allocation (%)"] = 100 / num_plots
+        rows.append(row)
+    return rows
+
+
+# Function to convert plot table rows into plot dicts
+def plots_from_table(rows):
+    """Return ``(plots, prices, green_allocations, errors)`` from plot table rows (one dict per row).
+
+    Zones with a 0% share are dropped; a plot whose zone shares exceed 100% is reported in
+    ``errors`` but still returned, as the sliders would have prevented it.
+    """
+    plots, prices, green_allocations, errors = [], [], [], []
+    for i, row in enumerate(rows):
+        serial_number = str(_cell(row, "Serial Number")) or f"Plot-{i + 1}"
+        try:
+            plot_size = int(_cell(row, "Plot Size (m²)"))
+            is_parceled = bool(_cell(row, "Parceled"))
+            extra_floors = int(_cell(row, "Extra Floors"))
+            zones = []
+            for zone in range(1, MAX_TABLE_ZONES + 1):
+                percentage = int(_cell(row, f"Zone {zone} %"))
+                if percentage > 0:
+                    zones.append({"percentage": percentage,
+                                  "density_factor": int(_cell(row, f"Zone {zone} Density Factor (%)")),
+                                  "density_type": str(_cell(row, f"Zone {zone} Type"))})
+            plot = {
+                "serial_number": serial_number,
+                "plot_size": plot_size,
+                "is_parceled": is_parceled,
+                "road_deduction_percent": 0 if is_parceled else int(_cell(row, "Road Deduction (%)")),
+                "zones": zones,
+                "coverage_percent": int(_cell(row, "Coverage (%)")),
+                "max_height": float(_cell(row, "Max Height (m)")),
+                "floor_height": float(_cell(row, "Floor Height (m)")),
+                "allow_extra_floors": extra_floors > 0,
+                "extra_floors": extra_floors,
+                "cost_per_extra_floor": float(_cell(row, "Cost per Extra Floor (€)")) if extra_floors > 0 else 0.0,
+            }
+            price = int(_cell(row, "Price (€)"))
+            green_allocation = float(_cell(row, "Green Allocation (%)"))
+        except (TypeError, ValueError):
+            errors.append(f"{serial_number}: please enter valid numbers.")
+            continue
+
+        if plot_size < 0:
+            errors.append(f"{serial_number}: plot size must be a positive number.")
+        if sum(zone["percentage"] for zone in zones) > 100:
+            errors.append(f"{serial_number}: zone percentages exceed 100%.")
+        plots.append(plot)
+        prices.append(price)
+        green_allocations.append(green_allocation)
+    return plots, prices, green_allocations, errors
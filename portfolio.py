@@ -0,0 +1,370 @@
+"""Rank many saved project configurations by price per buildable m², buildable area and
+extra floor cost exposure.
+
+    python portfolio.py projects/*.json --sort price_per_m2 --top 20
+    python portfolio.py projects/*.json --sort total_buildable_area --descending --max price_per_m2 3000
+
+Each input is a configuration written by utils.save_configuration (or saved in a project
+store with ``--store``). Projects are split into contiguous ranges of about the same plot
+count; each worker process loads its own range, packs it into one column table and
+calculates it, so only range bounds and per-project totals cross process boundaries.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from Calculations import plot_clusters
+from batch_calculations import aggregate_plot_columns, compute_plot_columns, plots_to_columns, summarize_totals_arrays
+from utils import load_configuration
+
+# Metrics every evaluated project gets, and the ones a ranking can sort or filter on
+PORTFOLIO_METRICS = ("total_price", "total_buildable_area", "residential_buildable_area", "commercial_buildable_area",
+                     "total_extra_floors_cost", "price_per_m2", "extra_floors_cost_share")
+
+# Portfolios with fewer plots than this are calculated in this process
+DEFAULT_PARALLEL_THRESHOLD = 50_000
+
+# Rough size of one plot in a saved configuration file, to balance work before files are read
+CONFIG_BYTES_PER_PLOT = 700
+
+# Work is split into about this many project ranges per worker, for load balancing
+TASKS_PER_WORKER = 4
+
+# Shared arrays that describe projects rather than plot or zone rows
+PROJECT_ARRAYS = ("project_plot_offsets", "project_zone_offsets", "project_incentive")
+
+
+# ----------------------- Shared Columns -----------------------#
+
+class SharedColumns:
+    """Column arrays copied once into named shared memory blocks.
+
+    ``spec`` (block name, dtype and shape per column) is all a worker needs to map the same
+    memory with attach_columns. The creating process unlinks the blocks on close().
+    """
+
+    def __init__(self, columns):
+        self.blocks = []
+        self.spec = {}
+        for name, values in columns.items():
+            values = np.ascontiguousarray(values)
+            block = shared_memory.SharedMemory(create=True, size=max(1, values.nbytes))
+            self.blocks.append(block)
+            np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[...] = values
+            self.spec[name] = (block.name, values.dtype.str, values.shape)
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Function to map shared column blocks into this process
+def attach_columns(spec):
+    """Return ({column: array view}, blocks); keep the blocks open while the views are used."""
+    blocks = [shared_memory.SharedMemory(name=block_name) for block_name, _, _ in spec.values()]
+    columns = {name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+               for (name, (_, dtype, shape)), block in zip(spec.items(), blocks)}
+    return columns, blocks
+
+
+# ----------------------- Evaluation -----------------------#
+
+# Function to pack every project's plots into one column table with project offsets
+def pack_portfolio(configs):
+    plots = [plot for config in configs for plot in config["plots"]]
+    columns = plots_to_columns(plots)
+    counts = np.array([len(config["plots"]) for config in configs], dtype=np.int64)
+    plot_offsets = np.concatenate([[0], np.cumsum(counts)])
+    if "plot_cluster" in columns:
+        # Cluster labels are per project, so number each project's clusters on its own (plots
+        # without a label are their own cluster) and keep different projects' clusters apart
+        labels, first_label = [], 0
+        for config in configs:
+            clusters = plot_clusters(config["plots"])
+            if clusters is None:
+                clusters = range(len(config["plots"]))
+            project_labels = np.unique(np.asarray(clusters, dtype=np.int64), return_inverse=True)[1].reshape(-1)
+            labels.append(project_labels + first_label)
+            first_label += int(project_labels.max(initial=-1)) + 1
+        columns["plot_cluster"] = np.concatenate(labels)
+    columns["project_plot_offsets"] = plot_offsets
+    columns["project_zone_offsets"] = np.searchsorted(columns["zone_plot"], plot_offsets)
+    columns["project_incentive"] = np.array([bool(config.get("apply_efficiency_incentive", False))
+                                             for config in configs], dtype=np.bool_)
+    return columns
+
+
+# Function to calculate the totals of a contiguous range of packed projects
+def _evaluate_range(columns, first, last, rule_table=None):
+    plot_offsets = columns["project_plot_offsets"]
+    zone_offsets = columns["project_zone_offsets"]
+    plot_start, plot_stop = int(plot_offsets[first]), int(plot_offsets[last])
+    zone_start, zone_stop = int(zone_offsets[first]), int(zone_offsets[last])
+
+    sliced = {}
+    for name, values in columns.items():
+        if name in PROJECT_ARRAYS:
+            continue
+        if name.startswith("zone_"):
+            sliced[name] = values[zone_start:zone_stop]
+        else:
+            sliced[name] = values[plot_start:plot_stop]
+    sliced["zone_plot"] = sliced["zone_plot"] - plot_start
+
+    num_projects = last - first
+    segments = np.repeat(np.arange(num_projects, dtype=np.int64), np.diff(plot_offsets[first:last + 1]))
+    outputs = compute_plot_columns(sliced, rule_table)
+    totals = summarize_totals_arrays(aggregate_plot_columns(sliced, outputs, segments, num_projects),
+                                     columns["project_incentive"][first:last])
+    return {metric: totals[metric] for metric in PORTFOLIO_METRICS if metric in totals}
+
+
+# Function to read a configuration given as a dict or as the path of a configuration file
+def load_project_config(source):
+    """Return the configuration; a file without a project name is named after the file."""
+    if not isinstance(source, (str, os.PathLike)):
+        return source
+    config = load_configuration(source)
+    if config is None:
+        raise FileNotFoundError(f"{source}: configuration not found")
+    config.setdefault("project_name", os.path.splitext(os.path.basename(source))[0])
+    return config
+
+
+# Function to collect the names and prices of configurations numbered from ``first``
+def _project_fields(configs, first=0):
+    return {"project_name": [config.get("project_name", f"Project {first + i + 1}") for i, config in enumerate(configs)],
+            "total_price": np.array([config.get("total_price", 0) for config in configs], dtype=np.float64)}
+
+
+# Function to pack and calculate a list of configurations numbered from ``first``
+def _evaluate_configs(configs, first=0, rule_table=None):
+    part = _evaluate_range(pack_portfolio(configs), 0, len(configs), rule_table)
+    part.update(_project_fields(configs, first))
+    return part
+
+
+# Worker process state, set once per worker by an initializer
+_worker = {}
+
+
+# Function to hand a worker process the portfolio's sources (inherited, not pickled, when forked)
+def _init_loader(sources, rule_table):
+    _worker["sources"] = sources
+    _worker["rule_table"] = rule_table
+
+
+# Function to load, pack and calculate one range of sources in a worker process
+def _evaluate_source_range(first, last):
+    configs = [load_project_config(source) for source in _worker["sources"][first:last]]
+    return _evaluate_configs(configs, first, _worker["rule_table"])
+
+
+# Function to attach a worker process to the shared portfolio columns
+def _init_worker(spec, rule_table):
+    _worker["columns"], _worker["blocks"] = attach_columns(spec)
+    _worker["rule_table"] = rule_table
+
+
+# Function to evaluate one packed project range in a worker process
+def _evaluate_shared_range(first, last):
+    return _evaluate_range(_worker["columns"], first, last, _worker["rule_table"])
+
+
+# Function to split projects into contiguous ranges with about the same number of plots each
+def _project_ranges(plot_offsets, num_tasks):
+    num_projects = len(plot_offsets) - 1
+    targets = np.linspace(0, plot_offsets[-1], num_tasks + 1)[1:-1]
+    bounds = np.unique(np.concatenate([[0], np.searchsorted(plot_offsets, targets), [num_projects]]))
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+# Function to estimate the plots of each source without reading configuration files
+def _source_plot_counts(sources):
+    return np.array([os.path.getsize(source) / CONFIG_BYTES_PER_PLOT if isinstance(source, (str, os.PathLike))
+                     else len(source["plots"]) for source in sources], dtype=np.float64)
+
+
+# Function to calculate the totals and ranking metrics of many project configurations
+def evaluate_portfolio(configs, rule_table=None, max_workers=None, parallel_threshold=DEFAULT_PARALLEL_THRESHOLD):
+    """Return {"project_name": [...], metric: array} with one entry per configuration.
+
+    ``configs`` holds configuration dicts or paths of configuration files (see
+    load_project_config). Totals equal calculate_totals for each project. Portfolios of about
+    ``parallel_threshold`` plots or more are split into project ranges on a process pool whose
+    workers load, pack and calculate their own ranges, so only per-project totals come back.
+    Where processes cannot be forked, dict configurations are packed here instead and read by
+    the workers from shared memory. Price per m² is NaN for projects without buildable area.
+    """
+    sources = list(configs)
+    workers = min(max_workers or os.cpu_count() or 1, len(sources))
+    plot_counts = _source_plot_counts(sources) if workers > 1 else None
+
+    if workers > 1 and plot_counts.sum() >= parallel_threshold:
+        ranges = _project_ranges(np.concatenate([[0], np.cumsum(plot_counts)]), workers * TASKS_PER_WORKER)
+        can_fork = "fork" in multiprocessing.get_all_start_methods()
+        if can_fork or all(isinstance(source, (str, os.PathLike)) for source in sources):
+            context = multiprocessing.get_context("fork") if can_fork else None
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_loader,
+                                     initargs=(sources, rule_table)) as executor:
+                parts = list(executor.map(_evaluate_source_range, *zip(*ranges)))
+        else:
+            configs = [load_project_config(source) for source in sources]
+            with SharedColumns(pack_portfolio(configs)) as shared:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                         initargs=(shared.spec, rule_table)) as executor:
+                    parts = list(executor.map(_evaluate_shared_range, *zip(*ranges)))
+            for part, (first, last) in zip(parts, ranges):
+                part.update(_project_fields(configs[first:last], first))
+    else:
+        parts = [_evaluate_configs([load_project_config(source) for source in sources], 0, rule_table)]
+
+    evaluation = {metric: np.concatenate([part[metric] for part in parts]) for metric in parts[0]
+                  if metric != "project_name"}
+    evaluation["project_name"] = [name for part in parts for name in part["project_name"]]
+    total_price = evaluation["total_price"]
+    buildable = evaluation["total_buildable_area"]
+    extra_floors_cost = evaluation["total_extra_floors_cost"]
+    evaluation["price_per_m2"] = np.divide(total_price, buildable, out=np.full(len(sources), np.nan),
+                                           where=buildable != 0)
+    all_in = total_price + extra_floors_cost
+    evaluation["extra_floors_cost_share"] = np.divide(extra_floors_cost, all_in, out=np.zeros(len(sources)),
+                                                      where=all_in != 0)
+    return evaluation
+
+
+# ----------------------- Ranking -----------------------#
+
+# Function to rank evaluated projects, keeping the best ``top_k`` that pass the filters
+def rank_projects(evaluation, by="price_per_m2", descending=False, top_k=None, filters=None):
+    """Return ranked row dicts (rank, index, project_name and every metric).
+
+    ``filters`` maps metrics to inclusive ``(min, max)`` bounds, either of which may be None.
+    Only the top ``top_k`` are sorted (argpartition first); projects without a value for
+    ``by`` (NaN) rank last, and ties keep the input order.
+    """
+    if top_k is not None and top_k < 0:
+        raise ValueError(f"top_k must be zero or more, not {top_k}.")
+    for metric in [by, *(filters or {})]:
+        if metric not in PORTFOLIO_METRICS:
+            raise ValueError(f"Unknown metric {metric!r}; choose from {', '.join(PORTFOLIO_METRICS)}.")
+    keep = np.ones(len(evaluation["project_name"]), dtype=np.bool_)
+    for metric, (low, high) in (filters or {}).items():
+        values = evaluation[metric]
+        if low is not None:
+            keep &= values >= low
+        if high is not None:
+            keep &= values <= high
+
+    candidates = np.flatnonzero(keep)
+    keys = evaluation[by][candidates]
+    keys = np.where(np.isnan(keys), np.inf, -keys if descending else keys)
+    if top_k == 0:
+        candidates, keys = candidates[:0], keys[:0]
+    elif top_k is not None and top_k < len(candidates):
+        best = np.argpartition(keys, top_k - 1)[:top_k]
+        candidates, keys = candidates[best], keys[best]
+    order = np.lexsort((candidates, keys))
+
+    rows = []
+    for rank, i in enumerate(candidates[order].tolist(), start=1):
+        row = {"rank": rank, "index": i, "project_name": evaluation["project_name"][i]}
+        row.update((metric, float(evaluation[metric][i])) for metric in PORTFOLIO_METRICS)
+        rows.append(row)
+    return rows
+
+
+# Function to format ranked rows as a fixed-width text table
+def format_ranking(rows):
+    lines = [f"{'Rank':>5}  {'Project':<30} {'EUR/m²':>10} {'Buildable m²':>14} {'Extra Floors EUR':>17} {'Extra %':>8}"]
+    for row in rows:
+        lines.append(f"{row['rank']:>5}  {row['project_name'][:30]:<30} {row['price_per_m2']:>10,.2f} "
+                     f"{row['total_buildable_area']:>14,.0f} {row['total_extra_floors_cost']:>17,.0f} "
+                     f"{row['extra_floors_cost_share'] * 100:>7.1f}%")
+    return "\n".join(lines)
+
+
+# ----------------------- Command Line -----------------------#
+
+# Function to load the latest saved version of every project in a project store
+def load_store_configurations(path):
+    from project_store import ProjectStore
+
+    with ProjectStore(path) as store:
+        latest = {}
+        for project in store.find_projects():
+            latest.setdefault(project["project_name"], project["id"])
+        return [store.load_project(project_id)["config"] for project_id in latest.values()]
+
+
+# Function to parse a count given on the command line that must be at least 1
+def _positive_int(text):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive number, got {text}")
+    return value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rank project configurations.")
+    parser.add_argument("configs", nargs="*", help="Project configuration JSON files.")
+    parser.add_argument("--store", help="Also rank the latest version of every project in this SQLite store.")
+    parser.add_argument("--sort", choices=PORTFOLIO_METRICS, default="price_per_m2")
+    parser.add_argument("--descending", action="store_true", help="Rank the largest values first.")
+    parser.add_argument("--top", type=_positive_int, help="Only list the best N projects.")
+    parser.add_argument("--min", nargs=2, action="append", default=[], metavar=("METRIC", "VALUE"),
+                        help="Keep projects with METRIC >= VALUE (repeatable).")
+    parser.add_argument("--max", nargs=2, action="append", default=[], metavar=("METRIC", "VALUE"),
+                        help="Keep projects with METRIC <= VALUE (repeatable).")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per CPU).")
+    parser.add_argument("--rules-file", default="rules.json", help="Municipality rule tables (see rules.py).")
+    parser.add_argument("--municipality", help="Rule table to use (default: the built-in table).")
+    args = parser.parse_args(argv)
+
+    for path in args.configs:
+        if not os.path.isfile(path):
+            print(f"{path}: configuration not found", file=sys.stderr)
+            return 1
+    configs = list(args.configs)
+    if args.store:
+        configs.extend(load_store_configurations(args.store))
+    if not configs:
+        parser.error("give at least one configuration file or --store")
+
+    rule_table = None
+    if args.municipality:
+        from rules import load_rule_tables
+        rule_table = load_rule_tables(args.rules_file)[args.municipality]
+
+    filters = {}
+    for bound, entries in ((0, args.min), (1, args.max)):
+        for metric, value in entries:
+            limits = list(filters.get(metric, (None, None)))
+            limits[bound] = float(value)
+            filters[metric] = tuple(limits)
+
+    try:
+        evaluation = evaluate_portfolio(configs, rule_table, args.workers)
+        rows = rank_projects(evaluation, args.sort, args.descending, args.top, filters)
+    except (OSError, KeyError, TypeError, ValueError) as e:
+        print(f"portfolio: {e!r}", file=sys.stderr)
+        return 1
+    print(format_ranking(rows))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
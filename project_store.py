@@ -0,0 +1,224 @@
+import copy
+import hashlib
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from Calculations import calculate_totals
+from rules import DEFAULT_RULE_TABLE
+
+DEFAULT_DATABASE = "projects.db"
+
+# Configuration keys that determine the calculate_totals results (name and price do not)
+CALCULATION_KEYS = ("plots", "apply_efficiency_incentive", "green_allocation_method", "custom_green_allocations")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    input_hash TEXT PRIMARY KEY,
+    total_buildable_area REAL NOT NULL,
+    results TEXT NOT NULL,
+    calculated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project_name TEXT NOT NULL,
+    saved_at TEXT NOT NULL,
+    input_hash TEXT NOT NULL REFERENCES results (input_hash),
+    rules TEXT NOT NULL,
+    total_price REAL NOT NULL,
+    config TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS projects_name ON projects (project_name, saved_at);
+CREATE INDEX IF NOT EXISTS projects_saved_at ON projects (saved_at);
+CREATE INDEX IF NOT EXISTS projects_input_hash ON projects (input_hash);
+CREATE INDEX IF NOT EXISTS results_buildable_area ON results (total_buildable_area);
+"""
+
+SUMMARY_COLUMNS = ("id", "project_name", "saved_at", "input_hash", "rules", "total_price", "total_buildable_area")
+
+
+# Function to hash everything in a configuration that affects its results
+def configuration_hash(config, rule_table=None):
+    inputs = {key: config.get(key) for key in CALCULATION_KEYS}
+    inputs["rules"] = (rule_table or DEFAULT_RULE_TABLE).fingerprint
+    encoded = json.dumps(inputs, sort_keys=True, separators=(",", ":"), default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+# Function to calculate the results of a configuration without touching its plot dicts
+def calculate_configuration(config, rule_table=None):
+    return calculate_totals(
+        copy.deepcopy(config["plots"]),
+        config.get("apply_efficiency_incentive", False),
+        config.get("green_allocation_method", "Proportional"),
+        config.get("custom_green_allocations", []),
+        rule_table,
+    )
+
+
+class ProjectStore:
+    """SQLite store of project configurations and their results, keyed by input hash.
+
+    Every save adds a new version of a project; results are stored once per input hash and
+    shared by all versions with the same inputs, so they are only recalculated for inputs
+    the store has not seen. The database uses WAL mode, so several processes can read while
+    one writes; a store object may be shared between threads.
+    """
+
+    def __init__(self, path=DEFAULT_DATABASE, timeout=30.0):
+        self.path = path
+        self._connection = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            if path != ":memory:":
+                self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(SCHEMA)
+        self.calculated = 0
+        self.reused = 0
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # ----------------------- Results -----------------------#
+
+    def _stored_results(self, input_hashes):
+        found = {}
+        hashes = list(input_hashes)
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            rows = self._connection.execute(
+                f"SELECT input_hash, results FROM results WHERE input_hash IN ({','.join('?' * len(chunk))})", chunk)
+            found.update((row["input_hash"], row["results"]) for row in rows)
+        return found
+
+    def get_results(self, input_hash):
+        with self._lock:
+            encoded = self._stored_results([input_hash]).get(input_hash)
+        return json.loads(encoded) if encoded is not None else None
+
+    def calculate(self, config, rule_table=None):
+        """Return ``(results, reused)``, calculating and storing them only for unseen inputs."""
+        input_hash = configuration_hash(config, rule_table)
+        results = self.get_results(input_hash)
+        if results is not None:
+            self.reused += 1
+            return results, True
+        results = calculate_configuration(config, rule_table)
+        with self._lock, self._connection:
+            self._insert_results(input_hash, results)
+        self.calculated += 1
+        return results, False
+
+    def _insert_results(self, input_hash, results):
+        self._connection.execute(
+            "INSERT OR IGNORE INTO results (input_hash, total_buildable_area, results, calculated_at) VALUES (?, ?, ?, ?)",
+            (input_hash, results["total_buildable_area"], json.dumps(results, default=str), _now()))
+
+    # ----------------------- Projects -----------------------#
+
+    def save_project(self, config, results=None, rule_table=None, saved_at=None):
+        """Save a new version of a project and return its id.
+
+        ``results`` may be passed when already calculated; otherwise stored results for the
+        same inputs are reused, or the project is calculated.
+        """
+        return self.save_projects([config], [results] if results is not None else None, rule_table, saved_at)[0]
+
+    def save_projects(self, configs, results=None, rule_table=None, saved_at=None):
+        """Save many projects in one transaction and return their ids.
+
+        Inputs already in the store, or repeated within ``configs``, are calculated only once.
+        """
+        configs = list(configs)
+        input_hashes = [configuration_hash(config, rule_table) for config in configs]
+        with self._lock:
+            stored = set(self._stored_results(set(input_hashes)))
+
+        new_results = {}
+        for i, (config, input_hash) in enumerate(zip(configs, input_hashes)):
+            if input_hash in stored or input_hash in new_results:
+                self.reused += 1
+            elif results is not None:
+                new_results[input_hash] = results[i]
+            else:
+                new_results[input_hash] = calculate_configuration(config, rule_table)
+                self.calculated += 1
+
+        saved_at = saved_at or _now()
+        rules = (rule_table or DEFAULT_RULE_TABLE).name
+        ids = []
+        with self._lock, self._connection:
+            for input_hash, project_results in new_results.items():
+                self._insert_results(input_hash, project_results)
+            for config, input_hash in zip(configs, input_hashes):
+                cursor = self._connection.execute(
+                    "INSERT INTO projects (project_name, saved_at, input_hash, rules, total_price, config) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (config.get("project_name", ""), saved_at, input_hash, rules, config.get("total_price", 0),
+                     json.dumps(config, default=str)))
+                ids.append(cursor.lastrowid)
+        return ids
+
+    def load_project(self, project_id):
+        """Return ``{..summary columns.., "config": ..., "results": ...}`` or None."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT p.*, r.total_buildable_area, r.results FROM projects p "
+                "JOIN results r ON r.input_hash = p.input_hash WHERE p.id = ?", (project_id,)).fetchone()
+        if row is None:
+            return None
+        project = {column: row[column] for column in SUMMARY_COLUMNS}
+        project["config"] = json.loads(row["config"])
+        project["results"] = json.loads(row["results"])
+        return project
+
+    def latest_project(self, project_name):
+        found = self.find_projects(project_name=project_name, limit=1)
+        return self.load_project(found[0]["id"]) if found else None
+
+    def find_projects(self, project_name=None, saved_after=None, saved_before=None,
+                      min_buildable_area=None, max_buildable_area=None, limit=None):
+        """List project summaries (newest first) matching all given filters.
+
+        Dates are ISO strings or datetimes; the buildable area range is inclusive.
+        """
+        conditions, params = [], []
+        for clause, value in (("p.project_name = ?", project_name),
+                              ("p.saved_at >= ?", _isoformat(saved_after)),
+                              ("p.saved_at <= ?", _isoformat(saved_before)),
+                              ("r.total_buildable_area >= ?", min_buildable_area),
+                              ("r.total_buildable_area <= ?", max_buildable_area)):
+            if value is not None:
+                conditions.append(clause)
+                params.append(value)
+        query = ("SELECT p.id, p.project_name, p.saved_at, p.input_hash, p.rules, p.total_price, r.total_buildable_area "
+                 "FROM projects p JOIN results r ON r.input_hash = p.input_hash")
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY p.saved_at DESC, p.id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(int(limit))
+        with self._lock:
+            rows = self._connection.execute(query, params).fetchall()
+        return [dict(row) for row in rows]
+
+
+# Function to timestamp a save in UTC
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+# Function to accept datetimes as query bounds
+def _isoformat(value):
+    if isinstance(value, datetime):
+        return value.astimezone(timezone.utc).isoformat(timespec="seconds")
+    return value
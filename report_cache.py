@@ -0,0 +1,80 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 128
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+# Function to hash the inputs that fully determine a report
+def report_cache_key(results, total_price, price_per_m2, project_name, risk_table=None, dcf=None):
+    encoded = json.dumps([results, total_price, price_per_m2, project_name, risk_table, dcf],
+                         sort_keys=True, separators=(",", ":"), default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class ReportCache:
+    """Size-bounded LRU of rendered report bytes, keyed by report kind and content hash.
+
+    Entries are evicted oldest-first once either ``max_entries`` or ``max_bytes`` is exceeded;
+    a single report larger than ``max_bytes`` is built and returned but never stored. Safe to
+    share between Streamlit sessions (threads).
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def size_bytes(self):
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, kind, key):
+        with self._lock:
+            data = self._entries.get((kind, key))
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((kind, key))
+            self.hits += 1
+            return data
+
+    def put(self, kind, key, data):
+        data = bytes(data)
+        if len(data) > self.max_bytes:
+            return data
+        with self._lock:
+            previous = self._entries.pop((kind, key), None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[(kind, key)] = data
+            self._size += len(data)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+        return data
+
+    def get_or_build(self, kind, key, build):
+        """Return cached bytes for (kind, key), calling ``build()`` on a miss.
+
+        ``build`` may return bytes or a file-like object such as the BytesIO of the generators.
+        """
+        data = self.get(kind, key)
+        if data is None:
+            built = build()
+            data = self.put(kind, key, built.getvalue() if hasattr(built, "getvalue") else built)
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
@@ -1,18 +1,42 @@
+from concurrent.futures import ProcessPoolExecutor
 from fpdf import FPDF
+from functools import lru_cache
+from instrumentation import increment, span
 from io import BytesIO
+from PIL import Image
 import pandas as pd
-import tempfile
+import xlsxwriter
 import os
 
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logo.png")
+
 # ----------------------- PDF Report Generator -----------------------#
-def generate_pdf_report(results, total_price, price_per_m2, project_name):
+
+# Function to load and decode the report logo once per process
+@lru_cache(maxsize=1)
+def load_logo():
+    with Image.open(LOGO_PATH) as logo:
+        logo.load()
+        return logo.copy()
+
+
+# Monte Carlo percentile table columns (rows come from risk.MonteCarloResult.percentile_table)
+RISK_TABLE_COLUMNS = ["Percentile", "Total Buildable Area (m²)", "Price per m² (EUR)", "Cost per m² incl. Extra Floors (EUR)"]
+
+
+# DCF sheet cash flow columns (rows come from dcf.project_dcf)
+DCF_CASH_FLOW_COLUMNS = ["Period", "Land (EUR)", "Construction (EUR)", "Extra Floors (EUR)", "Residential Sales (EUR)",
+                         "Commercial Sales (EUR)", "Net Cash Flow (EUR)", "Discounted Cash Flow (EUR)"]
+
+
+def generate_pdf_report(results, total_price, price_per_m2, project_name, risk_table=None):
+    build_span = span("pdf.build").start()
     pdf = FPDF()
     pdf.set_auto_page_break(auto=True, margin=15)
     pdf.add_page()
 
     # Add Logo
-    logo_path = "logo.png"  # Ensure this is the correct path to your logo
-    pdf.image(logo_path, x=10, y=8, w=30)  # Adjust the position and size as needed
+    pdf.image(load_logo(), x=10, y=8, w=30)  # Adjust the position and size as needed
 
     # Add Title and Project Name
     pdf.set_font("Arial", style="B", size=16)
@@ -88,84 +112,249 @@ def generate_pdf_report(results, total_price, price_per_m2, project_name):
             pdf.cell(width, 10, data, border=1, align="C")
         pdf.ln()
 
-        # Add a Total Row
-        pdf.set_font("Arial", style="B", size=10)  # Bold font for the total row
-        total_row = [
-            "Total",
-            f"{total_plot_size:,}",
-            f"{total_road_deduction:,}",
-            f"{total_green_deduction:,}",
-            f"{total_net_land_area:,}",
-        ]
-        for data, width in zip(total_row, col_widths):
-            pdf.cell(width, 10, data, border=1, align="C")
+    # Add a Total Row (once, after every plot)
+    pdf.set_font("Arial", style="B", size=10)  # Bold font for the total row
+    total_row = [
+        "Total",
+        f"{total_plot_size:,}",
+        f"{total_road_deduction:,}",
+        f"{total_green_deduction:,}",
+        f"{total_net_land_area:,}",
+    ]
+    for data, width in zip(total_row, col_widths):
+        pdf.cell(width, 10, data, border=1, align="C")
+    pdf.ln()
+
+    pdf.ln(10)
+
+    # Monte Carlo percentiles, when a simulation was run
+    if risk_table:
+        pdf.set_font("Arial", style="B", size=14)
+        pdf.cell(0, 10, "Risk Analysis (Monte Carlo)", ln=True)
+        pdf.ln(5)
+        risk_widths = [30, 50, 50, 60]
+        pdf.set_font("Arial", style="B", size=10)
+        for header, width in zip(RISK_TABLE_COLUMNS, risk_widths):
+            pdf.cell(width, 10, header, border=1, align="C")
         pdf.ln()
+        pdf.set_font("Arial", size=10)
+        for label, buildable_area, risk_price_per_m2, cost_per_m2 in risk_table:
+            row = [label, f"{round(buildable_area):,}", f"{risk_price_per_m2:,.2f}", f"{cost_per_m2:,.2f}"]
+            for data, width in zip(row, risk_widths):
+                pdf.cell(width, 10, data, border=1, align="C")
+            pdf.ln()
+
+    build_span.stop()
+    increment("reports.pdf")
+
+    # Render the PDF in memory (no shared temporary file between sessions)
+    with span("pdf.output"):
+        return BytesIO(pdf.output())
+
 
-        pdf.ln(10)
+# Function to render one PDF report to raw bytes (picklable, for worker processes)
+def render_pdf_bytes(job):
+    """``job`` is a ``(results, total_price, price_per_m2, project_name)`` tuple."""
+    return generate_pdf_report(*job).getvalue()
 
-    # Save PDF to a temporary file in a cross-platform way
-    temp_dir = tempfile.gettempdir()
-    temp_file = os.path.join(temp_dir, 'report.pdf')
-    pdf.output(temp_file)
 
-    # Read the file into a BytesIO object
-    with open(temp_file, "rb") as f:
-        pdf_data = BytesIO(f.read())
-    return pdf_data
+# Function to render PDF reports for many projects on a process pool
+def generate_pdf_reports(jobs, max_workers=None, chunksize=8):
+    """Render one PDF per job, in job order.
+
+    Each job is a ``(results, total_price, price_per_m2, project_name)`` tuple, the arguments
+    of generate_pdf_report. Pass ``max_workers=1`` to render serially in this process.
+    """
+    jobs = list(jobs)
+    if max_workers == 1 or len(jobs) <= 1:
+        return [generate_pdf_report(*job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=load_logo) as executor:
+        return [BytesIO(data) for data in executor.map(render_pdf_bytes, jobs, chunksize=chunksize)]
 
 # ----------------------- Excel Report Generator -----------------------#
 
 
-def generate_excel_report(results, total_price, price_per_m2):
-    output = BytesIO()
+# Summary sheet metric labels, in row order
+SUMMARY_METRICS = [
+    "Total Buildable Area (m²)",
+    "Residential Buildable Area (m²)",
+    "Commercial Buildable Area (m²)",
+    "Total Deductions (m²)",
+    "Road Deduction (m²)",
+    "Public Green Deduction (m²)",
+    "Price per Buildable Area (€)",
+]
 
-    # Create main summary DataFrame
-    summary_data = {
-        "Metric": [
-            "Total Buildable Area (m²)",
-            "Residential Buildable Area (m²)",
-            "Commercial Buildable Area (m²)",
-            "Total Deductions (m²)",
-            "Road Deduction (m²)",
-            "Public Green Deduction (m²)",
-            "Price per Buildable Area (€)",
-        ],
-        "Value": [
-            results['total_buildable_area'],
-            results['residential_buildable_area'],
-            results['commercial_buildable_area'],
-            results['total_road_deduction'] + results['total_green_deduction'],
-            results['total_road_deduction'],
-            results['total_green_deduction'],
-            f"{price_per_m2:,.2f}",
-        ]
-    }
-    summary_df = pd.DataFrame(summary_data)
+# Plot Details sheet columns, one row per plot zone
+PLOT_DETAIL_COLUMNS = [
+    "Plot Serial Number",
+    "Plot Area (m²)",
+    "Road Deduction (m²)",
+    "Public Green Deduction (m²)",
+    "Net Land Area (m²)",
+    "Zone",
+    "Zone Percentage (%)",
+    "Density Factor (%)",
+    "Zone Type",
+    "Buildable Area (m²)",
+]
 
-    # Create detailed plot breakdown
-    plot_details = []
-    for plot in results['plots']:
+
+# Function to list the summary sheet values in SUMMARY_METRICS order
+def summary_values(results, price_per_m2):
+    return [
+        results['total_buildable_area'],
+        results['residential_buildable_area'],
+        results['commercial_buildable_area'],
+        results['total_road_deduction'] + results['total_green_deduction'],
+        results['total_road_deduction'],
+        results['total_green_deduction'],
+        price_per_m2,
+    ]
+
+
+# Function to yield one Plot Details row per plot zone
+def iter_plot_detail_rows(plots):
+    for plot in plots:
         for j, zone_buildable_area in enumerate(plot["zone_buildable_areas"]):
             zone = plot["zones"][j]
-            plot_details.append({
-                "Plot Serial Number": plot["serial_number"],
-                "Plot Area (m²)": plot["plot_size"],
-                "Road Deduction (m²)": plot["road_deduction"],
-                "Public Green Deduction (m²)": plot["green_deduction"],
-                "Net Land Area (m²)": plot["net_plot_size"],
-                "Zone": f"Zone {j + 1}",
-                "Zone Percentage (%)": zone["percentage"],
-                "Density Factor (%)": zone["density_factor"],
-                "Zone Type": zone["density_type"],
-                "Buildable Area (m²)": zone_buildable_area,
-            })
-
-    plot_df = pd.DataFrame(plot_details)
+            yield (
+                plot["serial_number"],
+                plot["plot_size"],
+                plot["road_deduction"],
+                plot["green_deduction"],
+                plot["net_plot_size"],
+                f"Zone {j + 1}",
+                zone["percentage"],
+                zone["density_factor"],
+                zone["density_type"],
+                zone_buildable_area,
+            )
+
+
+# Plot summary columns, one row per plot with its zones' buildable areas summed
+PLOT_SUMMARY_COLUMNS = [
+    "Plot",
+    "Plot Serial Number",
+    "Plot Area (m²)",
+    "Road Deduction (m²)",
+    "Public Green Deduction (m²)",
+    "Net Land Area (m²)",
+    "Zones",
+    "Buildable Area (m²)",
+]
+
+
+# Function to yield one plot summary row per plot, numbered from ``first``
+def iter_plot_summary_rows(plots, first=1):
+    for i, plot in enumerate(plots, start=first):
+        yield (
+            i,
+            plot["serial_number"],
+            plot["plot_size"],
+            plot["road_deduction"],
+            plot["green_deduction"],
+            plot["net_plot_size"],
+            len(plot["zone_buildable_areas"]),
+            sum(plot["zone_buildable_areas"]),
+        )
+
+
+def generate_excel_report(results, total_price, price_per_m2, risk_table=None, dcf=None):
+    output = BytesIO()
+
+    with span("excel.build"):
+        # Create main summary DataFrame
+        values = summary_values(results, price_per_m2)
+        values[-1] = f"{price_per_m2:,.2f}"
+        summary_df = pd.DataFrame({"Metric": SUMMARY_METRICS, "Value": values})
+
+        # Create detailed plot breakdown
+        plot_df = pd.DataFrame(list(iter_plot_detail_rows(results['plots'])), columns=PLOT_DETAIL_COLUMNS)
 
     # Write both DataFrames to Excel
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+    with span("excel.write"), pd.ExcelWriter(output, engine='xlsxwriter') as writer:
         summary_df.to_excel(writer, index=False, sheet_name="Summary")
         plot_df.to_excel(writer, index=False, sheet_name="Plot Details")
+        if risk_table:
+            pd.DataFrame(risk_table, columns=RISK_TABLE_COLUMNS).to_excel(writer, index=False, sheet_name="Risk Analysis")
+        if dcf:
+            pd.DataFrame(dcf["summary"], columns=["Metric", "Value"]).to_excel(writer, index=False, sheet_name="DCF")
+            pd.DataFrame(dcf["cash_flows"], columns=DCF_CASH_FLOW_COLUMNS).to_excel(
+                writer, index=False, sheet_name="DCF", startrow=len(dcf["summary"]) + 2)
+    increment("reports.excel")
 
     output.seek(0)
-    return output
\ No newline at end of file
+    return output
+
+
+# Function to stream an Excel report row by row in constant memory
+def generate_excel_report_streaming(results, total_price, price_per_m2, output, rows=None, risk_table=None, dcf=None):
+    """Write the Excel report straight to ``output`` (a path or binary file object).
+
+    Plot Details rows are taken from ``rows`` (defaults to iter_plot_detail_rows over
+    results["plots"]) and written one at a time through xlsxwriter's constant_memory mode,
+    without building a DataFrame. Numeric cells stay numeric, including the price per
+    buildable area, which uses a thousands-separated number format instead of a string.
+    A ``risk_table`` (Monte Carlo percentile rows) adds a Risk Analysis sheet and a ``dcf``
+    (dcf.project_dcf) adds a DCF sheet.
+    """
+    if rows is None:
+        rows = iter_plot_detail_rows(results['plots'])
+
+    write_span = span("excel.write").start()
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True})
+    header_format = workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+    price_format = workbook.add_format({"num_format": "#,##0.00"})
+
+    # Summary sheet (same layout as generate_excel_report)
+    summary_sheet = workbook.add_worksheet("Summary")
+    summary_sheet.write_row(0, 0, ["Metric", "Value"], header_format)
+    values = summary_values(results, price_per_m2)
+    for i, (metric, value) in enumerate(zip(SUMMARY_METRICS, values)):
+        summary_sheet.write(i + 1, 0, metric)
+        summary_sheet.write(i + 1, 1, value, price_format if i == len(values) - 1 else None)
+
+    # Plot Details sheet, flushed row by row
+    details_sheet = workbook.add_worksheet("Plot Details")
+    details_sheet.write_row(0, 0, PLOT_DETAIL_COLUMNS, header_format)
+    row_count = 0
+    for row_count, row in enumerate(rows, start=1):
+        details_sheet.write_row(row_count, 0, row)
+
+    # Monte Carlo percentiles, when a simulation was run
+    if risk_table:
+        risk_sheet = workbook.add_worksheet("Risk Analysis")
+        risk_sheet.write_row(0, 0, RISK_TABLE_COLUMNS, header_format)
+        for i, (label, *values) in enumerate(risk_table, start=1):
+            risk_sheet.write(i, 0, label)
+            risk_sheet.write_row(i, 1, values, price_format)
+
+    # Discounted cash flow summary and cash flows by period
+    if dcf:
+        dcf_sheet = workbook.add_worksheet("DCF")
+        dcf_sheet.write_row(0, 0, ["Metric", "Value"], header_format)
+        for i, (metric, value) in enumerate(dcf["summary"], start=1):
+            dcf_sheet.write(i, 0, metric)
+            dcf_sheet.write(i, 1, value, price_format if "EUR" in metric else None)
+        first_row = len(dcf["summary"]) + 2
+        dcf_sheet.write_row(first_row, 0, DCF_CASH_FLOW_COLUMNS, header_format)
+        for i, (period, *amounts) in enumerate(dcf["cash_flows"], start=first_row + 1):
+            dcf_sheet.write(i, 0, period)
+            dcf_sheet.write_row(i, 1, amounts, price_format)
+    write_span.stop()
+    increment("reports.excel")
+    increment("reports.excel_rows", row_count)
+
+    # Assemble the xlsx archive from the flushed worksheet files
+    with span("excel.file_io"):
+        workbook.close()
+    if hasattr(output, "seek"):
+        output.seek(0)
+    return output
+
+
+# Function to render one Excel report to raw bytes (picklable, for worker processes)
+def render_excel_bytes(job):
+    """``job`` is a ``(results, total_price, price_per_m2)`` tuple."""
+    return generate_excel_report_streaming(*job, BytesIO()).getvalue()
\ No newline at end of file
@@ -0,0 +1,201 @@
+import json
+import os
+
+import numpy as np
+
+HEADER_FILE = "header.json"
+FORMAT_VERSION = 1
+DEFAULT_CHUNK_ROWS = 100_000
+
+# Largest number of data rows on one Excel worksheet (the header takes the first row)
+EXCEL_MAX_ROWS = 1_048_575
+
+# Per-plot outputs written for every scenario by sweep_totals and simulate_totals
+PLOT_RESULT_COLUMNS = {
+    "net_plot_size": np.float64,
+    "road_deduction": np.float64,
+    "green_deduction": np.float64,
+    "coverage_area": np.float64,
+    "max_floors": np.int64,
+    "extra_floors_cost": np.float64,
+    "max_buildable_area": np.float64,
+    "buildable_area": np.float64,
+}
+
+
+# Function to pick the per-plot result columns of a computed scenario chunk
+def plot_result_chunk(columns, outputs):
+    num_plots = len(outputs["net_plot_size"])
+    chunk = {name: outputs[name] for name in PLOT_RESULT_COLUMNS if name in outputs}
+    chunk["buildable_area"] = np.bincount(np.asarray(columns["zone_plot"], dtype=np.int64),
+                                          weights=outputs["zone_buildable_area"], minlength=num_plots)
+    return chunk
+
+
+# ----------------------- Writer -----------------------#
+
+class ResultStoreWriter:
+    """Appends per-plot, per-scenario result columns to an on-disk columnar store.
+
+    The store is a directory holding one raw little-endian file per column and a small
+    JSON header with the dtypes, the plot count per scenario and the committed row count.
+    Rows are scenario-major (row = scenario × num_plots + plot). The header is rewritten
+    atomically after every append, so readers only ever see whole, committed chunks.
+    """
+
+    def __init__(self, path, columns=None, num_plots=1, attrs=None):
+        columns = PLOT_RESULT_COLUMNS if columns is None else columns
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.header = {
+            "version": FORMAT_VERSION,
+            "num_plots": int(num_plots),
+            "num_rows": 0,
+            "columns": {name: np.dtype(dtype).newbyteorder("<").str for name, dtype in columns.items()},
+            "attrs": attrs or {},
+        }
+        self._files = {name: open(os.path.join(path, f"{name}.bin"), "wb") for name in columns}
+        self._write_header()
+
+    def _write_header(self):
+        temporary = os.path.join(self.path, HEADER_FILE + ".tmp")
+        with open(temporary, "w") as file:
+            json.dump(self.header, file, indent=4)
+        os.replace(temporary, os.path.join(self.path, HEADER_FILE))
+
+    def append(self, chunk):
+        """Append equal-length arrays for every column (a whole number of scenarios)."""
+        missing = set(self.header["columns"]) - set(chunk)
+        if missing:
+            raise ValueError(f"Chunk is missing columns: {', '.join(sorted(missing))}.")
+        lengths = {len(chunk[name]) for name in self.header["columns"]}
+        if len(lengths) != 1:
+            raise ValueError("All columns of a chunk must have the same length.")
+        rows = lengths.pop()
+        if rows % self.header["num_plots"]:
+            raise ValueError(f"Chunks must hold whole scenarios of {self.header['num_plots']} plots.")
+
+        for name, dtype in self.header["columns"].items():
+            file = self._files[name]
+            file.write(np.ascontiguousarray(chunk[name], dtype=dtype).tobytes())
+            file.flush()
+        self.header["num_rows"] += rows
+        self._write_header()
+
+    def close(self):
+        for file in self._files.values():
+            file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# ----------------------- Reader -----------------------#
+
+class ResultStore:
+    """Read-only, memory-mapped view of a result store; nothing is loaded until sliced."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, HEADER_FILE)) as file:
+            self.header = json.load(file)
+        if self.header["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported result store version {self.header['version']}.")
+        self._maps = {}
+
+    @property
+    def columns(self):
+        return list(self.header["columns"])
+
+    @property
+    def attrs(self):
+        return self.header["attrs"]
+
+    @property
+    def num_rows(self):
+        return self.header["num_rows"]
+
+    @property
+    def num_plots(self):
+        return self.header["num_plots"]
+
+    @property
+    def num_scenarios(self):
+        return self.num_rows // self.num_plots
+
+    def column(self, name):
+        """The whole column as a read-only memmap of committed rows."""
+        if name not in self._maps:
+            dtype = np.dtype(self.header["columns"][name])
+            if self.num_rows == 0:
+                self._maps[name] = np.zeros(0, dtype=dtype)
+            else:
+                self._maps[name] = np.memmap(os.path.join(self.path, f"{name}.bin"), dtype=dtype, mode="r",
+                                             shape=(self.num_rows,))
+        return self._maps[name]
+
+    def read(self, name, scenarios=None, plots=None):
+        """Slice a column as (scenarios, plots); each selector is None, an int, a slice or an index array."""
+        table = self.column(name).reshape(self.num_scenarios, self.num_plots)
+        scenarios = slice(None) if scenarios is None else scenarios
+        plots = slice(None) if plots is None else plots
+        if not isinstance(scenarios, (int, slice)) and not isinstance(plots, (int, slice)):
+            return table[np.ix_(np.asarray(scenarios), np.asarray(plots))]
+        return table[scenarios, plots]
+
+    def iter_chunks(self, columns=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """Yield (first row, {column: array}) chunks, reading at most ``chunk_rows`` rows at a time."""
+        columns = columns or self.columns
+        for start in range(0, self.num_rows, chunk_rows):
+            stop = min(start + chunk_rows, self.num_rows)
+            yield start, {name: np.asarray(self.column(name)[start:stop]) for name in columns}
+
+    # ----------------------- Export -----------------------#
+
+    def to_csv(self, output, columns=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """Stream rows as CSV (with scenario and plot columns) to a path or text file object."""
+        columns = columns or self.columns
+        file = open(output, "w", newline="") if isinstance(output, (str, os.PathLike)) else output
+        try:
+            file.write(",".join(["scenario", "plot"] + columns) + "\n")
+            for start, chunk in self.iter_chunks(columns, chunk_rows):
+                rows = np.arange(start, start + len(chunk[columns[0]]))
+                table = np.column_stack([rows // self.num_plots, rows % self.num_plots]
+                                        + [chunk[name] for name in columns])
+                formats = ["%d", "%d"] + ["%d" if np.dtype(self.header["columns"][name]).kind in "iub" else "%.10g"
+                                          for name in columns]
+                np.savetxt(file, table, delimiter=",", fmt=formats)
+        finally:
+            if file is not output:
+                file.close()
+
+    def to_excel(self, output, columns=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """Stream rows to an .xlsx workbook in constant memory, continuing on new sheets past
+        Excel's row limit."""
+        import xlsxwriter
+
+        columns = columns or self.columns
+        headers = ["Scenario", "Plot"] + columns
+        workbook = xlsxwriter.Workbook(output, {"constant_memory": True})
+        header_format = workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+        sheet, sheet_row, sheet_number = None, EXCEL_MAX_ROWS, 0
+        for start, chunk in self.iter_chunks(columns, chunk_rows):
+            values = [chunk[name].tolist() for name in columns]
+            for offset, row in enumerate(zip(*values)):
+                if sheet_row >= EXCEL_MAX_ROWS:
+                    sheet_number += 1
+                    sheet = workbook.add_worksheet(f"Results {sheet_number}")
+                    sheet.write_row(0, 0, headers, header_format)
+                    sheet_row = 0
+                sheet_row += 1
+                index = start + offset
+                sheet.write_row(sheet_row, 0, (index // self.num_plots, index % self.num_plots) + row)
+        if sheet is None:
+            workbook.add_worksheet("Results 1").write_row(0, 0, headers, header_format)
+        workbook.close()
+        if hasattr(output, "seek"):
+            output.seek(0)
+        return output
@@ -0,0 +1,171 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from batch_calculations import aggregate_plot_columns, compute_plot_columns, plots_to_columns, summarize_totals_arrays
+from result_store import plot_result_chunk
+from rules import DEFAULT_RULE_TABLE
+from sweep import tile_columns
+
+# Uncertain inputs, and the value each one keeps when no distribution is given
+#   total_price:                  land price (€), defaults to the project's total price
+#   road_deduction_shift:         percentage points added to every unparceled plot's road deduction
+#   density_factor_multiplier:    multiplies every zone's density factor
+#   extra_floor_cost_multiplier:  multiplies every plot's cost per extra floor
+RISK_INPUTS = ("total_price", "road_deduction_shift", "density_factor_multiplier", "extra_floor_cost_multiplier")
+NEUTRAL_VALUES = {"road_deduction_shift": 0.0, "density_factor_multiplier": 1.0, "extra_floor_cost_multiplier": 1.0}
+
+RISK_METRICS = ("total_buildable_area", "price_per_m2", "total_extra_floors_cost", "cost_per_m2")
+DEFAULT_PERCENTILES = (5, 10, 25, 50, 75, 90, 95)
+
+# Draws come from independent seeded streams of this size, so results do not depend on the
+# batch size or the number of worker processes
+STREAM_DRAWS = 4096
+
+DEFAULT_BATCH_ROWS = 1_000_000
+DEFAULT_PARALLEL_THRESHOLD = 50_000
+
+
+# ----------------------- Distributions -----------------------#
+
+# Function to draw values from a distribution spec such as {"kind": "normal", "mean": 0, "std": 2}
+def sample(spec, rng, size):
+    """Supported kinds: fixed (value), uniform (low, high), normal (mean, std),
+    triangular (low, mode, high) and lognormal (mean, sigma of the underlying normal)."""
+    kind = spec.get("kind", "fixed")
+    if kind == "fixed":
+        return np.full(size, float(spec["value"]))
+    if kind == "uniform":
+        return rng.uniform(spec["low"], spec["high"], size)
+    if kind == "normal":
+        return rng.normal(spec["mean"], spec["std"], size)
+    if kind == "triangular":
+        if spec["low"] == spec["high"]:
+            return np.full(size, float(spec["low"]))
+        return rng.triangular(spec["low"], spec["mode"], spec["high"], size)
+    if kind == "lognormal":
+        return rng.lognormal(spec["mean"], spec["sigma"], size)
+    raise ValueError(f"Unknown distribution kind {kind!r}.")
+
+
+# ----------------------- Simulation Result -----------------------#
+
+class MonteCarloResult:
+    """Every draw's metrics, plus percentile summaries."""
+
+    def __init__(self, draws, seed):
+        self.draws = draws
+        self.seed = seed
+
+    @property
+    def num_draws(self):
+        return len(self.draws["total_buildable_area"])
+
+    def percentiles(self, metric, percentiles=DEFAULT_PERCENTILES):
+        return np.percentile(self.draws[metric], percentiles)
+
+    def percentile_table(self, percentiles=DEFAULT_PERCENTILES):
+        """Rows of (label, total buildable area, price per m², cost per m² incl. extra floors),
+        the layout of reports.RISK_TABLE_COLUMNS."""
+        columns = [self.percentiles(metric, percentiles) for metric in ("total_buildable_area", "price_per_m2", "cost_per_m2")]
+        return [(f"P{q}", *(float(values[i]) for values in columns)) for i, q in enumerate(percentiles)]
+
+
+# ----------------------- Simulation -----------------------#
+
+# Function to evaluate a range of draws, sampled from the seeded streams that cover it
+def _simulate_draws(columns, distributions, seed, start, stop, num_draws,
+                    apply_efficiency_incentive, rule_table=None, plot_results=False):
+    # Whole streams are drawn and then sliced, so a draw's values never depend on the batching
+    first_stream, last_stream = start // STREAM_DRAWS, -(-stop // STREAM_DRAWS)
+    seeds = np.random.SeedSequence(seed).spawn(last_stream)[first_stream:]
+    samples = {name: [] for name in RISK_INPUTS}
+    for stream, stream_seed in enumerate(seeds, start=first_stream):
+        rng = np.random.default_rng(stream_seed)
+        size = min(STREAM_DRAWS, num_draws - stream * STREAM_DRAWS)
+        for name in RISK_INPUTS:
+            samples[name].append(sample(distributions[name], rng, size))
+    offset = first_stream * STREAM_DRAWS
+    samples = {name: np.concatenate(values)[start - offset:stop - offset] for name, values in samples.items()}
+
+    num_scenarios = stop - start
+    num_plots = len(columns["plot_size"])
+    num_zones = len(columns["zone_plot"])
+    tiled = tile_columns(columns, num_scenarios)
+    tiled["road_deduction_percent"] = np.clip(
+        tiled["road_deduction_percent"] + np.repeat(samples["road_deduction_shift"], num_plots), 0, 100)
+    tiled["zone_density_factor"] = tiled["zone_density_factor"] * np.repeat(samples["density_factor_multiplier"], num_zones)
+    tiled["cost_per_extra_floor"] = tiled["cost_per_extra_floor"] * np.repeat(samples["extra_floor_cost_multiplier"], num_plots)
+
+    outputs = compute_plot_columns(tiled, rule_table)
+    segments = np.repeat(np.arange(num_scenarios, dtype=np.int64), num_plots)
+    totals = summarize_totals_arrays(aggregate_plot_columns(tiled, outputs, segments, num_scenarios),
+                                     apply_efficiency_incentive)
+
+    buildable = totals["total_buildable_area"]
+    price = samples["total_price"]
+    return {
+        "total_buildable_area": buildable,
+        "price_per_m2": np.divide(price, buildable, out=np.zeros_like(buildable), where=buildable != 0),
+        "total_extra_floors_cost": totals["total_extra_floors_cost"],
+        "cost_per_m2": np.divide(price + totals["total_extra_floors_cost"], buildable,
+                                 out=np.zeros_like(buildable), where=buildable != 0),
+    }, plot_result_chunk(tiled, outputs) if plot_results else None
+
+
+# Function to simulate project totals under uncertain inputs
+def simulate_totals(plots, apply_efficiency_incentive, total_price, distributions=None, num_draws=100_000, seed=0,
+                    batch_rows=DEFAULT_BATCH_ROWS, max_workers=None,
+                    parallel_threshold=DEFAULT_PARALLEL_THRESHOLD, rule_table=None, store=None):
+    """Monte Carlo draws of project totals, price per m² and all-in cost per m².
+
+    ``distributions`` maps names from RISK_INPUTS to distribution specs (see sample); inputs
+    without one stay at the project's values. Each draw applies one sampled value to the whole
+    project. Draws are evaluated in vectorized chunks of at most ``batch_rows`` plot/zone
+    rows (a single draw when it alone has more), spread across a process pool for ``parallel_threshold`` draws or more; the same
+    ``seed`` always gives the same draws. Given a result_store.ResultStoreWriter as ``store``,
+    every draw's per-plot results are appended to it chunk by chunk.
+    """
+    if store is not None and store.header["num_plots"] != len(plots):
+        raise ValueError("The result store must be created with one row per plot of this project.")
+    unknown = set(distributions or {}) - set(RISK_INPUTS)
+    if unknown:
+        raise ValueError(f"Cannot simulate {', '.join(sorted(unknown))}; choose from {', '.join(RISK_INPUTS)}.")
+    specs = {"total_price": {"kind": "fixed", "value": total_price}}
+    specs.update({name: {"kind": "fixed", "value": value} for name, value in NEUTRAL_VALUES.items()})
+    specs.update(distributions or {})
+
+    # Road shifts apply on top of each plot's own (or the rule table's) road deduction
+    columns = plots_to_columns(plots)
+    rule_table = rule_table or DEFAULT_RULE_TABLE
+    missing_road = np.isnan(columns["road_deduction_percent"])
+    if missing_road.any():
+        columns["road_deduction_percent"] = np.where(
+            missing_road, rule_table.road_percentages(columns["plot_size"]), columns["road_deduction_percent"])
+
+    rows_per_draw = max(1, len(columns["plot_size"]) + len(columns["zone_plot"]))
+    draws_per_batch = max(1, batch_rows // rows_per_draw)
+    batches = [(start, min(start + draws_per_batch, num_draws)) for start in range(0, num_draws, draws_per_batch)]
+
+    # Chunks arrive in order; per-plot results go to the store as they come, not into memory
+    def collect(evaluated):
+        parts = []
+        for part, plot_chunk in evaluated:
+            parts.append(part)
+            if store is not None:
+                store.append(plot_chunk)
+        return parts
+
+    args = (num_draws, apply_efficiency_incentive, rule_table, store is not None)
+    if max_workers != 1 and num_draws >= parallel_threshold and len(batches) > 1:
+        workers = min(max_workers or os.cpu_count() or 1, len(batches))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parts = collect(executor.map(_simulate_draws, itertools.repeat(columns), itertools.repeat(specs),
+                                         itertools.repeat(seed), *zip(*batches), *(itertools.repeat(arg) for arg in args)))
+    else:
+        parts = collect(_simulate_draws(columns, specs, seed, start, stop, *args) for start, stop in batches)
+
+    draws = {metric: np.concatenate([part[metric] for part in parts]) for metric in RISK_METRICS}
+    return MonteCarloResult(draws, seed)
@@ -0,0 +1,116 @@
+import json
+from bisect import bisect_right
+
+
+# ----------------------- Rule Tables -----------------------#
+
+class RuleTable:
+    """Green (and optionally road) deduction tiers compiled into sorted boundary arrays.
+
+    ``thresholds`` are the ascending area boundaries between tiers; ``green_percents`` (and
+    ``road_percents``) hold one value per tier, so they are one longer than ``thresholds``.
+    An area equal to a threshold falls into the upper tier, as in green_area_formula.
+    """
+
+    def __init__(self, name, thresholds, green_percents, road_percents=None):
+        thresholds = list(thresholds)
+        if any(b <= a for a, b in zip(thresholds, thresholds[1:])):
+            raise ValueError(f"Rule table {name!r}: thresholds must be strictly ascending.")
+        for label, values in (("green", green_percents), ("road", road_percents)):
+            if values is not None and len(values) != len(thresholds) + 1:
+                raise ValueError(f"Rule table {name!r}: need {len(thresholds) + 1} {label} percentages, "
+                                 f"got {len(values)}.")
+        self.name = name
+        self.thresholds = tuple(thresholds)
+        self.green_percents = tuple(green_percents)
+        self.road_percents = tuple(road_percents) if road_percents is not None else None
+        self._arrays = None
+
+    @property
+    def fingerprint(self):
+        return (self.thresholds, self.green_percents, self.road_percents)
+
+    def __eq__(self, other):
+        return isinstance(other, RuleTable) and self.fingerprint == other.fingerprint
+
+    def __hash__(self):
+        return hash(self.fingerprint)
+
+    def __repr__(self):
+        return f"RuleTable({self.name!r}, tiers={len(self.green_percents)})"
+
+    # Scalar lookups use binary search over the boundaries
+    def green_percentage(self, area):
+        return self.green_percents[bisect_right(self.thresholds, area)]
+
+    def road_percentage(self, area):
+        if self.road_percents is None:
+            raise ValueError(f"Rule table {self.name!r} has no road deduction tiers.")
+        return self.road_percents[bisect_right(self.thresholds, area)]
+
+    # Array lookups use searchsorted over the same boundaries
+    def _compiled(self):
+        if self._arrays is None:
+            import numpy as np
+            self._arrays = (
+                np.asarray(self.thresholds, dtype=np.float64),
+                np.asarray(self.green_percents, dtype=np.float64),
+                np.asarray(self.road_percents, dtype=np.float64) if self.road_percents is not None else None,
+            )
+        return self._arrays
+
+    def green_percentages(self, areas):
+        import numpy as np
+        thresholds, green, _ = self._compiled()
+        return green[np.searchsorted(thresholds, areas, side="right")]
+
+    def road_percentages(self, areas):
+        import numpy as np
+        thresholds, _, road = self._compiled()
+        if road is None:
+            raise ValueError(f"Rule table {self.name!r} has no road deduction tiers.")
+        return road[np.searchsorted(thresholds, areas, side="right")]
+
+
+# Current green tiers (the table green_area_formula has always used)
+DEFAULT_RULE_TABLE = RuleTable("Default", [800, 1500, 2500, 10000, 50000], [0, 5, 10, 15, 17, 18])
+
+
+# ----------------------- Loading -----------------------#
+
+# Function to build a rule table from its config entry
+def rule_table_from_config(name, config):
+    """Build a RuleTable from ``{"tiers": [{"min_area": 0, "green_percent": 0, "road_percent": 10}, ...]}``.
+
+    The first tier must start at 0; ``road_percent`` is optional but must be given for all tiers
+    or none.
+    """
+    tiers = sorted(config["tiers"], key=lambda tier: tier["min_area"])
+    if not tiers or tiers[0]["min_area"] != 0:
+        raise ValueError(f"Rule table {name!r}: the first tier must start at min_area 0.")
+    has_road = ["road_percent" in tier for tier in tiers]
+    if any(has_road) and not all(has_road):
+        raise ValueError(f"Rule table {name!r}: road_percent must be set on every tier or none.")
+    return RuleTable(
+        name,
+        [tier["min_area"] for tier in tiers[1:]],
+        [tier["green_percent"] for tier in tiers],
+        [tier["road_percent"] for tier in tiers] if all(has_road) else None,
+    )
+
+
+# Function to load every municipality's rule table from a JSON config file
+def load_rule_tables(file_name="rules.json"):
+    """Return ``{municipality: RuleTable}`` from a ``{"municipalities": {name: {"tiers": [...]}}}`` file.
+
+    The built-in default table is always included under its name; a missing file yields only it.
+    """
+    tables = {DEFAULT_RULE_TABLE.name: DEFAULT_RULE_TABLE}
+    try:
+        with open(file_name, "r") as file:
+            config = json.load(file)
+    except FileNotFoundError:
+        return tables
+    for name, table_config in config.get("municipalities", {}).items():
+        tables[name] = rule_table_from_config(name, table_config)
+    return tables
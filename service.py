@@ -0,0 +1,437 @@
+"""Local JSON calculation service.
+
+    python service.py --port 8765
+
+Endpoints (JSON bodies are project configurations in the utils.build_configuration format,
+plus an optional "rules" municipality name):
+
+    POST /calculate        calculate_totals results and price_per_m2
+    POST /reports/excel    Excel report (.xlsx bytes); "results" may be passed instead of plots
+    POST /reports/pdf      PDF report (.pdf bytes); same body as /reports/excel
+    GET  /stats            latency, throughput, batch and queue metrics
+    GET  /health
+
+Concurrent /calculate requests are collected for up to --batch-delay-ms (or --batch-size
+requests) and evaluated together in one columnar pass. Reports are rendered on a process
+pool. When more than --max-pending calculations or --max-reports reports are waiting, the
+service answers 503 with a Retry-After header instead of queueing without bound.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from batch_calculations import calculate_totals_batch, calculate_totals_many
+from rules import DEFAULT_RULE_TABLE, load_rule_tables
+
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 64 * 1024 * 1024
+LATENCY_WINDOW = 1024
+THROUGHPUT_WINDOW_SECONDS = 60
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+REPORT_TYPES = {
+    "excel": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "pdf": "application/pdf",
+}
+
+# Report workers start from a fresh process: forked ones would inherit the listening socket
+# and every open client connection, so "Connection: close" replies would never reach EOF
+REPORT_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Overloaded(HTTPError):
+    def __init__(self, message):
+        super().__init__(503, message)
+
+
+# ----------------------- Metrics -----------------------#
+
+class ServiceStats:
+    """Per-endpoint request counts, latency percentiles and throughput, plus batch sizes."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.started = time.monotonic()
+        self.requests = Counter()
+        self.errors = Counter()
+        self.rejected = Counter()
+        self.latencies = defaultdict(lambda: deque(maxlen=window))
+        self.completed = defaultdict(deque)
+        self.batch_sizes = deque(maxlen=window)
+        self.batches = 0
+        self.batched_requests = 0
+
+    def record(self, endpoint, seconds, status):
+        now = time.monotonic()
+        self.requests[endpoint] += 1
+        if status == 503:
+            self.rejected[endpoint] += 1
+        elif status >= 400:
+            self.errors[endpoint] += 1
+        self.latencies[endpoint].append(seconds)
+        completed = self.completed[endpoint]
+        completed.append(now)
+        while completed and completed[0] < now - THROUGHPUT_WINDOW_SECONDS:
+            completed.popleft()
+
+    def record_batch(self, size):
+        self.batches += 1
+        self.batched_requests += size
+        self.batch_sizes.append(size)
+
+    def snapshot(self, queues):
+        now = time.monotonic()
+        uptime = now - self.started
+        endpoints = {}
+        for endpoint, count in self.requests.items():
+            latencies = sorted(self.latencies[endpoint])
+            recent = sum(1 for t in self.completed[endpoint] if t >= now - THROUGHPUT_WINDOW_SECONDS)
+            endpoints[endpoint] = {
+                "requests": count,
+                "errors": self.errors[endpoint],
+                "rejected": self.rejected[endpoint],
+                "latency_ms": {f"p{q}": round(_percentile(latencies, q) * 1000, 3) for q in (50, 95, 99)}
+                | {"max": round(latencies[-1] * 1000, 3) if latencies else 0.0},
+                "throughput_per_second": {
+                    "overall": round(count / uptime, 3) if uptime else 0.0,
+                    f"last_{THROUGHPUT_WINDOW_SECONDS}s": round(recent / min(uptime, THROUGHPUT_WINDOW_SECONDS), 3)
+                    if uptime else 0.0,
+                },
+            }
+        return {
+            "uptime_seconds": round(uptime, 3),
+            "endpoints": endpoints,
+            "batches": {
+                "count": self.batches,
+                "mean_size": round(self.batched_requests / self.batches, 3) if self.batches else 0.0,
+                "max_recent_size": max(self.batch_sizes, default=0),
+            },
+            "queues": queues,
+        }
+
+
+# Function to take a nearest-rank percentile of sorted values
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(q / 100 * len(values))) - 1))]
+
+
+# ----------------------- Micro-Batching -----------------------#
+
+# Function to calculate a batch of (plots, apply_efficiency_incentive, rule_table) items
+def calculate_batch(items):
+    """Return one result (or the exception it raised) per item, evaluating each rule table's
+    projects together; if a group fails, its projects are retried one by one so a bad request
+    cannot fail its neighbours."""
+    groups = defaultdict(list)
+    for i, (_, _, rule_table) in enumerate(items):
+        groups[rule_table].append(i)
+
+    results = [None] * len(items)
+    for rule_table, indices in groups.items():
+        try:
+            group_results = calculate_totals_many([items[i][:2] for i in indices], rule_table)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            group_results = []
+            for i in indices:
+                plots, apply_efficiency_incentive, _ = items[i]
+                try:
+                    group_results.append(calculate_totals_batch(plots, apply_efficiency_incentive, None, None, rule_table))
+                except (KeyError, TypeError, ValueError, AttributeError) as e:
+                    group_results.append(e)
+        for i, result in zip(indices, group_results):
+            results[i] = result
+    return results
+
+
+class MicroBatcher:
+    """Collects submitted items and evaluates them together in a worker thread."""
+
+    def __init__(self, calculate, max_batch_size=64, max_delay=0.005, max_pending=1024, stats=None):
+        self.calculate = calculate
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.stats = stats
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, item):
+        if self._queue.qsize() >= self.max_pending:
+            raise Overloaded("Too many calculations pending; retry shortly.")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_delay
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            if self.stats is not None:
+                self.stats.record_batch(len(batch))
+            try:
+                results = await loop.run_in_executor(None, self.calculate, [item for item, _ in batch])
+            except Exception as e:
+                results = [e] * len(batch)
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+
+# ----------------------- Service -----------------------#
+
+class CalculationService:
+
+    def __init__(self, rule_tables=None, max_batch_size=64, max_delay=0.005, max_pending=1024,
+                 report_workers=None, max_reports=8):
+        self.rule_tables = rule_tables or {DEFAULT_RULE_TABLE.name: DEFAULT_RULE_TABLE}
+        self.stats = ServiceStats()
+        self.batcher = MicroBatcher(calculate_batch, max_batch_size, max_delay, max_pending, self.stats)
+        self.report_workers = report_workers
+        self.max_reports = max_reports
+        self.reports_in_flight = 0
+        self._report_pool = None
+        self._server = None
+        self.routes = {
+            ("POST", "/calculate"): self.handle_calculate,
+            ("POST", "/reports/excel"): lambda body: self.handle_report("excel", body),
+            ("POST", "/reports/pdf"): lambda body: self.handle_report("pdf", body),
+            ("GET", "/stats"): self.handle_stats,
+            ("GET", "/health"): self.handle_health,
+        }
+
+    async def start(self, host="127.0.0.1", port=DEFAULT_PORT):
+        self.batcher.start()
+        self._server = await asyncio.start_server(self.handle_connection, host, port)
+        return self._server
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.batcher.stop()
+        if self._report_pool is not None:
+            self._report_pool.shutdown(wait=False, cancel_futures=True)
+
+    # Request handlers return (status, content type, body bytes)
+
+    async def handle_calculate(self, body):
+        config = _parse_json(body)
+        results = await self._calculate(config)
+        total_price = config.get("total_price", 0)
+        return 200, "application/json", _encode({
+            "results": results,
+            "total_price": total_price,
+            "price_per_m2": _price_per_m2(total_price, results),
+        })
+
+    async def handle_report(self, kind, body):
+        from reports import load_logo, render_excel_bytes, render_pdf_bytes
+
+        config = _parse_json(body)
+        if self.reports_in_flight >= self.max_reports:
+            raise Overloaded("Too many reports rendering; retry shortly.")
+        self.reports_in_flight += 1
+        try:
+            results = config["results"] if "results" in config else await self._calculate(config)
+            total_price = config.get("total_price", 0)
+            price_per_m2 = _price_per_m2(total_price, results)
+            if self._report_pool is None:
+                self._report_pool = ProcessPoolExecutor(max_workers=self.report_workers,
+                                                        mp_context=multiprocessing.get_context(REPORT_START_METHOD),
+                                                        initializer=load_logo)
+            if kind == "pdf":
+                job, render = (results, total_price, price_per_m2, config.get("project_name", "Project")), render_pdf_bytes
+            else:
+                job, render = (results, total_price, price_per_m2), render_excel_bytes
+            data = await asyncio.get_running_loop().run_in_executor(self._report_pool, render, job)
+        except (KeyError, TypeError) as e:
+            raise HTTPError(400, f"Invalid report input: {e!r}")
+        finally:
+            self.reports_in_flight -= 1
+        return 200, REPORT_TYPES[kind], data
+
+    async def handle_stats(self, body):
+        return 200, "application/json", _encode(self.stats.snapshot({
+            "calculations_pending": self.batcher.pending,
+            "reports_in_flight": self.reports_in_flight,
+        }))
+
+    async def handle_health(self, body):
+        return 200, "application/json", _encode({"status": "ok"})
+
+    async def _calculate(self, config):
+        plots = config.get("plots")
+        if not isinstance(plots, list):
+            raise HTTPError(400, "Body must contain a 'plots' list.")
+        rules = config.get("rules", DEFAULT_RULE_TABLE.name)
+        if rules not in self.rule_tables:
+            raise HTTPError(400, f"Unknown rules {rules!r}; choose from {', '.join(self.rule_tables)}.")
+        try:
+            return await self.batcher.submit((plots, bool(config.get("apply_efficiency_incentive", False)),
+                                              self.rule_tables[rules]))
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise HTTPError(400, f"Invalid plot data: {e!r}")
+
+    # ----------------------- HTTP -----------------------#
+
+    async def dispatch(self, method, path, body):
+        handler = self.routes.get((method, path))
+        if handler is None:
+            if any(route_path == path for _, route_path in self.routes):
+                raise HTTPError(405, f"{method} is not allowed on {path}.")
+            raise HTTPError(404, f"No endpoint {path}.")
+        return await handler(body)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                path = target.split("?", 1)[0]
+                started = time.perf_counter()
+                length = int(headers.get("content-length", 0))
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                extra_headers = {}
+                try:
+                    if length > MAX_BODY_BYTES:
+                        keep_alive = False
+                        raise HTTPError(413, f"Request bodies are limited to {MAX_BODY_BYTES} bytes.")
+                    body = await reader.readexactly(length) if length else b""
+                    status, content_type, payload = await self.dispatch(method, path, body)
+                except HTTPError as e:
+                    status, content_type, payload = e.status, "application/json", _encode({"error": str(e)})
+                    if e.status == 503:
+                        extra_headers["Retry-After"] = "1"
+                except Exception as e:
+                    status, content_type, payload = 500, "application/json", _encode({"error": repr(e)})
+                self.stats.record(path if (method, path) in self.routes else "other",
+                                  time.perf_counter() - started, status)
+
+                head = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+                        f"Content-Type: {content_type}",
+                        f"Content-Length: {len(payload)}",
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                head += [f"{name}: {value}" for name, value in extra_headers.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+# Function to decode a JSON request body
+def _parse_json(body):
+    try:
+        config = json.loads(body or b"{}")
+    except ValueError as e:
+        raise HTTPError(400, f"Body is not valid JSON: {e}")
+    if not isinstance(config, dict):
+        raise HTTPError(400, "Body must be a JSON object.")
+    return config
+
+
+def _encode(payload):
+    return json.dumps(payload).encode()
+
+
+def _price_per_m2(total_price, results):
+    return total_price / results['total_buildable_area'] if results['total_buildable_area'] else 0
+
+
+async def serve(args):
+    service = CalculationService(
+        rule_tables=load_rule_tables(os.environ.get("RULES_FILE", "rules.json")),
+        max_batch_size=args.batch_size,
+        max_delay=args.batch_delay_ms / 1000,
+        max_pending=args.max_pending,
+        report_workers=args.report_workers,
+        max_reports=args.max_reports,
+    )
+    server = await service.start(args.host, args.port)
+    print(f"Serving on http://{args.host}:{args.port}", flush=True)
+    try:
+        await server.serve_forever()
+    finally:
+        await service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve calculate_totals and the report generators over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--batch-size", type=int, default=64, help="Most calculation requests per micro-batch.")
+    parser.add_argument("--batch-delay-ms", type=float, default=5.0,
+                        help="Longest wait for more requests before evaluating a micro-batch.")
+    parser.add_argument("--max-pending", type=int, default=1024, help="Queued calculations before answering 503.")
+    parser.add_argument("--report-workers", type=int, help="Report rendering processes (default: CPU count).")
+    parser.add_argument("--max-reports", type=int, default=8, help="Reports rendering at once before answering 503.")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
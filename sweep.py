@@ -0,0 +1,174 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from batch_calculations import (aggregate_plot_columns, compute_plot_columns, plots_to_columns,
+                                summarize_totals_arrays)
+from result_store import plot_result_chunk
+
+# Parameters that can be swept, in grid axis order
+SWEEP_PARAMETERS = ("coverage_percent", "density_factor", "road_deduction_percent", "extra_floors")
+
+# Metrics worth charting against a sweep, and the parameters that move each of them
+SWEEP_METRIC_PARAMETERS = {
+    "price_per_m2": ("density_factor", "road_deduction_percent"),
+    "total_buildable_area": ("density_factor", "road_deduction_percent"),
+    "total_coverage_area": ("coverage_percent", "road_deduction_percent"),
+}
+
+# Upper bound on plot + zone rows evaluated in one vectorized batch
+DEFAULT_BATCH_ROWS = 1_000_000
+
+# Grids with at least this many scenarios are spread across a process pool
+DEFAULT_PARALLEL_THRESHOLD = 2_000
+
+
+# ----------------------- Sweep Result -----------------------#
+
+class SweepResult:
+    """Metrics of a scenario grid, each shaped like the grid (one axis per swept parameter)."""
+
+    def __init__(self, axes, metrics):
+        self.axes = axes
+        self.metrics = metrics
+
+    @property
+    def shape(self):
+        return tuple(len(values) for values in self.axes.values())
+
+    def index_of(self, parameter, value):
+        values = self.axes[parameter]
+        matches = np.flatnonzero(np.isclose(values, value))
+        if not len(matches):
+            raise KeyError(f"{value} is not a swept value of {parameter}.")
+        return int(matches[0])
+
+    def value(self, metric, **parameters):
+        """Return a metric at one grid point, addressed by parameter values."""
+        index = tuple(self.index_of(name, parameters[name]) for name in self.axes)
+        return self.metrics[metric][index].item()
+
+    def slice2d(self, metric, row_parameter, column_parameter, **fixed):
+        """Return a 2D metric table over two parameters with the remaining ones fixed by value.
+
+        Unspecified remaining parameters are taken at their first swept value.
+        """
+        index = []
+        for name in self.axes:
+            if name in (row_parameter, column_parameter):
+                index.append(slice(None))
+            else:
+                index.append(self.index_of(name, fixed[name]) if name in fixed else 0)
+        table = self.metrics[metric][tuple(index)]
+        names = [name for name in self.axes if name in (row_parameter, column_parameter)]
+        return table if names == [row_parameter, column_parameter] else table.T
+
+
+# ----------------------- Grid Evaluation -----------------------#
+
+# Function to repeat a project's columns once per scenario (zone rows point at their scenario's plots)
+def tile_columns(columns, num_scenarios):
+    num_plots = len(columns["plot_size"])
+    num_zones = len(columns["zone_plot"])
+    tiled = {}
+    for name, values in columns.items():
+        if name == "zone_plot":
+            offsets = np.repeat(np.arange(num_scenarios, dtype=np.int64) * num_plots, num_zones)
+            tiled[name] = np.tile(np.asarray(values, dtype=np.int64), num_scenarios) + offsets
+        elif name == "plot_cluster":
+            num_clusters = int(values.max(initial=-1)) + 1
+            offsets = np.repeat(np.arange(num_scenarios, dtype=np.int64) * num_clusters, num_plots)
+            tiled[name] = np.tile(np.asarray(values, dtype=np.int64), num_scenarios) + offsets
+        else:
+            tiled[name] = np.tile(np.asarray(values), num_scenarios)
+    return tiled
+
+
+# Function to evaluate a contiguous range of flattened grid points
+def _evaluate_scenarios(columns, axes, start, stop, apply_efficiency_incentive, total_price, metrics, rule_table=None,
+                        plot_results=False):
+    names = list(axes)
+    shape = tuple(len(axes[name]) for name in names)
+    scenario_index = np.unravel_index(np.arange(start, stop), shape)
+    overrides = {name: np.asarray(axes[name])[idx] for name, idx in zip(names, scenario_index)}
+
+    num_scenarios = stop - start
+    num_plots = len(columns["plot_size"])
+    num_zones = len(columns["zone_plot"])
+
+    # Tile the project once per scenario, then apply each scenario's overrides
+    tiled = tile_columns(columns, num_scenarios)
+    for name, values in overrides.items():
+        if name == "density_factor":
+            tiled["zone_density_factor"] = np.repeat(values.astype(np.float64), num_zones)
+        elif name == "extra_floors":
+            tiled["extra_floors"] = np.repeat(values.astype(np.int64), num_plots)
+            tiled["allow_extra_floors"] = np.ones(num_scenarios * num_plots, dtype=np.bool_)
+        else:
+            tiled[name] = np.repeat(values.astype(np.float64), num_plots)
+
+    outputs = compute_plot_columns(tiled, rule_table)
+    segments = np.repeat(np.arange(num_scenarios, dtype=np.int64), num_plots)
+    sums = aggregate_plot_columns(tiled, outputs, segments, num_scenarios)
+    totals = summarize_totals_arrays(sums, apply_efficiency_incentive)
+
+    buildable = totals["total_buildable_area"]
+    totals["price_per_m2"] = np.divide(float(total_price), buildable, out=np.zeros_like(buildable), where=buildable != 0)
+    return {metric: totals[metric] for metric in metrics}, plot_result_chunk(tiled, outputs) if plot_results else None
+
+
+# Function to sweep calculate_totals over a Cartesian grid of parameter values
+def sweep_totals(plots, apply_efficiency_incentive, total_price, parameters,
+                 metrics=("total_buildable_area", "price_per_m2"),
+                 batch_rows=DEFAULT_BATCH_ROWS, max_workers=None,
+                 parallel_threshold=DEFAULT_PARALLEL_THRESHOLD, rule_table=None, store=None):
+    """Evaluate project totals for every combination of the given parameter values.
+
+    ``parameters`` maps names from SWEEP_PARAMETERS to the values to try; each value is applied
+    to every plot (``density_factor`` to every zone, ``extra_floors`` also enables extra floors).
+    Grids are evaluated in vectorized batches of at most ``batch_rows`` plot/zone rows, and grids
+    of ``parallel_threshold`` scenarios or more are split across a process pool. Given a
+    result_store.ResultStoreWriter as ``store``, every scenario's per-plot results are appended
+    to it batch by batch, in flattened grid order.
+    """
+    if store is not None and store.header["num_plots"] != len(plots):
+        raise ValueError("The result store must be created with one row per plot of this project.")
+    unknown = set(parameters) - set(SWEEP_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Cannot sweep {', '.join(sorted(unknown))}; choose from {', '.join(SWEEP_PARAMETERS)}.")
+
+    axes = {name: np.asarray(list(parameters[name]), dtype=np.float64)
+            for name in SWEEP_PARAMETERS if name in parameters}
+    if any(len(values) == 0 for values in axes.values()):
+        raise ValueError("Every swept parameter needs at least one value.")
+
+    columns = plots_to_columns(plots)
+    shape = tuple(len(values) for values in axes.values())
+    num_scenarios = int(np.prod(shape, dtype=np.int64))
+    rows_per_scenario = max(1, len(columns["plot_size"]) + len(columns["zone_plot"]))
+    scenarios_per_batch = max(1, batch_rows // rows_per_scenario)
+    batches = [(start, min(start + scenarios_per_batch, num_scenarios))
+               for start in range(0, num_scenarios, scenarios_per_batch)]
+
+    # Batches arrive in order; per-plot results go to the store as they come, not into memory
+    def collect(evaluated):
+        parts = []
+        for part, plot_chunk in evaluated:
+            parts.append(part)
+            if store is not None:
+                store.append(plot_chunk)
+        return parts
+
+    args = (apply_efficiency_incentive, total_price, metrics, rule_table, store is not None)
+    if max_workers != 1 and num_scenarios >= parallel_threshold and len(batches) > 1:
+        workers = min(max_workers or os.cpu_count() or 1, len(batches))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parts = collect(executor.map(_evaluate_scenarios, itertools.repeat(columns), itertools.repeat(axes),
+                                         *zip(*batches), *(itertools.repeat(arg) for arg in args)))
+    else:
+        parts = collect(_evaluate_scenarios(columns, axes, start, stop, *args) for start, stop in batches)
+
+    results = {metric: np.concatenate([part[metric] for part in parts]).reshape(shape) for metric in metrics}
+    return SweepResult(axes, results)
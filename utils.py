@@ -1,5 +1,17 @@
 import json
 
+def build_configuration(project_name, plots, apply_efficiency_incentive, green_allocation_method,
+                        custom_green_allocations, total_price):
+    """Build the project configuration dictionary the sidebar describes."""
+    return {
+        "project_name": project_name,
+        "apply_efficiency_incentive": apply_efficiency_incentive,
+        "green_allocation_method": green_allocation_method,
+        "custom_green_allocations": list(custom_green_allocations),
+        "total_price": total_price,
+        "plots": [dict(plot) for plot in plots],
+    }
+
 def save_configuration(config_data, file_name="config.json"):
     """Save the given configuration dictionary to a file."""
     with open(file_name, "w") as file: